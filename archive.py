@@ -0,0 +1,380 @@
+"""
+Asset Archive Module for Visual Novel Engine
+
+Packs the game's images, sounds and fonts into one indexed file and
+loads assets from it through a memory map, so a cold start opens a
+single file instead of one per asset.
+
+Archive layout (little endian):
+
+    header  magic b"SKPK", version u16, entry count u32
+    index   per entry: path str, kind u8, offset u32, length u32,
+            a u32, b u32, format str
+    data    entry contents, each aligned to ALIGN bytes
+
+Paths are relative to the game directory with '/' separators. Entry
+kinds:
+
+    FILE     Original file bytes, decoded on load
+    PIXELS   Raw a x b pixels in format, for pygame.image.frombuffer
+    SAMPLES  Raw PCM samples in mixer format "frequency,size,channels",
+             followed by b bytes of the original file
+
+Raw pixels are stored as BGRA, the layout convert_alpha() produces on
+32-bit displays, so surfaces with per-pixel alpha are used straight
+from the memory map without decoding or copying. Raw samples are used
+when the mixer runs with the format they were packed with, otherwise
+the sound is decoded from the original file bytes kept next to them.
+
+Assets missing from the archive, or all of them when there is no
+archive, are loaded from loose files. Developers work with loose files
+and pack before shipping:
+
+    python archive.py [--raw] [--output assets.pak]
+
+Classes:
+    Reader: Read-only file object over a memory view
+    Archive: Memory mapped asset archive with loose file fallback
+
+Functions:
+    pack: Write an archive of asset files
+
+Attributes:
+    archive: Shared archive used by the engine
+"""
+
+import io
+import os
+import mmap
+import struct
+import logging
+import threading
+
+MAGIC = b"SKPK"
+VERSION = 1
+ARCHIVE_FILE = os.environ.get("SKUF_ARCHIVE", "assets.pak")  # Empty disables the archive
+ALIGN = 64  # Entry alignment in bytes
+
+ROOTS = ("image", "audio", "font")       # Directories packed with all their assets
+EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".wav", ".ogg", ".mp3", ".ttf", ".otf")
+RAW_IMAGES = (".png", ".jpg", ".jpeg", ".bmp", ".gif")
+RAW_SOUNDS = (".wav",)                   # Sound effects, compressed tracks are streamed music
+
+FILE, PIXELS, SAMPLES = range(3)
+
+HEADER = struct.Struct("<4sHI")
+ENTRY = struct.Struct("<BIIII")
+U16 = struct.Struct("<H")
+
+def _pack_str(text):
+    data = text.encode("utf-8")
+    return U16.pack(len(data)) + data
+
+def _unpack_str(buffer, offset):
+    length, = U16.unpack_from(buffer, offset)
+    offset += U16.size
+    return bytes(buffer[offset:offset + length]).decode("utf-8"), offset + length
+
+def normalize(path):
+    """
+    Get archive key of a file path
+
+    Args:
+        path: File path relative to the game directory
+
+    Returns:
+        str: Normalized path with '/' separators
+    """
+    return os.path.normpath(path).replace(os.sep, "/")
+
+class Reader(io.RawIOBase):
+    """
+    Read-only file object over a memory view
+
+    Lets decoders that take file objects read archive entries without
+    copying the whole entry first.
+    """
+
+    def __init__(self, view):
+        self.view = view
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.view[self.pos:self.pos + len(buffer)]
+        buffer[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = (0, self.pos, len(self.view))[whence]
+        self.pos = max(base + offset, 0)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+class Archive:
+    """
+    Memory mapped asset archive, opened on first use
+
+    The map is private copy-on-write: surfaces made from raw pixels
+    point into it and may be drawn on without touching the file.
+
+    Attributes:
+        path: Archive file, loose files only if None or missing
+        index: Path -> (kind, offset, length, a, b, format), None
+            before the archive is opened
+    """
+
+    def __init__(self, path=ARCHIVE_FILE):
+        """
+        Initialize archive, the file is mapped on first lookup
+
+        Args:
+            path: Archive file, loose files only if None or missing
+        """
+        self.path = path or None
+        self.index = None
+        self.data = None
+        self.mtime = None
+        self.lock = threading.Lock()  # Assets are also loaded by prefetch workers
+
+    def open(self):
+        """Map archive and read its index, a missing archive leaves it empty"""
+        with self.lock:
+            if self.index is not None:
+                return
+            index = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    index = self.read_index()
+                except (OSError, ValueError, struct.error) as e:
+                    logging.error(f"Ignoring asset archive {self.path}: {str(e)}")
+                    index = {}
+            self.index = index
+
+    def read_index(self):
+        """Map the file and parse its header and index"""
+        with open(self.path, "rb") as file:
+            self.mtime = os.fstat(file.fileno()).st_mtime_ns
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not an asset archive of this version")
+        index = {}
+        offset = HEADER.size
+        for _ in range(count):
+            name, offset = _unpack_str(self.data, offset)
+            entry = ENTRY.unpack_from(self.data, offset)
+            fmt, offset = _unpack_str(self.data, offset + ENTRY.size)
+            index[name] = entry + (fmt,)
+        logging.info(f"Asset archive {self.path}: {count} entries")
+        return index
+
+    def entry(self, path):
+        """
+        Get index entry of a file
+
+        Args:
+            path: File path relative to the game directory
+
+        Returns:
+            tuple: (kind, offset, length, a, b, format) or None if the
+                file is not archived
+        """
+        if self.index is None:
+            self.open()
+        return self.index.get(normalize(path))
+
+    def __contains__(self, path):
+        return self.entry(path) is not None
+
+    def view(self, offset, length):
+        return memoryview(self.data)[offset:offset + length]
+
+    def file(self, path):
+        """
+        Get readable source of a file for decoders taking paths or file objects
+
+        Args:
+            path: File path relative to the game directory
+
+        Returns:
+            Reader over the original bytes, or the path if not archived
+
+        Raises:
+            ValueError: For images archived as raw pixels
+        """
+        entry = self.entry(path)
+        if entry is None:
+            return path
+        kind, offset, length, a, b, fmt = entry
+        if kind == PIXELS:
+            raise ValueError(f"Archived without the original file: {path}")
+        if kind == SAMPLES:
+            offset, length = offset + length, b
+        return Reader(self.view(offset, length))
+
+    def getmtime(self, path):
+        """
+        Get modification time of a file, of the archive for archived files
+
+        Raises:
+            OSError: If the file exists neither in the archive nor on disk
+        """
+        if self.entry(path) is not None:
+            return self.mtime
+        return os.stat(path).st_mtime_ns
+
+    def getsize(self, path):
+        """
+        Get size of a file in bytes
+
+        Raises:
+            OSError: If the file exists neither in the archive nor on disk
+        """
+        entry = self.entry(path)
+        return entry[2] if entry is not None else os.path.getsize(path)
+
+    def image(self, path):
+        """
+        Load image, raw pixels are wrapped without decoding or copying
+
+        Args:
+            path: Image file path
+
+        Returns:
+            pygame.Surface: Surface in the file's own format
+        """
+        import pygame
+        entry = self.entry(path)
+        if entry is None:
+            return pygame.image.load(path)
+        kind, offset, length, a, b, fmt = entry
+        if kind == PIXELS:
+            return pygame.image.frombuffer(self.view(offset, length), (a, b), fmt)
+        return pygame.image.load(Reader(self.view(offset, length)), os.path.basename(path))
+
+    def sound(self, path):
+        """
+        Load sound, raw samples matching the mixer skip decoding
+
+        Args:
+            path: Sound file path
+
+        Returns:
+            pygame.mixer.Sound: Sound
+        """
+        import pygame
+        entry = self.entry(path)
+        if entry is None:
+            return pygame.mixer.Sound(path)
+        kind, offset, length, a, b, fmt = entry
+        if kind == SAMPLES:
+            frequency, size, channels = (int(value) for value in fmt.split(","))
+            if pygame.mixer.get_init() == (frequency, size, channels):
+                return pygame.mixer.Sound(buffer=self.view(offset, length))
+        return pygame.mixer.Sound(file=self.file(path))
+
+def collect(roots=ROOTS, base="."):
+    """
+    Find asset files to pack
+
+    Args:
+        roots: Directories packed recursively
+        base: Game directory, its own asset files are packed too
+
+    Returns:
+        list: Normalized paths relative to base, sorted
+    """
+    paths = [name for name in os.listdir(base)
+             if name.lower().endswith(EXTENSIONS) and os.path.isfile(os.path.join(base, name))]
+    for root in roots:
+        for folder, _, names in os.walk(os.path.join(base, root)):
+            paths += [os.path.relpath(os.path.join(folder, name), base)
+                      for name in names if name.lower().endswith(EXTENSIONS)]
+    return sorted(normalize(path) for path in paths)
+
+def pack(output, paths, raw=False, base="."):
+    """
+    Write an archive of asset files
+
+    With raw, images are stored as BGRA pixels and sound effects as PCM
+    samples in the mixer's current format, followed by the original
+    bytes as a fallback for sounds. Raw entries load without decoding
+    but take more space.
+
+    Args:
+        output: Archive file path
+        paths: Asset paths relative to base
+        raw: Store images and sound effects pre-decoded
+        base: Game directory
+
+    Returns:
+        int: Archive size in bytes
+    """
+    import pygame
+    entries = []
+    for path in paths:
+        with open(os.path.join(base, path), "rb") as file:
+            original = file.read()
+        entry = (path, FILE, original, len(original), 0, 0, "")
+        extension = os.path.splitext(path)[1].lower()
+        try:
+            if raw and extension in RAW_IMAGES:
+                surface = pygame.image.load(io.BytesIO(original), os.path.basename(path))
+                width, height = surface.get_size()
+                pixels = pygame.image.tobytes(surface, "BGRA")
+                entry = (path, PIXELS, pixels, len(pixels), width, height, "BGRA")
+            elif raw and extension in RAW_SOUNDS and pygame.mixer.get_init():
+                samples = pygame.mixer.Sound(file=io.BytesIO(original)).get_raw()
+                fmt = ",".join(str(value) for value in pygame.mixer.get_init())
+                entry = (path, SAMPLES, samples + original, len(samples), 0, len(original), fmt)
+        except pygame.error as e:
+            logging.warning(f"Storing {path} undecoded: {str(e)}")
+        entries.append(entry)
+
+    index_size = sum(len(_pack_str(entry[0])) + ENTRY.size + len(_pack_str(entry[6]))
+                     for entry in entries)
+    offset = HEADER.size + index_size
+    index, data = [], []
+    for path, kind, content, length, a, b, fmt in entries:
+        padding = -offset % ALIGN
+        data += [bytes(padding), content]
+        offset += padding
+        index += [_pack_str(path), ENTRY.pack(kind, offset, length, a, b), _pack_str(fmt)]
+        offset += len(content)
+
+    temp = f"{output}.{os.getpid()}.tmp"
+    with open(temp, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        file.write(b"".join(index))
+        file.write(b"".join(data))
+    os.replace(temp, output)
+    return offset
+
+archive = Archive()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Pack game assets into one archive")
+    parser.add_argument("--output", default=ARCHIVE_FILE or "assets.pak")
+    parser.add_argument("--raw", action="store_true", help="Store images and sound effects pre-decoded")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    if args.raw:
+        try:
+            pygame.mixer.init()
+        except pygame.error as e:
+            logging.warning(f"Sound effects stored undecoded, no mixer: {str(e)}")
+    paths = collect()
+    size = pack(args.output, paths, args.raw)
+    print(f"{len(paths)} assets -> {args.output} ({size / 1024:.1f} KiB)")
@@ -0,0 +1,350 @@
+"""
+Asset Cache Module for Visual Novel Engine
+
+Loads surfaces, fonts and sounds once and hands out the same objects to
+every caller. Entries are kept in least recently used order and evicted
+when the estimated memory use goes over the budget. Images can be
+decoded ahead of time on a background thread.
+
+Images requested at another size are scaled once and saved to an
+on-disk tier under SCALED_DIR, keyed by the source file, its
+modification time, the target size and whether it keeps per-pixel
+alpha. Later runs load the scaled copy
+instead of scaling again.
+
+Files are read through the asset archive when one is packed, loose
+files otherwise. Surfaces already in the display format, such as raw
+archive pixels, are used as they are instead of being converted.
+
+Classes:
+    AssetCache: LRU cache for images, fonts and sounds
+
+Attributes:
+    cache: Shared cache instance used by the engine
+"""
+
+import os
+import pygame
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from archive import archive, normalize
+
+BUDGET = 64 * 1024 * 1024  # Default memory budget in bytes
+SCALED_DIR = os.path.join("cache", "scaled")  # On-disk tier of scaled images
+
+class AssetCache:
+    """
+    Shared cache of loaded assets with LRU eviction
+
+    Entries are keyed by (kind, path, size, format). Surfaces are
+    returned already converted to the display format.
+
+    Attributes:
+        budget: Memory budget in bytes
+        hits: Number of requests served from the cache
+        misses: Number of requests that loaded from disk
+        evictions: Number of entries dropped to stay within budget
+        bytes: Estimated memory held by cached entries
+        scaled_dir: Directory of the scaled image tier, None disables it
+    """
+
+    def __init__(self, budget=BUDGET, scaled_dir=SCALED_DIR):
+        """
+        Initialize empty cache
+
+        Args:
+            budget: Memory budget in bytes
+            scaled_dir: Directory of the scaled image tier, None disables it
+        """
+        self.budget = budget
+        self.scaled_dir = scaled_dir
+        self.entries = OrderedDict()  # key -> (asset, size in bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self.pending = {}      # (path, target, format) -> Future decoding the image
+        self.executor = None   # Prefetch worker, started on first prefetch
+        self.formats = None    # Display format samples, made on first load
+
+    def get(self, key, loader):
+        """
+        Get cached asset or load it
+
+        Args:
+            key: Cache key
+            loader: Function returning (asset, size in bytes)
+
+        Returns:
+            Cached asset
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+        self.misses += 1
+        asset, size = loader()
+        self.entries[key] = (asset, size)
+        self.bytes += size
+        self.evict()
+        return asset
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits its budget"""
+        # The newest entry is kept even if it alone is over budget
+        while self.bytes > self.budget and len(self.entries) > 1:
+            key, (asset, size) = self.entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+            logging.debug(f"Asset evicted: {key}")
+
+    def set_budget(self, budget):
+        """
+        Change memory budget and evict entries that no longer fit
+
+        Args:
+            budget: Memory budget in bytes
+        """
+        self.budget = budget
+        self.evict()
+
+    def image(self, path, alpha=False, size=None, scale=None):
+        """
+        Get image converted to the display format
+
+        Args:
+            path: Image file path
+            alpha: Keep per-pixel alpha with convert_alpha()
+            size: Optional (width, height) to scale the image to
+            scale: Optional factor to scale the image by, ignored if
+                size is given
+
+        Returns:
+            pygame.Surface: Cached surface
+        """
+        target = size or scale
+        fmt = "alpha" if alpha else "opaque"
+        key = ("image", path, target, fmt)
+
+        def load():
+            future = self.pending.pop((path, target, fmt), None)
+            surface, scaled = future.result() if future else self.decode(path, target, alpha)
+            if pygame.display.get_surface() is not None and not self.display_format(surface, alpha):
+                surface = surface.convert_alpha() if alpha else surface.convert()
+            if target and not scaled:
+                if scale and not size:
+                    width, height = surface.get_size()
+                    target_size = (max(round(width * scale), 1), max(round(height * scale), 1))
+                else:
+                    target_size = size
+                surface = pygame.transform.smoothscale(surface, target_size)
+                self.save_scaled(surface, path, target, alpha)
+            return surface, surface.get_pitch() * surface.get_height()
+
+        return self.get(key, load)
+
+    def display_format(self, surface, alpha):
+        """
+        Check whether a surface already has the format convert() or
+        convert_alpha() would give it
+
+        Args:
+            surface: Loaded surface
+            alpha: Whether per-pixel alpha is wanted
+
+        Returns:
+            bool: True if the surface can be blitted as it is
+        """
+        if self.formats is None:
+            self.formats = {False: pygame.Surface((1, 1)).convert(),
+                            True: pygame.Surface((1, 1), pygame.SRCALPHA).convert_alpha()}
+        sample = self.formats[alpha]
+        return (surface.get_bitsize() == sample.get_bitsize()
+                and surface.get_masks() == sample.get_masks()
+                and surface.get_flags() & pygame.SRCALPHA == sample.get_flags() & pygame.SRCALPHA)
+
+    def scaled_path(self, path, target, alpha=False):
+        """
+        Get file of the scaled image tier
+
+        Opaque and per-pixel alpha copies are saved after conversion to
+        the display format, so they are kept apart.
+
+        Args:
+            path: Source image file path
+            target: Target (width, height) or scale factor
+            alpha: Whether the copy keeps per-pixel alpha
+
+        Returns:
+            str: Scaled image file, None if the tier is disabled or the
+                source does not exist
+        """
+        if not self.scaled_dir:
+            return None
+        try:
+            mtime = archive.getmtime(path)
+        except OSError:
+            return None
+        fmt = "alpha" if alpha else "opaque"
+        digest = hashlib.sha256(f"{os.path.abspath(path)}|{mtime}|{target}|{fmt}".encode()).hexdigest()[:16]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.scaled_dir, f"{stem}-{digest}.png")
+
+    def decode(self, path, target=None, alpha=False):
+        """
+        Decode image file, from the scaled tier if it has a copy
+
+        Args:
+            path: Image file path
+            target: Target (width, height) or scale factor, or None
+            alpha: Whether the image is wanted with per-pixel alpha
+
+        Returns:
+            tuple: (surface, True if it is already scaled)
+        """
+        scaled = self.scaled_path(path, target, alpha) if target else None
+        if scaled and os.path.exists(scaled):
+            try:
+                return pygame.image.load(scaled), True
+            except pygame.error:
+                logging.warning(f"Ignoring unreadable scaled image: {scaled}")
+        return archive.image(path), False
+
+    def save_scaled(self, surface, path, target, alpha=False):
+        """Save scaled image to the on-disk tier, failures only cost a rescale later"""
+        scaled = self.scaled_path(path, target, alpha)
+        if not scaled:
+            return
+        try:
+            os.makedirs(self.scaled_dir, exist_ok=True)
+            temp = f"{scaled}.{os.getpid()}.tmp.png"
+            pygame.image.save(surface, temp)
+            os.replace(temp, scaled)
+        except (pygame.error, OSError) as e:
+            logging.warning(f"Could not save scaled image {scaled}: {str(e)}")
+
+    def prefetch(self, path, alpha=False, size=None, scale=None):
+        """
+        Start decoding image on the background thread
+
+        Only the file decoding runs off the main thread, conversion to
+        the display format and scaling a copy missing from the scaled
+        tier happen on first image() call.
+
+        Args:
+            path: Image file path
+            alpha: Format the image will be requested with
+            size: Size the image will be requested with
+            scale: Scale factor the image will be requested with
+        """
+        target = size or scale
+        fmt = "alpha" if alpha else "opaque"
+        key = ("image", path, target, fmt)
+        if key in self.entries or (path, target, fmt) in self.pending:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self.pending[(path, target, fmt)] = self.executor.submit(self.decode, path, target, alpha)
+
+    def font(self, path, size):
+        """
+        Get font loaded from file
+
+        Args:
+            path: Font file path
+            size: Font size
+
+        Returns:
+            pygame.font.Font: Cached font
+        """
+        return self.get(("font", path, size, None),
+                        lambda: (pygame.font.Font(archive.file(path), size), archive.getsize(path)))
+
+    def sysfont(self, name, size):
+        """
+        Get system font
+
+        Args:
+            name: System font name
+            size: Font size
+
+        Returns:
+            pygame.font.Font: Cached font
+        """
+        return self.get(("sysfont", name, size, None),
+                        lambda: (pygame.font.SysFont(name, size), 0))
+
+    def sound(self, path):
+        """
+        Get sound decoded into memory
+
+        Args:
+            path: Sound file path
+
+        Returns:
+            pygame.mixer.Sound: Cached sound
+        """
+        def load():
+            sound = archive.sound(path)
+            frequency, format, channels = pygame.mixer.get_init()
+            size = int(sound.get_length() * frequency) * channels * abs(format) // 8
+            return sound, size
+
+        return self.get(("sound", path, None, None), load)
+
+    def forget(self, path):
+        """
+        Drop entries and pending prefetches of a file that changed
+
+        Scaled copies on disk are keyed by the file's modification time
+        and are not reused for the new file.
+
+        Args:
+            path: Asset file path
+
+        Returns:
+            int: Entries dropped
+        """
+        path = normalize(path)
+        keys = [key for key in self.entries if normalize(key[1]) == path]
+        for key in keys:
+            asset, size = self.entries.pop(key)
+            self.bytes -= size
+        for key in [key for key in self.pending if normalize(key[0]) == path]:
+            del self.pending[key]
+        return len(keys)
+
+    def clear(self):
+        """Drop all entries, counters are kept"""
+        self.entries.clear()
+        self.pending.clear()
+        self.bytes = 0
+
+    def stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: Hits, misses, evictions, entry count and bytes held
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+        }
+
+    def held(self):
+        """
+        Get cached entries with their size, least recently used first
+
+        Returns:
+            list: (key, bytes) tuples
+        """
+        return [(key, size) for key, (asset, size) in self.entries.items()]
+
+cache = AssetCache()
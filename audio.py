@@ -0,0 +1,184 @@
+"""
+Audio Module for Visual Novel Engine
+
+Plays sound effects on a fixed pool of mixer channels reserved for the
+engine and streams music tracks with pygame.mixer.music.
+
+Decoded sound effects are kept in their own asset cache with a byte
+budget, so large images never evict them. Decoding ahead of time with
+prefetch() and switching music tracks run on a worker thread: the
+render loop only queues the work and never waits for the disk or for
+a fade to finish.
+
+pygame.mixer.music streams a single track, so a track change fades
+the playing track out and the new one in right after it. Asking for
+the track that is already playing does nothing.
+
+Classes:
+    AudioManager: Channel pool, sound cache and music switching
+
+Attributes:
+    audio: Shared audio manager used by the engine
+"""
+
+import os
+import time
+import pygame
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from assets import AssetCache
+from archive import archive
+
+CHANNELS = 8                # Mixer channels reserved for sound effects
+BUDGET = 16 * 1024 * 1024   # Memory budget for decoded sounds in bytes
+FADE_MS = 800               # Music fade out and fade in time
+
+class AudioManager:
+    """
+    Sound effect channel pool and music player
+
+    Every call does nothing when the mixer is not initialized, so the
+    game runs without an audio device.
+
+    Attributes:
+        sounds: Cache of decoded sound effects
+        track: Music file playing or about to play, None if stopped
+        fade: Music fade time in milliseconds
+        volume: Music volume
+    """
+
+    def __init__(self, channels=CHANNELS, budget=BUDGET, fade=FADE_MS):
+        """
+        Initialize audio manager, channels are claimed on first use
+
+        Args:
+            channels: Number of channels in the pool
+            budget: Memory budget for decoded sounds in bytes
+            fade: Music fade time in milliseconds
+        """
+        self.sounds = AssetCache(budget)
+        self.track = None
+        self.fade = fade
+        self.volume = 1.0
+        self.size = channels
+        self.pool = None
+        self.next = 0              # Channel taken when all are busy
+        self.lock = threading.Lock()  # Guards the sound cache
+        self.executor = None       # Worker, started on first use
+
+    def ready(self):
+        """
+        Claim the channel pool once the mixer is initialized
+
+        Returns:
+            bool: True if audio can be played
+        """
+        if self.pool is None:
+            if not pygame.mixer.get_init():
+                return False
+            if pygame.mixer.get_num_channels() < self.size:
+                pygame.mixer.set_num_channels(self.size)
+            # Reserved channels are never picked by Sound.play() elsewhere
+            pygame.mixer.set_reserved(self.size)
+            self.pool = [pygame.mixer.Channel(i) for i in range(self.size)]
+        return True
+
+    def submit(self, func, *args):
+        """Run function on the audio worker thread"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio")
+        return self.executor.submit(func, *args)
+
+    def sound(self, path):
+        """
+        Get decoded sound effect
+
+        Args:
+            path: Sound file path
+
+        Returns:
+            pygame.mixer.Sound: Cached sound
+        """
+        with self.lock:
+            return self.sounds.sound(path)
+
+    def prefetch(self, path):
+        """
+        Decode sound effect on the worker thread
+
+        Args:
+            path: Sound file path
+        """
+        if self.ready():
+            self.submit(self.load, path)
+
+    def load(self, path):
+        """Decode sound effect, logging instead of raising"""
+        try:
+            self.sound(path)
+        except (pygame.error, OSError) as e:
+            logging.error(f"Could not load sound {path}: {str(e)}")
+
+    def play(self, path, volume=1.0):
+        """
+        Play sound effect on a pool channel
+
+        An idle channel is used if there is one, otherwise the channel
+        that started playing longest ago is cut off.
+
+        Args:
+            path: Sound file path
+            volume: Channel volume
+
+        Returns:
+            pygame.mixer.Channel: Channel playing the sound, or None
+        """
+        if not self.ready():
+            return None
+        try:
+            sound = self.sound(path)
+        except (pygame.error, OSError) as e:
+            logging.error(f"Could not load sound {path}: {str(e)}")
+            return None
+        channel = next((channel for channel in self.pool if not channel.get_busy()), None)
+        if channel is None:
+            channel = self.pool[self.next]
+            self.next = (self.next + 1) % len(self.pool)
+        channel.set_volume(volume)
+        channel.play(sound)
+        return channel
+
+    def music(self, path, loops=-1):
+        """
+        Switch music track, fading over on the worker thread
+
+        Args:
+            path: Music file path
+            loops: Number of repeats, -1 loops forever
+        """
+        if path == self.track or not self.ready():
+            return
+        self.track = path
+        self.submit(self.switch, path, loops)
+
+    def switch(self, path, loops):
+        """Fade out the playing track and start another one, on the worker"""
+        try:
+            if pygame.mixer.music.get_busy():
+                pygame.mixer.music.fadeout(self.fade)
+                time.sleep(self.fade / 1000)
+            pygame.mixer.music.load(archive.file(path), os.path.basename(path))
+            pygame.mixer.music.set_volume(self.volume)
+            pygame.mixer.music.play(loops, fade_ms=self.fade)
+        except pygame.error as e:
+            logging.error(f"Could not play music {path}: {str(e)}")
+
+    def stop_music(self):
+        """Fade out the playing track"""
+        if self.track is None or not self.ready():
+            return
+        self.track = None
+        self.submit(pygame.mixer.music.fadeout, self.fade)
+
+audio = AudioManager()
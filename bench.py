@@ -0,0 +1,787 @@
+"""
+Benchmarks for the visual novel engine
+
+Runs without a window using SDL dummy drivers.
+
+Usage:
+    python bench.py typewriter [--repeat N]
+    python bench.py frames [--frames N]
+    python bench.py soak [--runs N] [--seed N] [--warmup N] [--tolerance KIB]
+    python bench.py transitions [--frames N]
+    python bench.py assets [--repeat N]
+    python bench.py stage [--frames N]
+    python bench.py idle [--seconds N]
+    python bench.py startup [--runs N] [--budget MS]
+    python bench.py suite [--output FILE] [--baseline FILE] [--tolerance PCT] [--quick] [--profile FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import tempfile
+import threading
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+from dialog import Dialog, TextReveal, defF, REVEAL, SKIP_ALL
+from menu import generate_menu
+from game_manager import GameManager
+from profiler import profiler
+from eventlog import eventlog
+from seen import seen
+from viewport import viewport
+import transitions
+import assets
+import archive
+from stage import Stage, sprite_path
+from screens import StaticScreen
+from inputs import inputs
+
+eventlog.enabled = False  # Benchmarks must not fill the game event log
+seen.path = None          # or mark lines of the player's save as seen
+
+SOAK_WARMUP = 50       # Soak playthroughs before memory is traced
+SOAK_TOLERANCE = 64    # KiB traced memory may grow after the first soak checkpoint
+
+SAMPLE_LINES = [
+    "Всего всегда по немногу скуф попал в реанимацию  с инсультом.",
+    "Добрый день, показываем документики, огнетушитель, аптечку.",
+    "На протяжении всего времени было много ругательств, таких как.",
+    "Скуф:Я Петрович, для тебя могу быть скуфом, называй как хочешь.",
+]
+
+
+def reveal_full_render(font, target, text):
+    """Reveal line by rendering the whole growing prefix (old behaviour)"""
+    for i in range(1, len(text) + 1):
+        target.blit(font.render(text[:i], 0, (255, 255, 255, 0)), (34, 4))
+
+
+def reveal_incremental(font, target, text):
+    """Reveal line from a single pre-rendered surface"""
+    reveal = TextReveal(font, text)
+    for i in range(1, len(text) + 1):
+        reveal.draw(target, (34, 4), i)
+
+
+def bench_typewriter(repeat):
+    """
+    Compare per-line reveal cost of full re-render and clipped reveal
+
+    Args:
+        repeat: Number of times every sample line is revealed
+    """
+    font = pygame.font.Font(defF, 16)
+    target = pygame.Surface((800, 150))
+    print(f"{'line chars':>10} {'full ms':>10} {'incremental ms':>15} {'speedup':>8}")
+    for text in SAMPLE_LINES:
+        results = []
+        for func in (reveal_full_render, reveal_incremental):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                func(font, target, text)
+            results.append((time.perf_counter() - start) * 1000 / repeat)
+        print(f"{len(text):>10} {results[0]:>10.3f} {results[1]:>15.3f} {results[0] / results[1]:>7.1f}x")
+
+
+def bench_frames(frames):
+    """
+    Compare per-frame dialog cost of full flips and dirty rectangles
+
+    Args:
+        frames: Number of frames rendered in each mode
+    """
+    screen = pygame.display.get_surface()
+    message = tuple(SAMPLE_LINES * 3)
+    print(f"{'mode':>6} {'ms/frame':>10} {'pixels/frame':>14}")
+    for dirty in (False, True):
+        dialog = Dialog(screen)
+        dialog.dirtyRects = dirty
+        dialog.start(message)
+        pixels = 0
+        start = time.perf_counter()
+        for frame in range(frames):
+            if not dialog.show:
+                dialog.start(message)
+            rects = dialog.draw(screen)
+            if dirty:
+                pygame.display.update(rects)
+            else:
+                pygame.display.flip()
+            pixels += sum(rect.width * rect.height for rect in rects)
+            dialog.update(1000 / 60)
+            if dialog.state != REVEAL:  # Page or message finished
+                dialog.advance()
+        elapsed = (time.perf_counter() - start) * 1000 / frames
+        print(f"{'dirty' if dirty else 'full':>6} {elapsed:>10.3f} {pixels // frames:>14}")
+
+
+def transition_images(size):
+    """Two busy test images for transitions"""
+    old, new = pygame.Surface(size), pygame.Surface(size)
+    rng = random.Random(0)
+    for image in (old, new):
+        for _ in range(200):
+            color = [rng.randrange(256) for _ in range(3)]
+            image.fill(color, (rng.randrange(size[0]), rng.randrange(size[1]), 120, 90))
+    return old.convert(), new.convert()
+
+
+def bench_transitions(frames):
+    """
+    Measure milliseconds per transition frame, including the display flip
+
+    Args:
+        frames: Frames per transition kind
+    """
+    screen = pygame.display.get_surface()
+    old, new = transition_images(screen.get_size())
+    print(f"{'transition':>16} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    runs = [(kind, kind) for kind in transitions.KINDS]
+    if transitions.numpy is not None:
+        runs.append(("wipe (no numpy)", "wipe"))
+    numpy = transitions.numpy
+    for name, kind in runs:
+        if name.endswith("(no numpy)"):
+            transitions.numpy = None
+        try:
+            transition = transitions.Transition(screen.get_size())
+            screen.blit(old, (0, 0))
+            transition.begin(screen, new)
+            times = []
+            for frame in range(frames):
+                start = time.perf_counter()
+                transition.frame(screen, kind, frame / max(frames - 1, 1))
+                pygame.display.flip()
+                times.append((time.perf_counter() - start) * 1000)
+        finally:
+            transitions.numpy = numpy
+        print(f"{name:>16} {percentile(times, 0.5):>8.3f} {percentile(times, 0.99):>8.3f} {max(times):>8.3f}")
+
+
+def bench_assets(repeat):
+    """
+    Measure loading every asset from loose files and from packed archives
+
+    Files come from the OS page cache after the first pass, so this
+    shows decoding cost, not cold disk reads.
+
+    Args:
+        repeat: Passes over all assets per source
+    """
+    paths = archive.collect()
+    sources = [("loose", None, False), ("archive", "bench-files.pak", False),
+               ("archive --raw", "bench-raw.pak", True)]
+    print(f"{'source':>14} {'ms per pass':>12} {'opens':>6}")
+    for name, path, raw in sources:
+        if path:
+            archive.pack(path, paths, raw)
+        try:
+            source = archive.Archive(path)
+            opens = 1 if path else len(paths)
+            times = []
+            for _ in range(repeat):
+                loader = assets.AssetCache(scaled_dir=None)
+                assets.archive, saved = source, assets.archive
+                start = time.perf_counter()
+                try:
+                    for asset in paths:
+                        if asset.endswith(archive.RAW_IMAGES):
+                            loader.image(asset, alpha=asset.endswith(".png"))
+                        elif asset.endswith((".ttf", ".otf")):
+                            loader.font(asset, 16)
+                        elif pygame.mixer.get_init():
+                            loader.sound(asset)
+                finally:
+                    assets.archive = saved
+                times.append((time.perf_counter() - start) * 1000)
+        finally:
+            if path:
+                os.remove(path)
+        print(f"{name:>14} {percentile(times, 0.5):>12.3f} {opens:>6}")
+
+
+def bench_stage(frames):
+    """
+    Compare per-frame cost of drawing every stage layer and of the cached composite
+
+    Three characters of 300x450 with soft alpha edges stand over a
+    busy background, under a translucent dialog box.
+
+    Args:
+        frames: Frames measured per case
+    """
+    screen = pygame.display.get_surface()
+    background = type("Background", (), {"bitmap": transition_images(screen.get_size())[0], "pos": (0, 0)})
+    dialog = Dialog(screen)
+    box = dialog.get_box()
+    with tempfile.TemporaryDirectory() as root:
+        sprites = {}
+        for name, color in (("skuf", (200, 120, 60)), ("cop", (60, 90, 200)), ("hero", (90, 180, 90))):
+            for expression in ("normal", "angry"):
+                sprite = pygame.Surface((300, 450), pygame.SRCALPHA)
+                for inset in range(0, 150, 3):  # Alpha rising towards the middle
+                    pygame.draw.ellipse(sprite, color + (min(inset * 4, 255),), sprite.get_rect().inflate(-inset, -inset))
+                path = sprite_path(name, expression, root)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                pygame.image.save(sprite, path)
+                sprites[name, expression] = sprite.convert_alpha()
+        stage = Stage(screen, root)
+        stage.set_background(background)
+        for name, position in (("skuf", "left"), ("cop", "center"), ("hero", "right")):
+            stage.show(name, position=position)
+        stage.set_box(box, dialog.rect)
+        stage.back()
+
+        def layers(frame):
+            screen.blit(background.bitmap, background.pos)
+            for character in stage.characters.values():
+                screen.blit(sprites[character.name, "normal"], character.rect)
+            screen.blit(dialog.image, dialog.rect)
+            pygame.draw.rect(screen, (255, 255, 255), dialog.rect, 2)
+
+        def expression(frame):
+            stage.show("cop", ("normal", "angry")[frame % 2])
+            stage.back()
+
+        def rebuild(frame):
+            stage.invalidate()
+            stage.back()
+
+        cases = [("every layer", layers), ("composite", lambda frame: stage.back()),
+                 ("box area", lambda frame: screen.blit(stage.bitmap, dialog.rect, dialog.rect)),
+                 ("expression change", expression), ("full rebuild", rebuild)]
+        print(f"{'case':>18} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, draw in cases:
+            times = []
+            for frame in range(frames):
+                start = time.perf_counter()
+                draw(frame)
+                times.append((time.perf_counter() - start) * 1000)
+            print(f"{name:>18} {percentile(times, 0.5):>8.3f} {percentile(times, 0.99):>8.3f}")
+
+
+def bench_idle(seconds):
+    """
+    Compare CPU use of an end screen redrawn every frame and a static screen
+
+    Each screen is left alone for the given time, then a key press ends
+    it. CPU time counts all threads of the process.
+
+    Args:
+        seconds: Wall time each screen is shown
+    """
+    import skuf
+    manager = skuf.setup(log_file=None)
+    image = skuf.render_whot()
+
+    def redraw():
+        # The end screen loops before screens.StaticScreen
+        while True:
+            manager.screen.blit(image, viewport.offset)
+            inputs.flip()
+            manager.clock.tick(manager.fps)
+            if any(event.type == pygame.KEYDOWN for event in inputs.get()):
+                return
+
+    static = StaticScreen(lambda: image, kind=None)
+    cases = [("redraw", redraw), ("static", lambda: static.show(manager))]
+    print(f"{'case':>8} {'cpu %':>8} {'frames/s':>9}")
+    for name, show in cases:
+        pygame.event.clear()
+        key = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN, mod=0, unicode="", scancode=0)
+        timer = threading.Timer(seconds, pygame.event.post, (key,))
+        frames, cpu, start = inputs.frame, time.process_time(), time.perf_counter()
+        timer.start()
+        show()
+        wall = time.perf_counter() - start
+        print(f"{name:>8} {(time.process_time() - cpu) / wall * 100:>8.2f} "
+              f"{(inputs.frame - frames) / wall:>9.1f}")
+
+
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import skuf
+imported = time.perf_counter()
+skuf.setup()
+from engine import engine
+print(json.dumps({"import": (imported - start) * 1000, "phases": engine.startup.phases,
+                  "total": (engine.startup.end - start) * 1000}))
+"""
+
+
+def bench_startup(runs, budget=None):
+    """
+    Measure time to first frame of fresh game processes
+
+    Args:
+        runs: Number of processes started
+        budget: Allowed median milliseconds to first frame, or None
+
+    Returns:
+        int: Exit code, 1 if the median is over budget
+    """
+    results, processes = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], check=True,
+                                capture_output=True, text=True).stdout
+        processes.append((time.perf_counter() - start) * 1000)
+        results.append(json.loads(output.splitlines()[-1]))
+    names = ["import"] + [name for name, ms in results[0]["phases"]] + ["total"]
+    print(f"{'phase':>12} {'p50 ms':>8} {'max ms':>8}")
+    for name in names:
+        times = [result[name] if name in result else dict(result["phases"])[name] for result in results]
+        print(f"{name:>12} {percentile(times, 0.5):>8.1f} {max(times):>8.1f}")
+    print(f"{'process':>12} {percentile(processes, 0.5):>8.1f} {max(processes):>8.1f}")
+    first_frame = percentile([result["total"] for result in results], 0.5)
+    if budget is not None and first_frame > budget:
+        print(f"Time to first frame {first_frame:.1f} ms is over the {budget:.0f} ms budget")
+        return 1
+    return 0
+
+
+def stack_depth():
+    """Get number of frames on the current call stack"""
+    frame, depth = sys._getframe(1), 0
+    while frame:
+        frame, depth = frame.f_back, depth + 1
+    return depth
+
+
+class HeadlessPlayer:
+    """
+    Plays the game without a person at the keyboard
+
+    Replaces dialog, menu and image display of a GameManager: every
+    dialog is stepped to the end through the dialog state machine and
+    menu choices are picked at random. Images are shown without a
+    transition, which would take a key press to finish, and a key press
+    is queued for the screen waiting on them.
+
+    Attributes:
+        manager: Game manager being played
+        skip: Menu items never chosen
+        depth: Deepest call stack seen while showing dialogs
+    """
+
+    def __init__(self, manager, seed=0, skip=("ВЫХОД",)):
+        self.manager = manager
+        self.random = random.Random(seed)
+        self.skip = skip
+        self.depth = 0
+        manager.show_dialogs = self.show_dialogs
+        manager.show_menu = self.show_menu
+        manager.show_image = self.show_image
+
+    def show_dialogs(self, dialog_list, background=None, first_line=None, directions=None):
+        if background:
+            background.back()
+        self.depth = max(self.depth, stack_depth())
+        dialog = self.manager.dialog
+        for message in dialog_list:
+            dialog.start((message,))
+            while dialog.show:
+                dialog.draw(self.manager.screen)
+                dialog.advance()
+
+    def show_menu(self, menu_items, background_image=None):
+        return self.random.choice([item for item in menu_items if item not in self.skip])
+
+    def show_image(self, image, kind=None):
+        self.manager.screen.blit(image, viewport.offset)
+        self.press()
+
+    def press(self):
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN))
+
+
+def bench_soak(runs, seed, warmup=SOAK_WARMUP, tolerance=SOAK_TOLERANCE):
+    """
+    Play the game many times and check that memory and stack depth stay flat
+
+    Every return to the main menu counts as one playthrough. Warm-up
+    playthroughs fill the caches and visit the paths first, then memory
+    is traced. The first checkpoint is the baseline, later ones fail if
+    traced memory grew by more than the tolerance or the stack got
+    deeper.
+
+    Args:
+        runs: Number of measured playthroughs
+        seed: Seed for menu choices
+        warmup: Playthroughs before tracing starts
+        tolerance: Allowed growth of traced memory in KiB
+
+    Returns:
+        int: 0 if memory and stack depth stayed flat, 1 otherwise
+    """
+    import skuf
+    manager = skuf.setup()
+    player = HeadlessPlayer(manager, seed)
+    mmenu = manager.scenes["mmenu"]
+    step = max(runs // 10, 1)
+    played = -warmup
+    baseline = None   # (traced bytes, stack depth) at the first checkpoint
+    failed = False
+
+    def counted():
+        nonlocal played, baseline, failed
+        if played == 0:
+            tracemalloc.start()
+        if played > 0 and (played % step == 0 or played == runs):
+            current, peak = tracemalloc.get_traced_memory()
+            if baseline is None:
+                baseline = (current, player.depth)
+            grown = current - baseline[0] > tolerance * 1024 or player.depth > baseline[1]
+            failed |= grown
+            print(f"{played:>10} {current / 1024:>12.1f} {player.depth:>12}{'  grown' if grown else ''}")
+        if played == runs:
+            return None
+        played += 1
+        return mmenu()
+
+    print(f"{'played':>10} {'traced KiB':>12} {'stack depth':>12}")
+    start = time.perf_counter()
+    manager.add_scene("mmenu", counted)
+    manager.run("mmenu", skuf.play)
+    tracemalloc.stop()
+    print(f"{runs} playthroughs in {time.perf_counter() - start:.1f} s")
+    if failed:
+        print(f"Memory grew by more than {tolerance} KiB or the stack got deeper after "
+              f"the first checkpoint")
+    return 1 if failed else 0
+
+
+class FrameRecorder:
+    """
+    Records frame times and feeds scripted input
+
+    While active, pygame.display.flip and pygame.display.update are
+    wrapped so that every call marks the end of a frame. After each
+    frame the input script is called with the frame number and may post
+    synthetic events for the next frame. pygame.event.wait is replaced
+    by a polling loop that calls the script with None while no input is
+    queued, so a menu blocking for input keeps receiving the script's
+    events instead of sleeping.
+
+    Attributes:
+        script: Function called with the frame number after every frame
+        times: Frame times in milliseconds
+    """
+
+    def __init__(self, script=None):
+        self.script = script
+        self.times = []
+        self.last = None
+
+    def __enter__(self):
+        self.flip, self.update = pygame.display.flip, pygame.display.update
+        self.wait = pygame.event.wait
+        pygame.display.flip = self.wrap(self.flip)
+        pygame.display.update = self.wrap(self.update)
+        pygame.event.wait = self.idle
+        self.last = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        pygame.display.flip, pygame.display.update = self.flip, self.update
+        pygame.event.wait = self.wait
+
+    def idle(self, *args):
+        event = pygame.event.poll()
+        while event.type == pygame.NOEVENT:
+            if self.script:
+                self.script(None)
+            event = pygame.event.poll()
+        return event
+
+    def wrap(self, func):
+        def frame(*args):
+            result = func(*args)
+            now = time.perf_counter()
+            self.times.append((now - self.last) * 1000)
+            self.last = now
+            if self.script:
+                self.script(len(self.times))
+            return result
+        return frame
+
+
+def press(key=pygame.K_RETURN):
+    """Post synthetic key press"""
+    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode="", scancode=0))
+
+
+def click(pos):
+    """Post synthetic left mouse click at a logical position"""
+    pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=viewport.point(pos), button=1))
+
+
+def every(frames, action):
+    """Input script running action every given number of frames and when idle"""
+    return lambda frame: (frame is None or frame % frames == 0) and action()
+
+
+def peak_rss():
+    """Get peak resident set size in KiB, None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def measure(scenario, script):
+    """
+    Run scenario twice: timed, then under tracemalloc for allocations
+
+    Args:
+        scenario: Function playing the scenario
+        script: Function returning a fresh input script
+
+    Returns:
+        dict: Frame and memory statistics
+    """
+    pygame.event.clear()
+    with FrameRecorder(script()) as recorder:
+        start = time.perf_counter()
+        scenario()
+        elapsed = time.perf_counter() - start
+    times = recorder.times
+    pygame.event.clear()
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    with FrameRecorder(script()):
+        scenario()
+    blocks = sys.getallocatedblocks() - blocks
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "frames": len(times),
+        "fps": round(len(times) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(times, 0.50), 3),
+        "p99_ms": round(percentile(times, 0.99), 3),
+        "peak_traced_kib": round(peak / 1024, 1),
+        "net_blocks": blocks,
+        "peak_rss_kib": peak_rss(),
+    }
+
+
+def scenario_sndnext(repeat):
+    """Dialog.sndNext on a multi-page message"""
+    screen = pygame.display.get_surface()
+    dialog = Dialog(screen)
+    clock = pygame.time.Clock()
+    for _ in range(repeat):
+        dialog.message = tuple(SAMPLE_LINES * 4)
+        dialog.sndNext(clock, 0)
+
+
+def scenario_menu(repeat):
+    """generate_menu with three items"""
+    screen = pygame.display.get_surface()
+    clock = pygame.time.Clock()
+    for _ in range(repeat):
+        generate_menu(screen, ["НОВАЯ ИГРА", "ПОМОЩЬ", "ВЫХОД"], None, True, clock, 0)
+
+
+def scenario_show_dialogs(repeat):
+    """GameManager.show_dialogs with one line per message"""
+    manager = GameManager(pygame.display.get_surface(), fps=0)
+    for _ in range(repeat):
+        manager.show_dialogs(SAMPLE_LINES)
+
+
+def scenario_skip(repeat):
+    """GameManager.show_dialogs in skip mode, one frame per message"""
+    manager = GameManager(pygame.display.get_surface(), fps=0)
+    manager.dialog.skip = SKIP_ALL
+    for _ in range(repeat * 10):
+        manager.show_dialogs(SAMPLE_LINES)
+
+
+def scenario_transitions(repeat):
+    """transitions.play of every kind between two full-screen images"""
+    screen = pygame.display.get_surface()
+    old, new = transition_images(screen.get_size())
+    clock = pygame.time.Clock()
+    for _ in range(repeat):
+        for kind in transitions.KINDS:
+            screen.blit(old, (0, 0))
+            transitions.play(screen, new, kind, 100, clock, 0)
+
+
+def scenario_scenes(runs, seed):
+    """
+    Whole game from the main menu, through skuf.py scenes
+
+    Returns:
+        tuple: Scenario function and input script factory
+    """
+    import skuf
+    manager = skuf.setup()
+    manager.fps = 0
+    mmenu = manager.scenes["mmenu"]
+
+    def play():
+        played = 0
+
+        def counted():
+            nonlocal played
+            if played == runs:
+                return None
+            played += 1
+            return mmenu()
+
+        manager.add_scene("mmenu", counted)
+        try:
+            manager.run("mmenu", skuf.play)
+        finally:
+            manager.add_scene("mmenu", mmenu)
+
+    def script():
+        rng = random.Random(seed)
+
+        def act(frame):
+            # Enter for dialogs and screens, click on one of the first two
+            # menu items so the game never picks "exit"
+            if frame is None or frame % 3 == 0:
+                if rng.random() < 0.5:
+                    press()
+                else:
+                    click((350, rng.choice((215, 265))))
+        return act
+
+    return play, script
+
+
+def bench_suite(output=None, baseline=None, tolerance=10.0, quick=False, profile=None):
+    """
+    Run all scenarios, save results and compare them against a baseline
+
+    Args:
+        output: JSON file to save results to
+        baseline: JSON file with earlier results
+        tolerance: Allowed slowdown in percent before reporting a regression
+        quick: Run fewer iterations
+        profile: Enable the frame profiler and dump its histograms here
+
+    Returns:
+        int: 1 if a regression against the baseline was found, else 0
+    """
+    repeat = 3 if quick else 20
+    scenes, scenes_script = scenario_scenes(5 if quick else 50, 0)
+    profiler.enabled = bool(profile)
+    scenarios = {
+        "sndNext": (lambda: scenario_sndnext(repeat), lambda: every(20, press)),
+        "generate_menu": (lambda: scenario_menu(repeat), lambda: every(30, lambda: click((350, 215)))),
+        "show_dialogs": (lambda: scenario_show_dialogs(repeat), lambda: every(10, press)),
+        "skip": (lambda: scenario_skip(repeat), lambda: (lambda frame: None)),
+        "transitions": (lambda: scenario_transitions(repeat), lambda: (lambda frame: None)),
+        "scenes": (scenes, scenes_script),
+    }
+    results = {"python": sys.version.split()[0], "pygame": pygame.version.ver, "scenarios": {}}
+    print(f"{'scenario':>14} {'frames':>8} {'fps':>10} {'p50 ms':>8} {'p99 ms':>8} {'peak KiB':>10} {'RSS KiB':>10}")
+    for name, (scenario, script) in scenarios.items():
+        profiler.scene = name
+        result = measure(scenario, script)
+        results["scenarios"][name] = result
+        print(f"{name:>14} {result['frames']:>8} {result['fps']:>10} {result['p50_ms']:>8} "
+              f"{result['p99_ms']:>8} {result['peak_traced_kib']:>10} {result['peak_rss_kib']:>10}")
+
+    if profile:
+        profiler.dump(profile)
+    if output:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+    if not baseline:
+        return 0
+
+    with open(baseline) as file:
+        base = json.load(file)["scenarios"]
+    regressions = 0
+    print(f"\ncompared to {baseline} (tolerance {tolerance}%)")
+    for name, result in results["scenarios"].items():
+        if name not in base:
+            continue
+        for key, higher_better in (("fps", True), ("p50_ms", False), ("p99_ms", False), ("peak_traced_kib", False)):
+            old, new = base[name][key], result[key]
+            if not old:
+                continue
+            change = (new - old) / old * 100
+            worse = -change if higher_better else change
+            flag = "REGRESSION" if worse > tolerance else ""
+            regressions += bool(flag)
+            print(f"{name:>14} {key:>16} {old:>10} -> {new:<10} {change:+7.1f}% {flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Engine benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    typewriter = sub.add_parser("typewriter", help="Per-line text reveal cost")
+    typewriter.add_argument("--repeat", type=int, default=50)
+    frames = sub.add_parser("frames", help="Per-frame dialog cost, full flips against dirty rects")
+    frames.add_argument("--frames", type=int, default=2000)
+    soak = sub.add_parser("soak", help="Memory and stack depth over many playthroughs")
+    soak.add_argument("--runs", type=int, default=10000)
+    soak.add_argument("--seed", type=int, default=0)
+    soak.add_argument("--warmup", type=int, default=SOAK_WARMUP, help="Playthroughs before tracing")
+    soak.add_argument("--tolerance", type=float, default=SOAK_TOLERANCE,
+                      help="Allowed growth of traced memory in KiB")
+    trans = sub.add_parser("transitions", help="Per-frame cost of fade, dissolve and wipe")
+    trans.add_argument("--frames", type=int, default=120)
+    packed = sub.add_parser("assets", help="Asset load time from loose files and archives")
+    packed.add_argument("--repeat", type=int, default=10)
+    staged = sub.add_parser("stage", help="Per-frame cost of stage layers against the cached composite")
+    staged.add_argument("--frames", type=int, default=500)
+    idle = sub.add_parser("idle", help="CPU use of an end screen nobody touches")
+    idle.add_argument("--seconds", type=float, default=10.0)
+    startup = sub.add_parser("startup", help="Time to first frame of fresh game processes")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--budget", type=float, help="Fail if the median is over this many ms")
+    suite = sub.add_parser("suite", help="Frame time and memory of dialogs, menus and scenes")
+    suite.add_argument("--output", help="Save results as JSON")
+    suite.add_argument("--baseline", help="Compare against earlier JSON results")
+    suite.add_argument("--tolerance", type=float, default=10.0, help="Allowed slowdown in percent")
+    suite.add_argument("--quick", action="store_true", help="Fewer iterations")
+    suite.add_argument("--profile", help="Dump per-scene frame phase histograms")
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    pygame.display.set_mode((800, 600))
+    if args.command == "typewriter":
+        bench_typewriter(args.repeat)
+    elif args.command == "frames":
+        bench_frames(args.frames)
+    elif args.command == "soak":
+        return bench_soak(args.runs, args.seed, args.warmup, args.tolerance)
+    elif args.command == "transitions":
+        bench_transitions(args.frames)
+    elif args.command == "assets":
+        bench_assets(args.repeat)
+    elif args.command == "stage":
+        bench_stage(args.frames)
+    elif args.command == "idle":
+        bench_idle(args.seconds)
+    elif args.command == "startup":
+        return bench_startup(args.runs, args.budget)
+    elif args.command == "suite":
+        return bench_suite(args.output, args.baseline, args.tolerance, args.quick, args.profile)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
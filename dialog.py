@@ -4,16 +4,117 @@ Dialog System Module for Visual Novel Game Engine
 This module handles dialog boxes, text rendering, and dialog progression.
 Supports optional character portraits and text animations.
 
+The dialog is a state machine driven by update(dt) and draw(surface), so
+it can be ticked from any frame loop. sndNext() runs that loop itself.
+draw() returns the rectangles it changed, so only those need to be
+pushed to the display. Messages are wrapped to the box width and split
+into pages by the layout module once, the dialog then only reveals the
+precomputed lines.
+
+Skip mode, cycled with Tab, shows messages for a single frame instead
+of typing them: only lines already seen, or all lines.
+
+A dialog given a background handle is drawn over the background image
+itself. Without one, the screen under the dialog is copied on start.
+A dialog on a stage puts its box frame into the stage composite while
+it is open and is drawn over the composite, so repainting the box is
+one blit of the composite instead of the box, its border and portraits.
+
+Positions and sizes are logical units converted to output pixels by
+the viewport when the dialog is created.
+
 Classes:
+    TextReveal: Pre-rendered text line revealed character by character
     Dialog: Main dialog box implementation with text rendering and animation
 """
 
 import pygame
 import os
 import logging
+from itertools import accumulate
+from assets import cache
+from profiler import profiler
+from layout import layout
+from history import is_backlog_event
+from viewport import viewport
+from inputs import inputs, Clock
 
-pygame.init()
 defF = os.path.join("font", "DejaVuSans.ttf")
+BOX_IMAGE = os.path.join("image", "49.png")  # Dialog box background
+NEXT_IMAGE = "next.png"                      # Next page indicator
+
+FPS = 60               # Frame rate cap for dialog loops
+TEXT_SPEED = 33        # Characters revealed per second
+LINES_PER_PAGE = 7     # Lines shown before waiting for the next page
+LINE_HEIGHT = 20       # Distance between dialog lines in logical units
+MARGIN = 34            # Space between the box edges and the text
+PADDING = 4            # Space between the box top and the first line
+DIRTY_RECTS = True     # Update only changed rectangles instead of flipping
+
+# Dialog states
+REVEAL = 0   # Typing text of the current page
+PAGE = 1     # Page is full, waiting for the player
+DONE = 2     # Whole message shown, waiting for the player
+CLOSED = 3   # Dialog dismissed
+
+# Redraw levels, from least to most work
+LINE = 0     # Only the line being revealed changed
+BOX = 1      # Whole dialog box has to be repainted
+FULL = 2     # Whole screen has to be repainted
+
+# Skip modes
+SKIP_NONE = 0  # Type every message
+SKIP_SEEN = 1  # Skip messages the player has already seen
+SKIP_ALL = 2   # Skip every message
+SKIP_NAMES = ("off", "seen", "all")
+
+class TextReveal:
+    """
+    Text line rendered once and revealed by growing a clip rectangle
+
+    Rendering the whole growing prefix on every character costs O(n^2)
+    glyph rasterization per line. Instead the full line is rasterized a
+    single time and only the visible part of it is blitted.
+
+    Attributes:
+        text: Line text
+        surface: Rendered surface of the whole line
+        widths: Pixel width of every text prefix, widths[i] is the width of text[:i]
+    """
+
+    def __init__(self, font, text, color=(255, 255, 255, 0)):
+        """
+        Render line and measure its prefixes
+
+        Args:
+            font: Pygame font used for rendering
+            text: Line text
+            color: Text color
+        """
+        self.text = text
+        self.surface = font.render(text, 0, color)
+        # Glyph advances are read once instead of measuring every prefix
+        self.widths = list(accumulate(
+            (m[4] if m else 0 for m in font.metrics(text)), initial=0))
+
+    def __len__(self):
+        return len(self.text)
+
+    def draw(self, surface, pos, count=None):
+        """
+        Draw first characters of the line
+
+        Args:
+            surface: Target surface
+            pos: Top-left position of the line
+            count: Number of visible characters, whole line if None
+        """
+        if count is None or count >= len(self.text):
+            surface.blit(self.surface, pos)
+        elif count > 0:
+            area = pygame.Rect(0, 0, self.widths[count], self.surface.get_height())
+            surface.blit(self.surface, pos, area)
+
 
 class Dialog(pygame.sprite.Sprite):
     """
@@ -24,7 +125,17 @@ class Dialog(pygame.sprite.Sprite):
         rect: Position rectangle for dialog box
         photo: Optional character portrait
         message: Tuple containing dialog text
+        text: Layout of the message wrapped to the box width
         show: Boolean controlling dialog visibility
+        state: Current step of the dialog state machine
+        textSpeed: Text reveal speed in characters per second
+        skip: Skip mode, SKIP_NONE, SKIP_SEEN or SKIP_ALL
+        background: Background handle the dialog is drawn over, the
+            screen is copied on start if None
+        stage: Stage the dialog box is a layer of, takes the place of
+            the background if set
+        onBacklog: Called when the player opens the backlog, or None
+        dirtyRects: Redraw only changed regions instead of the whole screen
     """
     
     def __init__(self, screen, photo=None):
@@ -38,109 +149,311 @@ class Dialog(pygame.sprite.Sprite):
         try:
             pygame.sprite.Sprite.__init__(self)
             # Load dialog box background
-            self.image = pygame.image.load("image/49.png").convert()
+            self.image = viewport.image(BOX_IMAGE)
         except pygame.error:
             logging.error("Could not load dialog background")
             # Fallback to black rectangle if image fails to load
-            self.image = pygame.Surface((800, 200))
+            self.image = pygame.Surface((viewport.length(800), viewport.length(200)))
             self.image.fill((0, 0, 0))
         except Exception as e:
             logging.error(f"Dialog initialization error: {str(e)}")
             
         # Setup dialog box positioning
         self.rect = self.image.get_rect()
-        self.rect.center = (400, 530)
+        self.rect.center = viewport.point((400, 530))
         self.image.set_alpha(220)  # Set transparency
         
         # Load character portrait if provided
         if photo:
-            self.photo = pygame.image.load(photo).convert_alpha()
+            self.photo = viewport.image(photo, alpha=True)
         else:
             self.photo = None
+        self.photoPos = viewport.point((150, 170))
             
         # Initialize text rendering
-        self.dFont = pygame.font.Font(defF, 16)  # Dialog font
+        self.dFont = cache.font(defF, viewport.length(16))  # Dialog font
+        self.margin = viewport.length(MARGIN)
+        self.padding = viewport.length(PADDING)
+        self.lineHeight = viewport.length(LINE_HEIGHT)
+        self.lineCache = {}  # Rendered lines keyed by text
+        self.textSpeed = TEXT_SPEED
+        self.skip = SKIP_NONE
+        self.background = None
+        self.stage = None
+        self.boxImage = None  # Box frame for the stage, built on first use
+        self.onBacklog = None
+        self.dirtyRects = DIRTY_RECTS
         self.message = ()
         self.screen = screen
+        self.lastScreen = pygame.Surface(screen.get_size())  # Screen under the dialog
+        self.backdrop = self.lastScreen  # Surface repainted under the dialog
+        self.backdropPos = (0, 0)
         
         # Setup next page indicator
-        self.nextImage = pygame.image.load('next.png').convert_alpha()
+        self.nextImage = viewport.image(NEXT_IMAGE, alpha=True)
         self.nextImageRect = self.nextImage.get_rect()
-        self.nextImageRect.right = 410
-        self.nextImageRect.bottom = 120
-        self.show = True
+        self.nextImageRect.right = viewport.length(410)
+        self.nextImageRect.bottom = viewport.length(120)
+        self.reset()
 
     def reset(self):
-        """Reset dialog box state"""
-        pass
+        """Reset dialog box state to the first page of the message"""
+        self.text = layout("\n".join(self.message), self.dFont,
+                           self.rect.width - 2 * self.margin, LINES_PER_PAGE)
+        self.state = REVEAL if self.message else CLOSED
+        self.line = 0        # Line being revealed
+        self.page = 0        # Page being shown
+        self.pageStart = 0   # First line of the current page
+        self.revealed = 0.0  # Characters revealed on the current line
+        self.redraw = FULL   # Redraw level needed by the next draw()
+        self.show = self.state != CLOSED
 
-    def sndNext(self):
+    def start(self, message):
         """
-        Handle text progression and animation
-        
-        Controls text rendering, pagination and typing animation
+        Begin showing a message over the current screen contents
+
+        Args:
+            message: Tuple of dialog paragraphs, each wrapped to the box width
+        """
+        self.message = message
+        if self.stage is not None:
+            self.stage.set_box(self.get_box(), self.rect)
+            self.backdrop = self.stage.bitmap
+            self.backdropPos = self.stage.pos
+        elif self.background is not None:
+            self.backdrop = self.background.bitmap
+            self.backdropPos = self.background.pos
+        else:
+            if self.lastScreen.get_size() != self.screen.get_size():
+                self.lastScreen = pygame.Surface(self.screen.get_size())
+            self.lastScreen.blit(self.screen, (0, 0))
+            self.backdrop, self.backdropPos = self.lastScreen, (0, 0)
+        self.reset()
+        self.update(0)
+
+    def get_box(self):
+        """
+        Get dialog box frame as a stage layer
+
+        Returns:
+            pygame.Surface: Box image with its transparency and border
+                in per-pixel alpha
+        """
+        if self.boxImage is None:
+            box = self.image.convert_alpha()
+            box.fill((255, 255, 255, self.image.get_alpha()), special_flags=pygame.BLEND_RGBA_MULT)
+            box.set_alpha(None)
+            pygame.draw.rect(box, (255,255,255), box.get_rect(), viewport.length(2))
+            self.boxImage = box
+        return self.boxImage
+
+    def get_line(self, text):
+        """
+        Get pre-rendered line, rasterizing it only on first use
+
+        Args:
+            text: Line text
+
+        Returns:
+            TextReveal: Cached line renderer
+        """
+        reveal = self.lineCache.get(text)
+        if reveal is None:
+            if len(self.lineCache) >= 128:
+                self.lineCache.clear()
+            profiler.mark("render")
+            reveal = TextReveal(self.dFont, text)
+            profiler.mark("text")
+            self.lineCache[text] = reveal
+        return reveal
+
+    def update(self, dt):
+        """
+        Reveal text according to elapsed time
+
+        Args:
+            dt: Milliseconds since the previous update
+        """
+        if self.state != REVEAL:
+            return
+        self.revealed += self.textSpeed * dt / 1000
+        lines = self.text.lines
+        while self.state == REVEAL:
+            length = len(lines[self.line])
+            if self.revealed < length:
+                break
+            self.revealed -= length
+            self.line += 1
+            self.redraw = max(self.redraw, BOX)
+            if self.line >= len(lines):
+                self.state = DONE
+            elif self.line >= self.text.pages[self.page][1]:
+                self.state = PAGE
+        if self.state != REVEAL:
+            self.revealed = 0.0
+
+    def fast_forward(self):
+        """Reveal the rest of the current page at once"""
+        if self.state == REVEAL:
+            self.revealed = float("inf")
+            self.update(0)
+
+    def reveal_all(self):
+        """Show the whole message at once, turning all pages"""
+        while self.state in (REVEAL, PAGE):
+            self.advance()
+
+    def advance(self):
+        """Skip text animation, turn the page or close the dialog"""
+        if self.state == REVEAL:
+            self.fast_forward()
+        elif self.state == PAGE:
+            self.page += 1
+            self.pageStart = self.line
+            self.state = REVEAL
+            self.redraw = max(self.redraw, BOX)
+        elif self.state == DONE:
+            self.state = CLOSED
+            self.show = False
+            if self.stage is not None:
+                self.stage.set_box(None)
+                self.backdrop = self.stage.bitmap
+            self.screen.blit(self.backdrop, self.backdropPos)
+
+    def handle_event(self, event):
+        """
+        Process single input event
+
+        Args:
+            event: Pygame event
+
+        Returns:
+            bool: True if the event was consumed by the dialog
+        """
+        if event.type == pygame.KEYDOWN and event.key in (pygame.K_RETURN, pygame.K_SPACE):
+            self.advance()
+            return True
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_TAB:
+            self.skip = (self.skip + 1) % len(SKIP_NAMES)
+            logging.info(f"Skip mode: {SKIP_NAMES[self.skip]}")
+            return True
+        if profiler.handle_event(event):
+            self.redraw = FULL
+            return True
+        if self.onBacklog and is_backlog_event(event):
+            self.onBacklog()
+            self.redraw = FULL
+            return True
+        return False
+
+    def draw(self, surface):
+        """
+        Draw dialog over the saved screen contents
+
+        With dirtyRects only the parts changed since the previous call
+        are repainted: the line being revealed, or the dialog box after
+        a line or page change. Otherwise the whole screen is repainted.
+
+        Args:
+            surface: Target surface
+
+        Returns:
+            list: Rectangles of the surface that changed
+        """
+        if self.state == CLOSED:
+            return []
+        redraw = self.redraw if self.dirtyRects else FULL
+        self.redraw = LINE
+        left = self.rect.left + self.margin
+        top = self.rect.top + self.padding
+        lines = self.text.lines
+        if redraw == LINE:
+            if self.state != REVEAL:
+                return []
+            row = self.line - self.pageStart
+            reveal = self.get_line(lines[self.line])
+            count = min(int(self.revealed), len(reveal))
+            reveal.draw(surface, (left, top + row * self.lineHeight), count)
+            return [pygame.Rect(left, top + row * self.lineHeight, reveal.widths[count], reveal.surface.get_height())]
+
+        x, y = self.backdropPos
+        if redraw == FULL:
+            surface.blit(self.backdrop, (x, y))
+            rects = [surface.get_rect()]
+        else:
+            rects = [self.rect]
+            if self.photo:
+                rects.append(self.photo.get_rect(topleft=self.photoPos))
+            for rect in rects:
+                surface.blit(self.backdrop, rect, rect.move(-x, -y))
+        if self.stage is None:  # The stage has the box frame
+            surface.blit(self.image, self.rect)
+        for row, index in enumerate(range(self.pageStart, self.line)):
+            self.get_line(lines[index]).draw(surface, (left, top + row * self.lineHeight))
+        if self.state == REVEAL:
+            row = self.line - self.pageStart
+            self.get_line(lines[self.line]).draw(surface, (left, top + row * self.lineHeight), int(self.revealed))
+        else:
+            surface.blit(self.nextImage, self.nextImageRect.move(self.rect.topleft))
+        if self.stage is None:
+            pygame.draw.rect(surface, (255,255,255), (self.rect), viewport.length(2))
+        if self.photo:
+            surface.blit(self.photo, self.photoPos)
+        return rects
+
+    def skips(self, seen=False):
+        """
+        Check whether the skip mode skips a message
+
+        Args:
+            seen: Whether the player has already seen the message
+
+        Returns:
+            bool: True if the message should be skipped
+        """
+        return self.skip == SKIP_ALL or (self.skip == SKIP_SEEN and seen)
+
+    def sndNext(self, clock=None, fps=FPS, seen=False):
+        """
+        Show current message until the player closes it
+
+        Runs the dialog state machine under a frame-capped clock instead
+        of blocking between characters. A message skipped by the skip
+        mode is drawn complete for one frame and closed without waiting.
+
+        Args:
+            clock: Shared pygame clock, a new one is created if None
+            fps: Frame rate cap
+            seen: Whether the player has already seen the message
         """
         if not self.message:
             return
-            
-        # Text progression variables
-        outOfText = False      # Flag for text completion
-        line = 0              # Current line being rendered
-        lineCount = 0         # Total lines rendered
-        startLine = 0         # First visible line
-        nextPage = False      # Flag for next page
-        text_pos = 0         # Character position in current text
-        text = ""            # Current text being rendered
-        delayTimer = 30      # Animation delay timer
-        textSurf = None      # Text surface for rendering
-
-        textImage = pygame.Surface(self.image.get_size())
-        textImage.fill((0,0,0))
-        textImage.set_colorkey((0,0,0))
-        lastScreen = pygame.Surface(self.screen.get_size())
-        lastScreen.blit(self.screen, (0,0))
+        clock = clock or Clock()
+        self.start(self.message)
+        clock.tick()  # Don't count time spent before the dialog opened
+        profiler.begin_frame()
         while self.show:
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RETURN or event.key == pygame.K_SPACE:
-                        if not outOfText and not nextPage:
-                            delayTimer = 0
-                            continue
-                        elif nextPage:
-                            nextPage = False
-                            textImage = pygame.Surface(self.image.get_size())
-                            textImage.fill((0,0,0))
-                            textImage.set_colorkey((0,0,0))
-                            delayTimer = 30
-                            continue
-                        self.show = False
-            if not outOfText and not nextPage:
-                pygame.time.delay(delayTimer)
-                text += self.message[line][text_pos]
-                text_pos += 1
-                if text_pos > len(self.message[line])-1:
-                    textImage.blit(textSurf, (34, lineCount * 20 + 4))
-                    textImage.set_colorkey((0,0,0))
-                    text_pos = 0
-                    line += 1
-                    lineCount += 1
-                    text = ""
-                    if lineCount > 6:
-                        nextPage = True
-                        lineCount = 0
-                        text = ""
-                        text_pos = 0
-                if line > len(self.message)-1:
-                    outOfText = True
-                if outOfText or nextPage:
-                    textImage.blit(self.nextImage, self.nextImageRect)
-                textSurf = self.dFont.render(text, 0, (255,255,255,0))
-            self.screen.blit(lastScreen, (0,0))
-            self.screen.blit(self.image, self.rect )
-            self.screen.blit(textSurf, (self.rect.left + 34,lineCount * 20 + 4 + self.rect.top))
-            self.screen.blit(textImage, self.rect)
-            pygame.draw.rect(self.screen, (255,255,255), (self.rect), 2)
-            if self.photo:
-                self.screen.blit(self.photo, (150, 170))
-            pygame.display.flip()
-        self.screen.blit(lastScreen, (0,0))
\ No newline at end of file
+            for event in inputs.get():
+                self.handle_event(event)
+            profiler.mark("events")
+            skipped = self.skips(seen)
+            if skipped:
+                self.reveal_all()
+            rects = self.draw(self.screen)
+            rects += profiler.draw(self.screen)
+            profiler.mark("render")
+            if self.dirtyRects:
+                inputs.update(rects)
+            else:
+                inputs.flip()
+            profiler.mark("display")
+            if skipped:
+                self.advance()  # Close without waiting for the frame cap
+                clock.tick()
+                profiler.end_frame()
+                continue
+            dt = clock.tick(fps)
+            profiler.mark("wait")
+            self.update(dt)
+            profiler.mark("update")
+            profiler.end_frame()
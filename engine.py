@@ -0,0 +1,194 @@
+"""
+Engine Bootstrap Module for Visual Novel Engine
+
+Brings the engine up once, in a fixed order:
+
+    logging      Log file listener thread
+    pygame       Display, font and mixer modules, not the rest of pygame
+    input        Event filter, input recording or replay
+    display      Window, viewport and frame clock
+    manager      Game manager and its dialog
+    first frame  First screen image drawn and shown
+
+Importing the engine modules has no side effects. Everything past the
+first frame (story bundle, other backgrounds, sounds, fonts of later
+scenes) is loaded when a scene first needs it.
+
+Every phase is timed by a startup profiler. The report goes to the log
+and time to first frame is checked against SKUF_STARTUP_BUDGET
+milliseconds when it is set; bench.py startup enforces it in CI.
+
+SKUF_RECORD=FILE records the session's input, SKUF_REPLAY=FILE replays
+it, at recorded speed or with SKUF_REPLAY_FAST=1 as fast as possible
+without a window or sound.
+
+Classes:
+    StartupProfiler: Wall time of startup phases
+    Engine: Ordered subsystem bootstrap
+
+Attributes:
+    engine: Shared engine used by the game
+"""
+
+import os
+import time
+import logging
+import pygame
+from contextlib import contextmanager
+from eventlog import setup_logging
+from game_manager import GameManager
+from viewport import viewport, parse_size
+from inputs import inputs, Clock
+
+LOG_FILE = "log.txt"
+LOG_FORMAT = "%(asctime)s - %(message)s"
+LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
+MIXER = (44100, -16, 2, 2048)  # Frequency, sample size, channels, buffer
+
+class StartupProfiler:
+    """
+    Wall time of startup phases
+
+    Attributes:
+        start: perf_counter() when the profiler was created, at the
+            end of the engine module import
+        phases: (name, ms) pairs in the order they ran
+        end: perf_counter() at the end of the last phase
+    """
+
+    def __init__(self):
+        self.start = self.end = time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a block as a startup phase
+
+        Args:
+            name: Phase name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.end = time.perf_counter()
+            self.phases.append((name, (self.end - start) * 1000))
+
+    @property
+    def elapsed(self):
+        """Milliseconds from the engine import to the end of the last phase"""
+        return (self.end - self.start) * 1000
+
+    def report(self):
+        """
+        Format phase times
+
+        Returns:
+            str: One line per phase, the time between phases and the total
+        """
+        lines = [f"{name:>12} {ms:8.1f} ms" for name, ms in self.phases]
+        other = self.elapsed - sum(ms for name, ms in self.phases)
+        lines.append(f"{'other':>12} {other:8.1f} ms")
+        lines.append(f"{'total':>12} {self.elapsed:8.1f} ms")
+        return "\n".join(lines)
+
+    def check(self, budget):
+        """
+        Compare time to first frame with a budget
+
+        Args:
+            budget: Allowed milliseconds
+
+        Returns:
+            bool: True if startup fit the budget
+        """
+        if self.elapsed <= budget:
+            return True
+        logging.warning(f"Startup took {self.elapsed:.1f} ms, budget is {budget} ms")
+        return False
+
+class Engine:
+    """
+    Ordered subsystem bootstrap
+
+    Attributes:
+        startup: Startup phase timings
+        screen: Display surface, None before start()
+        clock: Clock shared by all frame loops
+        manager: Game manager, None before start()
+    """
+
+    def __init__(self):
+        self.startup = StartupProfiler()
+        self.screen = None
+        self.clock = None
+        self.manager = None
+
+    def start(self, caption="", splash=None, log_file=LOG_FILE):
+        """
+        Initialize subsystems and show the first frame, only once
+
+        The window size comes from SKUF_RESOLUTION=WxH, SKUF_FULLSCREEN=1
+        uses the whole desktop. Replays use the size of the recording.
+
+        Args:
+            caption: Window title
+            splash: Image stretched over the screen as the first frame,
+                the screen is only cleared if None
+            log_file: Log file path, None leaves logging as it is
+
+        Returns:
+            GameManager: The engine's game manager
+        """
+        if self.manager is not None:
+            return self.manager
+        replay = os.environ.get("SKUF_REPLAY")
+        fast = bool(os.environ.get("SKUF_REPLAY_FAST"))
+        if replay and fast:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        if log_file:
+            with self.startup.phase("logging"):
+                setup_logging(log_file, level=logging.INFO, format=LOG_FORMAT, datefmt=LOG_DATEFMT)
+        with self.startup.phase("pygame"):
+            pygame.display.init()
+            pygame.font.init()
+            try:
+                pygame.mixer.init(*MIXER)
+            except pygame.error as e:
+                logging.warning(f"Running without sound: {str(e)}")
+        with self.startup.phase("input"):
+            inputs.allow()
+            if replay:
+                inputs.load(replay, fast)
+        with self.startup.phase("display"):
+            if inputs.size:
+                self.screen = pygame.display.set_mode(inputs.size)
+            elif os.environ.get("SKUF_FULLSCREEN"):
+                self.screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+            else:
+                self.screen = pygame.display.set_mode(parse_size(os.environ.get("SKUF_RESOLUTION", "800x600")))
+            viewport.set_output(self.screen.get_size())
+            pygame.display.set_caption(caption)
+            self.clock = Clock()
+            if os.environ.get("SKUF_RECORD") and not replay:
+                inputs.record(os.environ["SKUF_RECORD"], self.screen.get_size())
+        with self.startup.phase("manager"):
+            self.manager = GameManager(self.screen, self.clock)
+        with self.startup.phase("first frame"):
+            self.screen.fill((0, 0, 0))
+            if splash:
+                try:
+                    self.screen.blit(viewport.screen_image(splash), viewport.offset)
+                except pygame.error as e:
+                    logging.error(f"Could not load splash image {splash}: {str(e)}")
+            inputs.flip()
+
+        logging.info("Startup:\n" + self.startup.report())
+        budget = os.environ.get("SKUF_STARTUP_BUDGET")
+        if budget:
+            self.startup.check(float(budget))
+        return self.manager
+
+engine = Engine()
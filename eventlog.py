@@ -0,0 +1,235 @@
+"""
+Event Log Module for Visual Novel Engine
+
+Keeps file writes off the render thread. Text logging goes through a
+QueueHandler to a listener thread, and game events (scene entered,
+choice made, ending reached) are written by a background thread in
+batches to an append-only JSON lines file.
+
+Event record, one JSON object per line with short keys:
+
+    {"t": 1760712000.123, "s": "3f2a9c1b7d4e", "e": "choice",
+     "scene": "novel", "text": "Подать ключ на 15.", "target": "fix"}
+
+    t: Unix time in seconds
+    s: Session ID, one per game process
+    e: Event type: "start", "scene" (scene), "choice" (scene, text and
+       target for script choices), "ending" (ending), "rollback"
+       (scene, line) or "reload" (scene, line)
+
+Usage:
+    python eventlog.py stats events.jsonl [more.jsonl ...] [--json]
+
+Classes:
+    EventLog: Batched background writer for game events
+
+Attributes:
+    eventlog: Shared event log instance used by the engine
+"""
+
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+EVENT_FILE = "events.jsonl"   # Default event log file
+BATCH_SIZE = 64               # Events written per batch at most
+FLUSH_INTERVAL = 1.0          # Seconds a batch waits for more events
+
+def setup_logging(filename, level=logging.INFO, format=None, datefmt=None):
+    """
+    Route logging through a queue to a file written on a listener thread
+
+    Args:
+        filename: Log file path
+        level: Root logger level
+        format: Record format string
+        datefmt: Date format string
+
+    Returns:
+        logging.handlers.QueueListener: Started listener, stopped at exit
+    """
+    handler = logging.FileHandler(filename, encoding="utf-8")
+    handler.setFormatter(logging.Formatter(format, datefmt))
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # The queued record keeps only the message, the file handler adds the rest
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=level, handlers=[queue_handler])
+    return listener
+
+class EventLog:
+    """
+    Structured game event log written by a background thread
+
+    event() only puts a record on a queue. The writer thread collects up
+    to BATCH_SIZE records, waiting at most FLUSH_INTERVAL seconds, and
+    appends them to the file with a single write.
+
+    Attributes:
+        path: Event log file
+        session: Session ID stamped on every event
+        enabled: Whether events are recorded
+    """
+
+    def __init__(self, path=EVENT_FILE):
+        """
+        Initialize event log, the writer thread starts on the first event
+
+        Args:
+            path: Event log file
+        """
+        self.path = path
+        self.session = uuid.uuid4().hex[:12]
+        self.enabled = True
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+
+    def event(self, kind, **fields):
+        """
+        Record game event
+
+        Args:
+            kind: Event type
+            **fields: Event fields
+        """
+        if not self.enabled:
+            return
+        if self.thread is None:
+            self.start()
+        record = {"t": round(time.time(), 3), "s": self.session, "e": kind}
+        record.update(fields)
+        self.queue.put(record)
+
+    def start(self):
+        """Start the writer thread and record the session start"""
+        self.thread = threading.Thread(target=self.write, name="eventlog", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+        self.event("start")
+
+    def write(self):
+        """Writer thread loop, None on the queue stops it"""
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while batch[-1] is not None and len(batch) < BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                running = False
+            if batch:
+                lines = "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                                for record in batch)
+                try:
+                    with open(self.path, "a", encoding="utf-8") as file:
+                        file.write(lines)
+                except OSError as e:
+                    logging.error(f"Could not write event log: {str(e)}")
+
+    def close(self):
+        """Flush queued events and stop the writer thread"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+eventlog = EventLog()
+
+# === Aggregation ===
+def count_file(path):
+    """
+    Count events of one log file
+
+    Args:
+        path: Event log file
+
+    Returns:
+        tuple: Counters of sessions, scenes, choices and endings
+    """
+    sessions, scenes, choices, endings = set(), Counter(), Counter(), Counter()
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Line cut short by a power loss
+            kind = record.get("e")
+            sessions.add(record.get("s"))
+            if kind == "scene":
+                scenes[record["scene"]] += 1
+            elif kind == "choice":
+                choices[(record["scene"], record["text"])] += 1
+            elif kind == "ending":
+                endings[record["ending"]] += 1
+    return sessions, scenes, choices, endings
+
+def aggregate(paths):
+    """
+    Merge event counts of many log files, in parallel processes
+
+    Args:
+        paths: Event log files
+
+    Returns:
+        dict: Session count, scene visits, choice and ending statistics
+    """
+    sessions, scenes, choices, endings = set(), Counter(), Counter(), Counter()
+    if len(paths) > 1:
+        with ProcessPoolExecutor() as pool:
+            results = list(pool.map(count_file, paths))
+    else:
+        results = [count_file(path) for path in paths]
+    for file_sessions, file_scenes, file_choices, file_endings in results:
+        sessions |= file_sessions
+        scenes.update(file_scenes)
+        choices.update(file_choices)
+        endings.update(file_endings)
+    return {
+        "sessions": len(sessions),
+        "scenes": dict(scenes.most_common()),
+        "choices": [{"scene": scene, "text": text, "count": count}
+                    for (scene, text), count in choices.most_common()],
+        "endings": dict(endings.most_common()),
+    }
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Event log tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stats = sub.add_parser("stats", help="Choice and ending statistics of event logs")
+    stats.add_argument("paths", nargs="+")
+    stats.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    result = aggregate(args.paths)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    print(f"sessions: {result['sessions']}")
+    print("\nendings:")
+    for ending, count in result["endings"].items():
+        print(f"{count:>8}  {ending}")
+    print("\nchoices:")
+    for choice in result["choices"]:
+        print(f"{choice['count']:>8}  {choice['scene']}: {choice['text']}")
+
+if __name__ == "__main__":
+    sys.exit(main())
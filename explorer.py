@@ -0,0 +1,447 @@
+"""
+Story explorer for the visual novel engine
+
+Plays every path through the game without a window and reports what
+it reached. A path is the list of menu items chosen from the main
+menu on. Each path is replayed from the start in a worker process:
+messages are revealed at once and transitions are instant. The game's
+own menus run on scripted input that clicks the item to pick. A path
+ends at the first menu it has no item for, which branches into one
+new path per item, or when the game is back at the main menu or stops.
+
+Paths of the same length are independent and run in parallel on a
+process pool, one started game per worker. The assets are checked and
+a game is started once before the pool, a game that cannot start is
+reported without exploring.
+
+Report:
+    endings: Scene before the return to the main menu, with the path
+        count and the shortest path reaching it, for the paths that
+        played story script scenes
+    other: The same for paths that never entered the story, such as
+        the help screen or quitting from the main menu
+    unreachable: Script and Python scenes no path visited
+    missing assets: Files named by the script or skuf.py, including
+        character sprites, that exist neither loose nor in the asset
+        archive
+    errors: Exceptions and logged errors, per path
+    time: Per path and total
+
+Usage:
+    python explorer.py [--workers N] [--max-choices N] [--output FILE]
+
+Exits with 1 if anything is unreachable, missing or failing.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+# SDL turns SIGTERM into a quit event, the pool could not stop its workers
+os.environ.setdefault("SDL_NO_SIGNAL_HANDLERS", "1")
+
+import pygame
+import skuf
+import stage
+from archive import archive
+from viewport import viewport
+from inputs import inputs
+from menu import create_menus, defF as MENU_FONT
+from dialog import FPS, BOX_IMAGE, NEXT_IMAGE, defF as DIALOG_FONT
+
+START = "mmenu"     # Scene every path starts from and ends at
+MAX_CHOICES = 64    # Paths with more choices are reported as too long
+MAX_READS = 100000  # Input reads a path may take before it counts as stuck
+EXIT = "exit"       # Ending name of paths that quit the game
+
+
+class PathEnd(BaseException):
+    """
+    Stops a path run
+
+    Derives from BaseException so that the broad error handlers of
+    scenes let it through, like history.Rollback.
+
+    Attributes:
+        scene: Scene showing the menu, None at the return to START
+        items: Menu items to branch into, None at the return to START
+    """
+
+    def __init__(self, scene=None, items=None):
+        super().__init__(scene)
+        self.scene = scene
+        self.items = items
+
+
+class Stuck(BaseException):
+    """Stops a path that keeps waiting for input it does not get"""
+
+
+class ErrorLog(logging.Handler):
+    """Collects messages of logged errors"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class ScriptedPlayer:
+    """
+    Plays one path at a time on the game manager of a worker
+
+    Replaces dialog and image display of the manager and is the
+    scripted input source of the input layer: menus get a click on the
+    item to pick, everything else a key press. Every registered scene
+    and the script fallback are wrapped to record the scenes a path
+    visits.
+
+    Attributes:
+        manager: Game manager being played
+        choices: Menu items still to pick
+        visited: Scene IDs in the order they ran
+        target: Position of the menu item to click, None outside menus
+        reads: Input reads of the running path
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.choices = []
+        self.visited = []
+        self.target = None
+        self.reads = 0
+        self.menu = manager.show_menu
+        manager.show_dialogs = self.show_dialogs
+        manager.show_menu = self.show_menu
+        manager.show_image = self.show_image
+        manager.fps = 0
+        manager.transition_ms = 0
+        for name, handler in list(manager.scenes.items()):
+            manager.scenes[name] = self.track(name, handler)
+        inputs.script(self, FPS)
+
+    def __call__(self):
+        """Get the events of one read"""
+        self.reads += 1
+        if self.reads > MAX_READS:
+            raise Stuck(f"No way on after {MAX_READS} input reads in {self.manager.scene}")
+        if self.target:
+            return [pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=self.target, button=1)]
+        return [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN, mod=0, unicode="\r",
+                                   scancode=0)]
+
+    def track(self, name, handler):
+        """Wrap a scene to record it and to stop at the return to START"""
+        def scene():
+            if name == START and self.visited:
+                raise PathEnd()
+            self.visited.append(name)
+            return handler()
+        return scene
+
+    def fallback(self, name):
+        """Script scene runner recording the scene"""
+        self.visited.append(name)
+        return skuf.play(name)
+
+    def show_dialogs(self, dialog_list, background=None, first_line=None, directions=None):
+        screen = self.manager.screen
+        for direction in directions or ():
+            self.manager.stage.direct(*direction[1:])
+        if background:
+            background.back()
+        dialog = self.manager.dialog
+        for message in dialog_list:
+            dialog.start((message,))
+            dialog.reveal_all()
+            dialog.draw(screen)
+
+    def show_menu(self, menu_items, background_image=None):
+        """Show the game menu with the next choice as the item to click"""
+        if not self.choices:
+            raise PathEnd(self.manager.scene, list(menu_items))
+        choice = self.choices.pop(0)
+        if choice not in menu_items:
+            raise ValueError(f"No menu item {choice!r} in {self.manager.scene}")
+        self.target = create_menus(menu_items)[list(menu_items).index(choice)].rect.center
+        try:
+            selected = self.menu(menu_items, background_image)
+        finally:
+            self.target = None
+        if selected != choice:
+            raise ValueError(f"Clicked {choice!r} in {self.manager.scene}, menu gave {selected!r}")
+        return selected
+
+    def show_image(self, image, kind=None):
+        self.manager.screen.blit(image, viewport.offset)
+
+    def play(self, path):
+        """
+        Replay a path from START
+
+        Args:
+            path: Menu items to choose, in order
+
+        Returns:
+            dict: Path result, see explore()
+        """
+        self.choices = list(path)
+        self.visited = []
+        self.target = None
+        self.reads = 0
+        self.manager.history.clear()
+        self.manager.resume = None
+        pygame.event.clear()
+        inputs.posted.clear()
+        result = {"path": list(path), "kind": "end", "ending": None, "scene": None, "items": None}
+        start = time.perf_counter()
+        try:
+            self.manager.run(START, self.fallback)
+        except PathEnd as end:
+            if end.items is not None:
+                result.update(kind="menu", scene=end.scene, items=end.items)
+        except SystemExit:
+            result["ending"] = EXIT
+        except (Exception, Stuck) as e:
+            result.update(kind="error", error=f"{type(e).__name__}: {str(e)}")
+        if result["kind"] == "end" and result["ending"] is None:
+            result["ending"] = self.visited[-1] if self.visited else None
+        result["ms"] = (time.perf_counter() - start) * 1000
+        result["visited"] = self.visited
+        result["scenes"] = sorted(name for name in self.manager.scenes)
+        return result
+
+
+_player = None   # Player of the worker process
+_errors = None   # Error log of the worker process
+_failure = None  # Why the worker's game did not start
+
+
+def start_game():
+    """
+    Start a game without a window
+
+    Returns:
+        GameManager: Game manager ready to run
+
+    Raises:
+        Exception: If the game does not start
+    """
+    from seen import seen
+    from eventlog import eventlog
+    seen.path = None            # Exploring must not mark lines as seen
+    eventlog.enabled = False    # or fill the game event log
+    return skuf.setup(log_file=None)
+
+
+def start_worker():
+    """Start a game in a worker process, a failure is reported by every path run"""
+    global _player, _errors, _failure
+    _errors = ErrorLog()
+    logging.getLogger().addHandler(_errors)
+    try:
+        _player = ScriptedPlayer(start_game())
+    except Exception as e:
+        _failure = f"Game did not start: {type(e).__name__}: {str(e)}"
+
+
+def run_path(path):
+    """
+    Play one path in a worker
+
+    Args:
+        path: Tuple of menu items to choose
+
+    Returns:
+        dict: Path result
+    """
+    if _player is None:
+        result = {"path": list(path), "kind": "error", "ending": None, "scene": None,
+                  "items": None, "error": _failure, "ms": 0.0, "visited": [], "scenes": []}
+    else:
+        _errors.messages = []
+        result = _player.play(path)
+    result["errors"] = _errors.messages
+    return result
+
+
+def preflight():
+    """
+    Check that the game can be explored, before starting the workers
+
+    Returns:
+        dict: Report of the failed check, see explore(), None if the
+            game started
+    """
+    start = time.perf_counter()
+    missing = missing_assets()
+    error, errors = None, ErrorLog()
+    if not missing:
+        logging.getLogger().addHandler(errors)
+        try:
+            start_game()
+        except Exception as e:
+            error = f"Game did not start: {type(e).__name__}: {str(e)}"
+        finally:
+            logging.getLogger().removeHandler(errors)
+    if not (missing or error or errors.messages):
+        return None
+    return {
+        "endings": {},
+        "other": {},
+        "unreachable": [],
+        "missing": missing,
+        "errors": [{"path": [], "error": error, "logged": errors.messages}] if error or errors.messages
+                  else [],
+        "too_long": [],
+        "paths": [],
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def missing_assets():
+    """
+    Find asset files named by the script or skuf.py that do not exist
+
+    Returns:
+        list: Missing file paths with the scene naming them
+    """
+    wanted = [(path, "skuf.py") for path in (skuf.END, skuf.MUSIC, skuf.CLICK)]
+    wanted += [(path, "dialog.py") for path in (BOX_IMAGE, NEXT_IMAGE, DIALOG_FONT)]
+    wanted.append((MENU_FONT, "menu.py"))
+    story = skuf.story()
+    for name in story.index:
+        scene = story.scene(name)
+        if scene.background:
+            wanted.append((skuf.background(scene.background).path, name))
+        if scene.music:
+            wanted.append((os.path.join("audio", scene.music), name))
+        shown = {}  # Expressions on stage, characters keep theirs when shown again
+        for index, command, character, expression, position in scene.stage:
+            if command == "show":
+                shown[character] = expression or shown.get(character, stage.EXPRESSION)
+                wanted.append((stage.sprite_path(character, shown[character]), name))
+            else:
+                shown.pop(character, None)
+    return [f"{path} ({where})" for path, where in wanted
+            if path not in archive and not os.path.exists(path)]
+
+
+def explore(workers=None, max_choices=MAX_CHOICES):
+    """
+    Play every path through the game
+
+    Args:
+        workers: Worker processes, one per CPU if None
+        max_choices: Paths are not extended past this many choices
+
+    Returns:
+        dict: Report with endings, unreachable scenes, missing assets,
+            errors, too long paths, all path results and timings. Only
+            the missing assets and errors if the game does not start.
+    """
+    report = preflight()
+    if report:
+        return report
+    start = time.perf_counter()
+    results, frontier, too_long = [], [()], []
+    # Workers start their own game, a forked copy of the checked one
+    # would lack the threads of the asset cache and audio
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=start_worker) as pool:
+        while frontier:
+            branches = []
+            for result in pool.imap_unordered(run_path, frontier):
+                results.append(result)
+                if result["kind"] != "menu":
+                    continue
+                path = tuple(result["path"])
+                # A scene visited twice means the choices lead around a loop
+                if len(path) >= max_choices or len(set(result["visited"])) < len(result["visited"]):
+                    too_long.append(result["path"])
+                    continue
+                branches += [path + (item,) for item in result["items"]]
+            frontier = branches
+        pool.close()
+        pool.join()
+
+    story = set(skuf.story().index)
+    endings, other = {}, {}
+    for result in sorted(results, key=lambda result: len(result["path"])):
+        if result["kind"] == "end":
+            # Paths that never played a script scene end outside the story
+            found = endings if story.intersection(result["visited"]) else other
+            ending = found.setdefault(result["ending"], {"paths": 0, "shortest": result["path"]})
+            ending["paths"] += 1
+    visited = {name for result in results for name in result["visited"]}
+    scenes = story | {name for result in results for name in result["scenes"]}
+    return {
+        "endings": endings,
+        "other": other,
+        "unreachable": sorted(scenes - visited),
+        "missing": missing_assets(),
+        "errors": [{"path": result["path"], "error": result.get("error"), "logged": result["errors"]}
+                   for result in results if result["kind"] == "error" or result["errors"]],
+        "too_long": too_long,
+        "paths": results,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def percentile(values, q):
+    """Get the q-th quantile of values, nearest rank"""
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def print_report(report):
+    """Print explorer report for people"""
+    times = [result["ms"] for result in report["paths"]]
+    if times:
+        print(f"{len(times)} path runs in {report['seconds']:.2f} s, "
+              f"per path p50 {percentile(times, 0.5):.1f} ms, max {max(times):.1f} ms")
+    else:
+        print("Nothing explored, the game does not start")
+    for title, key in (("ending", "endings"), ("no story", "other")):
+        if report[key]:
+            print(f"{title:>12} {'paths':>6}  shortest path")
+        for ending, info in sorted(report[key].items(), key=lambda item: str(item[0])):
+            print(f"{str(ending):>12} {info['paths']:>6}  {' > '.join(info['shortest'])}")
+    for title, key in (("Unreachable scenes", "unreachable"), ("Missing assets", "missing"),
+                       ("Paths stopped at the choice limit or a loop", "too_long")):
+        if report[key]:
+            print(f"{title}:")
+            for item in report[key]:
+                print(f"    {' > '.join(item) if isinstance(item, list) else item}")
+    for error in report["errors"]:
+        print(f"Error on {' > '.join(error['path']) or 'start'}:")
+        for message in filter(None, [error["error"]] + error["logged"]):
+            print(f"    {message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play every path through the story")
+    parser.add_argument("--workers", type=int, help="Worker processes, one per CPU by default")
+    parser.add_argument("--max-choices", type=int, default=MAX_CHOICES)
+    parser.add_argument("--output", help="Save the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = explore(args.workers, args.max_choices)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return 1 if report["unreachable"] or report["missing"] or report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
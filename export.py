@@ -0,0 +1,434 @@
+"""
+Frame exporter for the visual novel engine
+
+Plays scenes offscreen and writes every frame to disk, for trailers and
+storyboards. No window is opened and time is virtual: every frame
+advances the clock by exactly 1/fps seconds however long it takes to
+render, so text reveal and transitions look as they do in the game,
+only the export runs faster than real time.
+
+The game is played by a director instead of a player: it waits on
+every full dialog page, end screen and menu for a hold time, then
+presses Enter or moves to the chosen menu item and clicks it. The
+export starts at the first given scene and stops when the game enters
+a scene that was not given, returns to nowhere or quits.
+
+Frames are copied from the screen once, into a preallocated buffer
+from a small pool, and handed to encoder threads. PNG files are
+deflated by zlib, which runs outside the GIL, straight from the buffer
+rows. A frame in which nothing was presented reuses the previous
+frame's buffer and encoded data. When all buffers are in use the game
+waits for the encoders.
+
+Formats:
+    png  One frame_NNNNNN.png per frame
+    raw  All frames in frames.raw as BGRA pixels, described by
+         frames.json, e.g. for ffmpeg -f rawvideo -pix_fmt bgra
+
+Usage:
+    python export.py SCENE [SCENE ...] [--choose ITEM ...] [--format png|raw]
+        [--fps N] [--size WxH] [--hold MS] [--workers N] [--level N] [--output DIR]
+"""
+
+import os
+import sys
+import json
+import zlib
+import time
+import queue
+import struct
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+PNG, RAW = "png", "raw"
+FPS = 30             # Frame rate of the exported frames
+HOLD = 1500          # Milliseconds the director waits before moving on
+LEVEL = 3            # PNG deflate level, 1 fastest to 9 smallest
+MAX_SECONDS = 600    # Exports are stopped after this much video
+PNG_NAME = "frame_{:06d}.png"
+RAW_FILE = "frames.raw"
+RAW_FORMAT = "BGRA"  # The display's own layout, captured with a plain copy
+OUTPUT = "frames"
+
+
+class ExportEnd(BaseException):
+    """
+    Stops the export
+
+    Derives from BaseException so that the broad error handlers of
+    scenes let it through, like history.Rollback.
+    """
+
+
+def chunk(kind, data):
+    """Frame PNG chunk data with its length and CRC"""
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)))
+
+
+def encode_png(pixels, size, level=LEVEL):
+    """
+    Encode RGB pixels as a PNG file
+
+    Rows are fed to the compressor one by one behind their filter
+    byte, so the pixels are not copied into a scanline buffer first.
+
+    Args:
+        pixels: Buffer of width * height RGB pixels, top row first
+        size: (width, height)
+        level: Deflate level
+
+    Returns:
+        bytes: PNG file
+    """
+    width, height = size
+    stride = width * 3
+    view = memoryview(pixels)
+    compressor = zlib.compressobj(level)
+    parts = []
+    for y in range(height):
+        parts.append(compressor.compress(b"\0"))  # Filter type None
+        parts.append(compressor.compress(view[y * stride:(y + 1) * stride]))
+    parts.append(compressor.flush())
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)  # 8-bit RGB
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", b"".join(parts))
+            + chunk(b"IEND", b""))
+
+
+class Frame:
+    """
+    Reusable frame buffer
+
+    Attributes:
+        buffer: Pixels of the frame
+        surface: Surface drawing into the buffer
+        users: Writes pending on the frame, plus one while it is the
+            latest frame
+        data: Encoded frame, shared by the writes of repeated frames
+    """
+
+    def __init__(self, size, fmt):
+        self.buffer = bytearray(size[0] * size[1] * len(fmt))
+        self.surface = pygame.image.frombuffer(self.buffer, size, fmt)
+        self.users = 0
+        self.data = None
+        self.lock = threading.Lock()
+
+
+class FrameWriter:
+    """
+    Writes screen frames on a pool of encoder threads
+
+    Attributes:
+        screen: Surface the frames are taken from
+        output: Output directory
+        kind: PNG or RAW
+        size: Frame (width, height)
+        frames: Frames captured
+        unique: Frames that were copied from the screen, the rest
+            repeat the frame before them
+        waited: Seconds the game waited for a free buffer
+        encoding: Seconds the encoder threads spent encoding
+    """
+
+    def __init__(self, screen, output=OUTPUT, kind=PNG, workers=None, level=LEVEL):
+        """
+        Initialize writer, the output directory is created if needed
+
+        Args:
+            screen: Surface the frames are taken from
+            output: Output directory
+            kind: PNG or RAW
+            workers: Encoder threads, one per CPU if None
+            level: PNG deflate level
+        """
+        self.screen = screen
+        self.output = output
+        self.kind = kind
+        self.level = level
+        self.size = screen.get_size()
+        workers = workers or os.cpu_count() or 1
+        self.free = queue.Queue()
+        # One buffer being encoded and one waiting per worker, and the latest frame
+        for _ in range(2 * workers + 1):
+            self.free.put(Frame(self.size, "RGB" if kind == PNG else RAW_FORMAT))
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="export")
+        self.lock = threading.Lock()
+        self.last = None
+        self.frames = self.unique = 0
+        self.waited = self.encoding = 0.0
+        self.error = None
+        os.makedirs(output, exist_ok=True)
+        self.file = open(os.path.join(output, RAW_FILE), "wb") if kind == RAW else None
+        self.file_lock = threading.Lock()
+
+    def capture(self, presented=True):
+        """
+        Queue the screen as the next frame
+
+        Args:
+            presented: Whether the screen changed since the last frame
+
+        Raises:
+            Exception: The first error of an encoder thread
+        """
+        if self.error:
+            raise self.error
+        if presented or self.last is None:
+            start = time.perf_counter()
+            frame = self.free.get()
+            self.waited += time.perf_counter() - start
+            frame.surface.blit(self.screen, (0, 0))
+            frame.data = None
+            frame.users = 1
+            if self.last is not None:
+                self.release(self.last)
+            self.last = frame
+            self.unique += 1
+        with self.lock:
+            self.last.users += 1
+        self.pool.submit(self.write, self.frames, self.last)
+        self.frames += 1
+
+    def release(self, frame):
+        """Return a frame to the pool once nothing uses it"""
+        with self.lock:
+            frame.users -= 1
+            if frame.users:
+                return
+        self.free.put(frame)
+
+    def encode(self, frame):
+        if self.kind == RAW:
+            return frame.buffer
+        start = time.perf_counter()
+        data = encode_png(frame.buffer, self.size, self.level)
+        with self.lock:
+            self.encoding += time.perf_counter() - start
+        return data
+
+    def write(self, index, frame):
+        """Encode a frame once and write it, runs on the pool"""
+        try:
+            with frame.lock:
+                if frame.data is None:
+                    frame.data = self.encode(frame)
+            if self.file:
+                with self.file_lock:
+                    self.file.seek(index * len(frame.buffer))
+                    self.file.write(frame.data)
+            else:
+                with open(os.path.join(self.output, PNG_NAME.format(index)), "wb") as file:
+                    file.write(frame.data)
+        except Exception as e:
+            self.error = self.error or e
+        finally:
+            self.release(frame)
+
+    def close(self, fps=FPS):
+        """
+        Wait for the encoders and finish the output
+
+        Args:
+            fps: Frame rate noted in the description of raw output
+
+        Raises:
+            Exception: The first error of an encoder thread
+        """
+        if self.last is not None:
+            self.release(self.last)
+            self.last = None
+        self.pool.shutdown(wait=True)
+        if self.file:
+            self.file.close()
+            with open(os.path.join(self.output, "frames.json"), "w", encoding="utf-8") as file:
+                json.dump({"width": self.size[0], "height": self.size[1], "fps": fps,
+                           "pix_fmt": RAW_FORMAT.lower(), "frames": self.frames}, file, indent=2)
+        if self.error:
+            raise self.error
+
+
+class Director:
+    """
+    Plays the game as the scripted input source of the input layer
+
+    Attributes:
+        manager: Game manager being played
+        choices: Menu items still to pick, the first item is picked when
+            there are none left
+        hold: Milliseconds to wait on a full page, screen or menu
+    """
+
+    def __init__(self, manager, choices=(), hold=HOLD):
+        self.manager = manager
+        self.choices = list(choices)
+        self.hold = hold
+        self.target = None   # Position of the menu item to click
+        self.hovered = False
+        self.state = None    # What the game is waiting on
+        self.since = 0       # Session time the state began
+        self.menu = manager.show_menu
+        manager.show_menu = self.show_menu
+
+    def show_menu(self, menu_items, background_image=None):
+        """Show the game menu with the next choice as the item to click"""
+        choice = self.choices.pop(0) if self.choices else menu_items[0]
+        if choice not in menu_items:
+            raise ValueError(f"No menu item {choice!r} in {self.manager.scene}")
+        from menu import create_menus
+        self.target = create_menus(menu_items)[list(menu_items).index(choice)].rect.center
+        self.hovered = False
+        try:
+            return self.menu(menu_items, background_image)
+        finally:
+            self.target = None
+
+    def __call__(self):
+        """Get the events of one read"""
+        from inputs import inputs
+        from dialog import REVEAL
+        dialog = self.manager.dialog
+        if self.target:
+            state = "menu"
+        elif dialog.show:
+            state = (dialog.state, dialog.page, dialog.line)
+        else:
+            state = self.manager.scene  # Screen drawn by a scene
+        if state != self.state:
+            self.state, self.since = state, inputs.time
+        held = inputs.time - self.since
+
+        if self.target:
+            if held >= self.hold:
+                pos, self.target = self.target, None
+                return [pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1)]
+            if held >= self.hold / 2 and not self.hovered:
+                self.hovered = True
+                return [pygame.event.Event(pygame.MOUSEMOTION, pos=self.target, rel=(0, 0),
+                                           buttons=(0, 0, 0))]
+            return []
+        if dialog.show and dialog.state == REVEAL:
+            return []
+        if held >= self.hold:
+            self.since = inputs.time  # Press again if the press was not taken
+            return [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN, mod=0, unicode="\r",
+                                       scancode=0)]
+        return []
+
+
+def export(scenes, output=OUTPUT, kind=PNG, fps=FPS, choices=(), hold=HOLD, workers=None,
+           level=LEVEL, max_seconds=MAX_SECONDS):
+    """
+    Play scenes offscreen and write their frames
+
+    Args:
+        scenes: Scene IDs to play, starting with the first
+        output: Output directory
+        kind: PNG or RAW
+        fps: Frame rate of the exported frames
+        choices: Menu items to pick, in order
+        hold: Milliseconds the director waits before moving on
+        workers: Encoder threads, one per CPU if None
+        level: PNG deflate level
+        max_seconds: Seconds of video after which the export stops
+
+    Returns:
+        dict: Export report with frame counts, video and wall seconds,
+            frames per second and the time spent waiting for encoders
+    """
+    import skuf
+    from seen import seen
+    from eventlog import eventlog
+    from inputs import inputs
+    from dialog import SKIP_NONE
+    seen.path = None            # Exporting must not mark lines as seen
+    eventlog.enabled = False    # or fill the game event log
+    manager = skuf.setup(log_file=None)
+    manager.dialog.skip = SKIP_NONE
+    director = Director(manager, choices, hold)
+
+    def enter(name):
+        if name not in scenes:
+            raise ExportEnd(name)
+
+    def track(name, handler):
+        """Wrap a scene to stop at the first scene not exported"""
+        def scene():
+            enter(name)
+            return handler()
+        return scene
+
+    def fallback(name):
+        """Script scene runner stopping at the first scene not exported"""
+        enter(name)
+        return skuf.play(name)
+
+    def capture(presented):
+        if writer.frames >= max_seconds * fps:
+            raise ExportEnd(None)
+        writer.capture(presented)
+
+    for name, handler in list(manager.scenes.items()):
+        manager.scenes[name] = track(name, handler)
+    writer = FrameWriter(manager.screen, output, kind, workers, level)
+    inputs.script(director, fps)
+    inputs.capture = capture
+    start = time.perf_counter()
+    try:
+        manager.run(scenes[0], fallback)
+    except (ExportEnd, SystemExit):
+        pass
+    finally:
+        inputs.capture = None
+        writer.close(fps)
+    seconds = time.perf_counter() - start
+    return {
+        "output": output,
+        "format": kind,
+        "size": list(writer.size),
+        "frames": writer.frames,
+        "unique": writer.unique,
+        "video_seconds": writer.frames / fps,
+        "seconds": seconds,
+        "fps": writer.frames / seconds if seconds else 0.0,
+        "realtime": writer.frames / fps / seconds if seconds else 0.0,
+        "waited": writer.waited,
+        "encoding": writer.encoding,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play scenes offscreen and write their frames")
+    parser.add_argument("scenes", nargs="+", help="Scenes to play, starting with the first")
+    parser.add_argument("--choose", action="append", default=[], metavar="ITEM",
+                        help="Menu item to pick, repeat for later menus, the first item by default")
+    parser.add_argument("--format", choices=(PNG, RAW), default=PNG)
+    parser.add_argument("--fps", type=int, default=FPS)
+    parser.add_argument("--size", help="Frame size WxH, the window size of the game by default")
+    parser.add_argument("--hold", type=int, default=HOLD, help="Milliseconds to wait on pages and menus")
+    parser.add_argument("--workers", type=int, help="Encoder threads, one per CPU by default")
+    parser.add_argument("--level", type=int, default=LEVEL, help="PNG deflate level")
+    parser.add_argument("--max-seconds", type=int, default=MAX_SECONDS)
+    parser.add_argument("--output", default=OUTPUT)
+    args = parser.parse_args(argv)
+
+    if args.size:
+        os.environ["SKUF_RESOLUTION"] = args.size
+    report = export(args.scenes, args.output, args.format, args.fps, args.choose, args.hold,
+                    args.workers, args.level, args.max_seconds)
+    print(f"{report['frames']} frames ({report['unique']} unique), {report['video_seconds']:.1f} s "
+          f"of video at {args.fps} fps, {report['size'][0]}x{report['size'][1]}")
+    print(f"Exported in {report['seconds']:.2f} s: {report['fps']:.1f} frames/s, "
+          f"{report['realtime']:.1f}x real time, encoding {report['encoding']:.2f} s, "
+          f"waited {report['waited']:.2f} s for encoders")
+    print(f"Output: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,17 +2,25 @@
 Game Manager Module for Visual Novel Engine
 
 Coordinates dialog and menu systems, manages game state and screen rendering.
-Acts as a facade for the dialog and menu subsystems.
+Acts as a facade for the dialog and menu subsystems and schedules scenes.
 
 Classes:
     GameManager: Main coordinator class for game systems
 """
 
 import pygame
-from dialog import Dialog
+from dialog import Dialog, FPS, DIRTY_RECTS
 from menu import Menu, generate_menu
+from profiler import profiler
+from eventlog import eventlog
+from seen import seen
+from history import History, Rollback, browse
+import transitions
+from viewport import viewport
+from inputs import inputs, Clock
+from stage import Stage
 import logging
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
 
 class GameManager:
     """
@@ -23,39 +31,136 @@ class GameManager:
     - Menu generation and interaction
     - Background management
     - Screen state coordination
+    - Scene scheduling
+    
+    Scenes are functions returning the ID of the next scene, or None to
+    stop. run() dispatches them from a single loop, so moving between
+    scenes never grows the call stack. Profiled frames are attributed
+    to the scene being run and every scene change goes to the event log.
+    
+    Read messages and made choices are recorded in a bounded history.
+    Rolling back to one of them restarts its scene and skips the script
+    lines before it. A reload in development mode restarts the running
+    scene the same way, at the line being shown.
+    
+    Dialogs over a background are shown on a stage, the cached composite
+    of the background, the characters and the dialog box.
     
     Attributes:
         screen: Main pygame surface for rendering
         dialog: Dialog system instance
+        stage: Layered composite of background, characters and dialog box
+        clock: Clock shared by all frame loops
+        fps: Frame rate cap
+        dirty_rects: Update only changed screen regions instead of flipping
+        scenes: Registered scene functions keyed by scene ID
+        scene: ID of the running scene
+        line: Script line ID being shown, or the ID after the scene's last
+            line once its dialogs are done, None outside script lines
+        history: Backlog of read messages and made choices
+        resume: Script line ID a rolled back scene continues from, or None
+        transition: Transition kind used when the background changes, None cuts
+        transition_ms: Transition time in milliseconds
     """
     
-    def __init__(self, screen: pygame.Surface):
+    def __init__(self, screen: pygame.Surface, clock: Optional[Clock] = None, fps: int = FPS,
+                 dirty_rects: bool = DIRTY_RECTS):
         """
         Initialize game manager
         
         Args:
             screen: Pygame surface to render game elements on
+            clock: Shared clock, a new one is created if None
+            fps: Frame rate cap for dialog and menu loops
+            dirty_rects: Use dirty rectangle updates, False falls back to full flips
         """
         self.screen = screen
         self.dialog = Dialog(screen)
+        self.stage = Stage(screen)
+        self.clock = clock or Clock()
+        self.fps = fps
+        self.dirty_rects = dirty_rects
+        self.dialog.dirtyRects = dirty_rects
+        self.scenes: Dict[str, Callable[[], Optional[str]]] = {}
+        self.scene: Optional[str] = None
+        self.line: Optional[int] = None
+        self.history = History()
+        self.resume: Optional[int] = None
+        self.backlog_dialog: Optional[Dialog] = None
+        self.dialog.onBacklog = self.show_backlog
+        self.transition: Optional[str] = "dissolve"
+        self.transition_ms = transitions.DURATION
+        self.shown_background: Optional[object] = None
         
-    def show_dialogs(self, dialog_list: List[str], background: Optional[object] = None):
+    def show_dialogs(self, dialog_list: List[str], background: Optional[object] = None,
+                     first_line: Optional[int] = None, directions: Optional[tuple] = None):
         """
         Display a sequence of dialog messages
         
+        Messages with a line ID are recorded in the seen lines index,
+        which decides what the dialog skip mode skips.
+        
         Args:
             dialog_list: List of dialog messages to display
             background: Optional background object to render behind dialogs
+            first_line: Script line ID of the first message, None for
+                messages that are not from the story script
+            directions: Stage directions of a story scene, see
+                story.Scene.stage. The stage is cleared first if given,
+                otherwise the characters on it stay
         """
-        # Draw background if provided
+        if directions is not None:
+            self.stage.clear()
+        pending = list(directions or ())
+        self.direct(pending, 0)
+        
+        # Draw the stage if there is a background, the dialog repaints
+        # from it. A new background blends in, the one already shown is
+        # redrawn.
         if background:
-            background.back()
+            self.stage.set_background(background)
+            if self.transition and background is not self.shown_background:
+                transitions.play(self.screen, self.stage.bitmap, self.transition,
+                                 self.transition_ms, self.clock, self.fps, pos=self.stage.pos)
+            else:
+                self.stage.back()
+        self.shown_background = background
+        self.dialog.background = background
+        self.dialog.stage = self.stage if background else None
             
         # Process each dialog message
-        for message in dialog_list:
+        for index, message in enumerate(dialog_list):
+            self.direct(pending, index)
+            line = None if first_line is None else first_line + index
+            if line is not None and self.resume is not None:
+                if line < self.resume:
+                    continue  # Rolled back past this line
+                self.resume = None
+            self.line = line
             self.dialog.message = (message,)
-            self.dialog.show = True
-            self.dialog.sndNext()
+            self.dialog.sndNext(self.clock, self.fps, line is not None and line in seen)
+            self.history.line(self.scene, line, background, message)
+            if line is not None:
+                seen.add(line)
+        if first_line is not None:
+            self.line = first_line + len(dialog_list)
+        if pending:
+            self.direct(pending, len(dialog_list))  # Directions after the last line
+            if background:
+                self.stage.back()
+        seen.save()
+
+    def direct(self, directions: list, index: int):
+        """
+        Carry out the stage directions before a line
+        
+        Args:
+            directions: Pending (index, command, name, expression, position)
+                directions in line order, the ones carried out are removed
+            index: Index of the line about to be shown
+        """
+        while directions and directions[0][0] <= index:
+            self.stage.direct(*directions.pop(0)[1:])
             
     def show_menu(self, menu_items: List[str], background_image: Optional[pygame.Surface] = None):
         """
@@ -68,4 +173,77 @@ class GameManager:
         Returns:
             str: Selected menu item text or None if no selection
         """
-        return generate_menu(self.screen, menu_items, background_image)
\ No newline at end of file
+        self.resume = None
+        selected = generate_menu(self.screen, menu_items, background_image, self.dirty_rects,
+                                 self.clock, self.fps, self.show_backlog)
+        if selected is not None:
+            self.history.choice(self.scene, selected)
+        return selected
+
+    def show_image(self, image: pygame.Surface, kind: Optional[str] = "fade"):
+        """
+        Show full-screen image, such as an end screen
+        
+        Args:
+            image: Surface covering the viewport's logical area
+            kind: Transition kind, None cuts to the image
+        """
+        self.shown_background = None
+        if kind:
+            transitions.play(self.screen, image, kind, self.transition_ms, self.clock, self.fps,
+                             pos=viewport.offset)
+        else:
+            self.screen.blit(image, viewport.offset)
+            inputs.flip()
+
+    def show_backlog(self):
+        """
+        Browse history of read messages and made choices
+        
+        Raises:
+            Rollback: When the player rolls back, handled by run()
+        """
+        if self.backlog_dialog is None:
+            self.backlog_dialog = Dialog(self.screen)
+        browse(self.screen, self.backlog_dialog, self.history)
+
+    def add_scene(self, name: str, scene: Callable[[], Optional[str]]):
+        """
+        Register scene function
+        
+        Args:
+            name: Scene ID
+            scene: Function returning the next scene ID or None
+        """
+        self.scenes[name] = scene
+
+    def run(self, scene: Optional[str], fallback: Optional[Callable[[str], Optional[str]]] = None):
+        """
+        Play scenes until one returns None
+        
+        Args:
+            scene: ID of the first scene
+            fallback: Called with the scene ID for scenes that are not registered
+            
+        Raises:
+            KeyError: If a scene is not registered and there is no fallback
+        """
+        while scene is not None:
+            self.scene = profiler.scene = scene
+            self.line = None
+            eventlog.event("scene", scene=scene)
+            handler = self.scenes.get(scene)
+            try:
+                if handler is not None:
+                    scene = handler()
+                elif fallback is not None:
+                    scene = fallback(scene)
+                else:
+                    raise KeyError(f"Unknown scene: {scene}")
+                self.resume = None
+            except Rollback as rollback:
+                snapshot = rollback.snapshot
+                logging.info(f"{rollback.verb} {snapshot.scene}, line {snapshot.line}")
+                eventlog.event(rollback.event, scene=snapshot.scene, line=snapshot.line)
+                self.stage.set_box(None)  # The interrupted dialog left its box on stage
+                scene, self.resume = snapshot.scene, snapshot.line
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+History Module for Visual Novel Engine
+
+Keeps a bounded backlog of what the player has read and chosen, lets
+them scroll back through it and roll the game back to an earlier line
+or choice.
+
+Snapshots hold only references: scene ID, line ID, the shared
+background handle and the message or choice text. Backlog frames are
+rebuilt from them by drawing a dialog over the background image, no
+screen contents are copied or stored.
+
+Keys:
+    PageUp, mouse wheel up: Open backlog, step back
+    PageDown, mouse wheel down: Step forward, past the newest entry
+        closes the backlog
+    Enter: Roll back to the shown entry
+    Escape: Close backlog
+
+Classes:
+    Snapshot: Compact record of a read line or a made choice
+    Rollback: Raised to restart the game at a snapshot
+    History: Ring buffer of snapshots
+"""
+
+import pygame
+from inputs import inputs
+from collections import deque, namedtuple
+
+HISTORY = 256  # Snapshots kept, older ones are dropped
+
+Snapshot = namedtuple("Snapshot", "scene line background text choice")
+Snapshot.__doc__ = """
+Compact record of a read line or a made choice
+
+Attributes:
+    scene: ID of the scene that was running
+    line: Script line ID of the message, or of the last message before
+        the choice, None outside of script lines
+    background: Shared background handle or None
+    text: Message text, None for choices
+    choice: Chosen menu item, None for messages
+"""
+
+class Rollback(BaseException):
+    """
+    Request to restart the game at a snapshot
+
+    Not an error: derives from BaseException so that the broad error
+    handlers of scenes and menus let it through to GameManager.run().
+
+    Attributes:
+        snapshot: Snapshot to continue from
+        verb: Start of the log message
+        event: Event log record type
+    """
+
+    verb = "Rolled back to"
+    event = "rollback"
+
+    def __init__(self, snapshot):
+        super().__init__(snapshot.scene, snapshot.line)
+        self.snapshot = snapshot
+
+def is_backlog_event(event):
+    """
+    Check whether an event opens the backlog
+
+    Args:
+        event: Pygame event
+
+    Returns:
+        bool: True for PageUp and mouse wheel up
+    """
+    if event.type == pygame.KEYDOWN:
+        return event.key == pygame.K_PAGEUP
+    return event.type == pygame.MOUSEWHEEL and event.y > 0
+
+class History:
+    """
+    Ring buffer of snapshots, oldest first
+
+    Attributes:
+        snapshots: Recorded snapshots, at most size of them
+    """
+
+    def __init__(self, size=HISTORY):
+        """
+        Initialize empty history
+
+        Args:
+            size: Number of snapshots kept
+        """
+        self.snapshots = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def __getitem__(self, index):
+        return self.snapshots[index]
+
+    def line(self, scene, line, background, text):
+        """
+        Record read message
+
+        Args:
+            scene: Running scene ID
+            line: Script line ID or None
+            background: Background handle or None
+            text: Message text
+        """
+        self.snapshots.append(Snapshot(scene, line, background, text, None))
+
+    def choice(self, scene, text):
+        """
+        Record made choice, it belongs to the last message of the scene
+
+        Args:
+            scene: Running scene ID
+            text: Chosen menu item
+        """
+        line = background = None
+        if self.snapshots and self.snapshots[-1].scene == scene:
+            line, background = self.snapshots[-1].line, self.snapshots[-1].background
+        self.snapshots.append(Snapshot(scene, line, background, None, text))
+
+    def rollback(self, index):
+        """
+        Drop a snapshot and everything after it
+
+        Messages of the same line recorded just before a choice are
+        dropped too, they are shown again when the game continues.
+
+        Args:
+            index: Index of the snapshot to roll back to
+
+        Returns:
+            Snapshot: The dropped snapshot at index
+        """
+        target = self.snapshots[index]
+        while len(self.snapshots) > index:
+            self.snapshots.pop()
+        while (self.snapshots and self.snapshots[-1].scene == target.scene
+               and self.snapshots[-1].line == target.line):
+            self.snapshots.pop()
+        return target
+
+    def clear(self):
+        """Forget all snapshots"""
+        self.snapshots.clear()
+
+def browse(screen, dialog, history):
+    """
+    Show backlog until the player closes it or rolls back
+
+    Every entry is rebuilt by the given dialog over the background of
+    its snapshot. The dialog must not be the one showing the current
+    message, its state is overwritten.
+
+    Args:
+        screen: Pygame surface to draw on
+        dialog: Dialog used to draw entries
+        history: History to browse
+
+    Raises:
+        Rollback: When the player picks an entry to roll back to
+    """
+    index = len(history) - 1
+    if index < 0:
+        return
+    shown = None
+    while True:
+        if shown != index:
+            shown = index
+            snapshot = history[index]
+            dialog.background = snapshot.background
+            if snapshot.background is None:
+                screen.fill((0, 0, 0))
+            text = snapshot.text if snapshot.choice is None else f"> {snapshot.choice}"
+            dialog.start((text,))
+            dialog.reveal_all()
+            dialog.draw(screen)
+            inputs.flip()
+
+        event = inputs.wait()
+        if event.type == pygame.QUIT:
+            inputs.post(event)  # Leave quitting to the caller
+            return
+        if is_backlog_event(event):
+            index = max(index - 1, 0)
+        elif (event.type == pygame.KEYDOWN and event.key == pygame.K_PAGEDOWN
+              or event.type == pygame.MOUSEWHEEL and event.y < 0):
+            index += 1
+            if index >= len(history):
+                return
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            return
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
+            raise Rollback(history.rollback(index))
@@ -0,0 +1,408 @@
+"""
+Hot Reload Module for Visual Novel Engine
+
+Development mode, started with SKUF_DEV=1: changes to the story script,
+the game code and the assets show up in the running game without a
+restart.
+
+A watcher thread polls the modification times of the story script, the
+game module and the asset directories every INTERVAL seconds. Changed
+files are prepared on that thread, the script is compiled to its
+bundle and the module source to code objects. The main thread applies
+them at the end of its next frame:
+
+    story script   The bundle is reopened and the scenes whose lines,
+                   choices, stage directions or settings changed are
+                   found
+    game module    Top-level functions whose code changed run the new
+                   code from their next call on, module state is kept
+    assets         Cache entries, decoded backgrounds and character
+                   sprites of the changed files are dropped and loaded
+                   again on next use, images rendered from other images
+                   or code, such as static screens, are rendered again
+
+Nothing else is reloaded or evicted. If the running scene, its code or
+an image changed, the scene is restarted at the line being shown, the
+way a rollback restarts it. Applying a reload takes a fraction of a
+frame; the time is logged and checked against FRAME_BUDGET.
+
+Changed classes, default arguments and new module names, the dialog
+box images and fonts already in use need a restart. Line IDs after an
+edited scene move, the seen lines index follows them, see
+SeenLines.follow(). The asset archive is not used in development mode,
+assets come from loose files.
+
+Classes:
+    Reload: Raised to restart the running scene after a reload
+    Watcher: Polling file watcher thread
+    Reloader: Prepares changed files and applies them to the game
+
+Functions:
+    scan: Modification times of files
+    signature: Function code without line numbers
+
+Attributes:
+    WAKE: Event type posted when files changed, wakes waiting menus
+"""
+
+import os
+import time
+import types
+import logging
+import threading
+import pygame
+from archive import ROOTS, RAW_IMAGES, normalize
+from assets import cache
+from dialog import FPS
+from history import Rollback, Snapshot
+from inputs import inputs, ALLOWED
+from seen import seen
+from story import load as load_story
+
+INTERVAL = 0.5              # Seconds between polls
+FRAME_BUDGET = 1000 / FPS   # Milliseconds a reload may take
+WAKE = pygame.event.custom_type()
+
+class Reload(Rollback):
+    """
+    Request to restart the running scene at a line after a reload
+
+    Attributes:
+        snapshot: Scene and line to continue from
+    """
+
+    verb = "Reloaded"
+    event = "reload"
+
+def scan(files, roots):
+    """
+    Get modification times of files
+
+    Args:
+        files: Single file paths
+        roots: Directories, all files in them and their subdirectories
+
+    Returns:
+        dict: Path -> modification time in nanoseconds, for the files
+            that exist
+    """
+    mtimes = {}
+    paths = list(files)
+    for root in roots:
+        for folder, dirs, names in os.walk(root):
+            paths += [os.path.join(folder, name) for name in names]
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            pass
+    return mtimes
+
+def signature(code):
+    """
+    Get function code without line numbers
+
+    Functions that only moved in the file compare equal.
+
+    Args:
+        code: Code object
+
+    Returns:
+        tuple: Bytecode, constants with nested code, names and flags
+    """
+    consts = tuple(signature(const) if isinstance(const, types.CodeType) else const
+                   for const in code.co_consts)
+    return (code.co_code, consts, code.co_names, code.co_varnames, code.co_freevars,
+            code.co_argcount, code.co_kwonlyargcount, code.co_flags)
+
+class Watcher(threading.Thread):
+    """
+    Polling file watcher thread
+
+    Attributes:
+        files: Single files watched
+        roots: Directories watched with everything in them
+        callback: Called on the watcher thread with the set of changed,
+            added and removed paths
+        interval: Seconds between polls
+        mtimes: Modification times of the last poll
+    """
+
+    def __init__(self, files, roots, callback, interval=INTERVAL):
+        super().__init__(name="hotreload", daemon=True)
+        self.files = list(files)
+        self.roots = list(roots)
+        self.callback = callback
+        self.interval = interval
+        self.mtimes = None
+        self.stopped = threading.Event()
+
+    def poll(self):
+        """
+        Compare modification times with the last poll
+
+        Returns:
+            set: Changed, added and removed paths, empty on the first poll
+        """
+        mtimes = scan(self.files, self.roots)
+        old, self.mtimes = self.mtimes, mtimes
+        if old is None:
+            return set()
+        return {path for path in mtimes.keys() | old.keys() if mtimes.get(path) != old.get(path)}
+
+    def run(self):
+        self.poll()
+        while not self.stopped.wait(self.interval):
+            changed = self.poll()
+            if changed:
+                self.callback(changed)
+
+    def stop(self):
+        """Stop polling after the current poll"""
+        self.stopped.set()
+
+class Reloader:
+    """
+    Prepares changed files and applies them to the running game
+
+    Attributes:
+        manager: Game manager whose scene is restarted
+        roots: Asset directories
+        story_path: Story script file, None if not watched
+        story: Cached function returning the story bundle
+        modules: Modules with reloaded functions keyed by source file
+        handles: Dicts of background handles with path and unload()
+        rendered: Objects with unload() holding images rendered from
+            other images or code
+        watcher: Watcher thread, None before start()
+        reloads: Number of reloads applied
+        last_ms: Milliseconds the last reload took to apply
+    """
+
+    def __init__(self, manager, roots=ROOTS):
+        """
+        Initialize reloader, nothing is watched before start()
+
+        Args:
+            manager: Game manager
+            roots: Asset directories
+        """
+        self.manager = manager
+        self.roots = roots
+        self.story_path = None
+        self.story = None
+        self.modules = {}
+        self.handles = []
+        self.rendered = []
+        self.watcher = None
+        self.reloads = 0
+        self.last_ms = 0.0
+        self.ready = {}  # Changed path -> prepared code, or None
+        self.lock = threading.Lock()
+
+    def watch_story(self, path, story):
+        """
+        Reload the story script
+
+        Args:
+            path: Script file path
+            story: Function returning the opened bundle, cached with
+                functools.lru_cache
+        """
+        self.story_path = path
+        self.story = story
+
+    def watch_module(self, module):
+        """
+        Reload the top-level functions of a module
+
+        Args:
+            module: Module object with a source file
+        """
+        self.modules[module.__file__] = module
+
+    def watch_handles(self, handles):
+        """
+        Unload background handles of changed images
+
+        Args:
+            handles: Dict of handles with path and unload(), entries
+                added later are included
+        """
+        self.handles.append(handles)
+
+    def watch_rendered(self, rendered):
+        """
+        Unload rendered images when an image or a function changed
+
+        Args:
+            rendered: Objects with unload()
+        """
+        self.rendered += rendered
+
+    def start(self, interval=INTERVAL):
+        """
+        Start watching, changes are applied at the end of frames
+
+        Args:
+            interval: Seconds between polls
+        """
+        files = list(self.modules) + ([self.story_path] if self.story_path else [])
+        self.watcher = Watcher(files, self.roots, self.changed, interval)
+        self.watcher.start()
+        inputs.hooks.append(self.apply)
+        inputs.allow(ALLOWED + (WAKE,))
+        logging.info(f"Development mode: watching {', '.join(files + list(self.roots))}")
+
+    def stop(self):
+        """Stop watching"""
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
+        if self.apply in inputs.hooks:
+            inputs.hooks.remove(self.apply)
+
+    def prepare(self, path):
+        """
+        Do the slow part of a reload, on the watcher thread
+
+        Args:
+            path: Changed file
+
+        Returns:
+            Module code object for modules, None otherwise
+
+        Raises:
+            OSError: If the file cannot be read
+            SyntaxError: If module source does not compile
+            ValueError: If the story script does not compile
+        """
+        if path == self.story_path:
+            load_story(path).close()  # The bundle is cached, reopening it is quick
+        elif path in self.modules:
+            with open(path, "rb") as file:
+                return compile(file.read(), path, "exec")
+        return None
+
+    def changed(self, paths):
+        """
+        Prepare changed files and wake the main thread, on the watcher thread
+
+        Files that fail to compile are logged and not reloaded, the game
+        goes on with what it had.
+
+        Args:
+            paths: Changed, added and removed paths
+        """
+        prepared = {}
+        for path in sorted(paths):
+            try:
+                prepared[path] = self.prepare(path)
+            except (OSError, SyntaxError, ValueError) as e:
+                logging.error(f"Not reloading {path}: {str(e)}")
+        if prepared:
+            with self.lock:
+                self.ready.update(prepared)
+            pygame.event.post(pygame.event.Event(WAKE))
+
+    def apply(self):
+        """
+        Apply prepared changes, at the end of a frame on the main thread
+
+        Raises:
+            Reload: If the running scene has to be restarted
+        """
+        if not self.ready:
+            return
+        with self.lock:
+            ready, self.ready = self.ready, {}
+        start = time.perf_counter()
+        scene, line = self.manager.scene, self.manager.line
+        resume, scenes, functions, assets = line, [], [], []
+        for path, code in ready.items():
+            if path == self.story_path:
+                scenes, resume = self.reload_story(scene, line)
+            elif path in self.modules:
+                functions += self.reload_module(self.modules[path], code)
+            else:
+                self.unload(path)
+                assets.append(path)
+        images = [path for path in assets if path.lower().endswith(RAW_IMAGES)]
+        if images:
+            self.manager.stage.invalidate()
+        if images or functions:
+            for item in self.rendered:
+                item.unload()
+        ms = (time.perf_counter() - start) * 1000
+        self.reloads += 1
+        self.last_ms = ms
+        logging.info(f"Reloaded in {ms:.1f} ms: scenes {scenes}, functions {functions}, "
+                     f"assets {assets}")
+        if ms > FRAME_BUDGET:
+            logging.warning(f"Reload took {ms:.1f} ms, a frame is {FRAME_BUDGET:.1f} ms")
+        known = scene in self.manager.scenes or (self.story is not None and scene in self.story())
+        if known and (scene in scenes or functions or images):
+            raise Reload(Snapshot(scene, resume, None, None, None))
+
+    def reload_story(self, scene, line):
+        """
+        Reopen the story bundle and renumber the seen lines
+
+        Args:
+            scene: Running scene ID
+            line: Line ID being shown or None
+
+        Returns:
+            tuple: Sorted IDs of changed, added and removed scenes, and
+                the new ID of the line
+        """
+        old = self.story()
+        self.story.cache_clear()
+        new = self.story()
+        changed = sorted(name for name in old.index.keys() | new.index.keys()
+                         if name not in old or name not in new
+                         or old.scene(name)._replace(line=0) != new.scene(name)._replace(line=0))
+        if line is not None and scene in old and scene in new:
+            record = new.scene(scene)
+            line = record.line + min(line - old.scene(scene).line, len(record.lines))
+        seen.follow(new, old)
+        old.close()
+        return changed, line
+
+    def reload_module(self, module, code):
+        """
+        Give changed top-level functions of a module their new code
+
+        Args:
+            module: Loaded module
+            code: Compiled new module source
+
+        Returns:
+            list: Names of the functions that changed
+        """
+        changed = []
+        for new in code.co_consts:
+            if not isinstance(new, types.CodeType):
+                continue
+            function = module.__dict__.get(new.co_name)
+            if (isinstance(function, types.FunctionType) and function.__module__ == module.__name__
+                    and function.__code__.co_freevars == new.co_freevars
+                    and signature(function.__code__) != signature(new)):
+                function.__code__ = new
+                changed.append(new.co_name)
+        return changed
+
+    def unload(self, path):
+        """
+        Drop everything loaded from a changed asset file
+
+        Args:
+            path: Asset file path
+        """
+        cache.forget(path)
+        path = normalize(path)
+        for handles in self.handles:
+            for handle in handles.values():
+                if normalize(handle.path) == path:
+                    handle.unload()
+        self.manager.stage.unload(path)
@@ -0,0 +1,390 @@
+"""
+Input Module for Visual Novel Engine
+
+Every frame loop reads input, time and presents frames through this
+layer instead of calling pygame.event, pygame.time and pygame.display
+directly. That lets a session be recorded and replayed exactly.
+
+Frames are counted by Clock.tick(). Each tick's milliseconds are what
+the game sees as elapsed time, so text reveal and transitions advance
+by the same amounts when replayed. Events are
+numbered by frame and by the read (get() or wait() call) in that frame
+that returned them.
+
+Modes:
+    live     Events come from pygame, nothing is written
+    record   Live, and ticks and events are written to a file
+    replay   Events and ticks come from a recording. Frames are paced to
+             the recorded times, or with fast replay the clock never
+             sleeps and frames are not presented. Closing the window
+             ends a replay. Past the end of the recording QUIT is sent
+             once, reading on raises SystemExit.
+    scripted Events come from a function and every frame takes the same
+             time, nothing is presented. Used to render offscreen.
+
+A capture function, when set, is called at the end of every frame with
+whether anything was presented in it, the frame exporter takes the
+screen there. Hooks are called at the end of every frame as well, the
+development mode applies reloaded files there.
+
+Recording layout (little endian):
+
+    header  magic b"SKIN", version u16, window width u16, height u16,
+            seen lines bitset length u32 and bytes
+    body    zlib stream of records:
+            b"T" dt u16                       one frame, its milliseconds
+            b"E" frame u32, read u16, type u32, length u16, JSON attributes
+
+Events the game posts itself with post() are kept in the layer and not
+recorded, they are posted again when replaying. Only event types in
+ALLOWED reach the pygame queue at all.
+
+Replays are exact for the same story, assets and SKUF_SKIP setting.
+The window size and the seen lines are taken from the recording.
+
+Classes:
+    Clock: Frame clock, drop-in for pygame.time.Clock
+    Input: Event source, frame clock and recorder
+
+Attributes:
+    inputs: Shared input layer used by the engine
+"""
+
+import json
+import zlib
+import atexit
+import struct
+import logging
+import pygame
+from array import array
+from collections import deque
+from seen import seen
+
+MAGIC = b"SKIN"
+VERSION = 1
+FLUSH_FRAMES = 300  # Frames between flushes of the recording
+
+# Event types the engine reacts to, others are kept out of the queue
+ALLOWED = (pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION,
+           pygame.MOUSEWHEEL)
+
+HEADER = struct.Struct("<4sHHHI")
+TICK = struct.Struct("<cH")
+EVENT = struct.Struct("<cIHIH")
+
+class Clock:
+    """
+    Frame clock of the input layer, drop-in for pygame.time.Clock
+
+    Every tick of every clock is one frame of the session.
+    """
+
+    def __init__(self):
+        self.clock = pygame.time.Clock()
+
+    def tick(self, framerate=0):
+        """
+        End a frame
+
+        Args:
+            framerate: Frame rate cap, 0 for none
+
+        Returns:
+            int: Milliseconds since the previous tick, as recorded when
+                replaying
+        """
+        return inputs.tick(self.clock, framerate)
+
+    def get_fps(self):
+        return self.clock.get_fps()
+
+class Input:
+    """
+    Event source, frame clock and recorder
+
+    Attributes:
+        frame: Number of frames ticked so far
+        time: Milliseconds ticked so far, the session clock
+        replaying: Whether input comes from a recording
+        fast: Do not sleep between or present frames
+        size: Window size of the recording being replayed, or None
+        capture: Called with whether the frame was presented at the end
+            of every frame, or None
+        hooks: Functions called without arguments at the end of every
+            frame, after the capture
+    """
+
+    def __init__(self):
+        self.frame = 0
+        self.time = 0
+        self.read = 0              # Reads of the current frame
+        self.posted = deque()      # Events posted by the game
+        self.replaying = False
+        self.fast = False
+        self.size = None
+        self.file = None           # Recording being written
+        self.compressor = None
+        self.ticks_left = None     # Recorded frame times being replayed
+        self.events = {}           # (frame, read) -> recorded events
+        self.last = 0              # Last recorded frame
+        self.ended = False         # QUIT sent past the end of the replay
+        self.source = None         # Function scripting the input, see script()
+        self.step = None           # Milliseconds per scripted frame
+        self.capture = None        # Called at the end of every frame
+        self.presented = False     # Anything presented since the last tick
+        self.hooks = []
+
+    def allow(self, types=ALLOWED):
+        """
+        Keep all but some event types out of the pygame queue
+
+        Args:
+            types: Event types to let through
+        """
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(list(types))
+
+    def record(self, path, size):
+        """
+        Start writing the session to a file
+
+        Args:
+            path: Recording file path
+            size: Window (width, height)
+        """
+        bits = seen.snapshot()
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, size[0], size[1], len(bits)) + bits)
+        self.compressor = zlib.compressobj(9)
+        atexit.register(self.close)
+        logging.info(f"Recording input to {path}")
+
+    def load(self, path, fast=False):
+        """
+        Replay a recording instead of live input
+
+        A recording cut short, for example by a crash, replays up to
+        the last frame that was flushed.
+
+        Args:
+            path: Recording file path
+            fast: Do not sleep between or present frames
+
+        Raises:
+            ValueError: If the file is not a recording of this version
+        """
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, width, height, length = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not an input recording: {path}")
+        offset = HEADER.size + length
+        seen.restore(data[HEADER.size:offset])
+        body = zlib.decompressobj().decompress(data[offset:])
+
+        ticks, events, offset = array("H"), {}, 0
+        while offset < len(body):
+            kind = body[offset:offset + 1]
+            if kind == b"T":
+                if offset + TICK.size > len(body):
+                    break
+                ticks.append(TICK.unpack_from(body, offset)[1])
+                offset += TICK.size
+            elif kind == b"E":
+                if offset + EVENT.size > len(body):
+                    break
+                _, frame, read, type, size = EVENT.unpack_from(body, offset)
+                offset += EVENT.size
+                if offset + size > len(body):
+                    break
+                attributes = json.loads(body[offset:offset + size])
+                offset += size
+                for key in ("pos", "rel"):
+                    if key in attributes:
+                        attributes[key] = tuple(attributes[key])
+                events.setdefault((frame, read), []).append(pygame.event.Event(type, attributes))
+            else:
+                raise ValueError(f"Corrupt input recording: {path}")
+        self.ticks_left = deque(ticks)
+        self.events = events
+        self.last = max([len(ticks)] + [frame for frame, read in events])
+        self.replaying, self.fast, self.size = True, fast, (width, height)
+        logging.info(f"Replaying {len(ticks)} frames from {path}")
+
+    def script(self, source, fps):
+        """
+        Take input from a function and time from a fixed frame rate
+
+        Frames are neither paced nor presented.
+
+        Args:
+            source: Called without arguments for every read, returns a
+                list of events
+            fps: Frame rate of the virtual clock
+        """
+        self.source = source
+        self.step = 1000 / fps
+        self.fast = True
+
+    def write(self, data):
+        self.file.write(self.compressor.compress(data))
+
+    def flush(self):
+        """Write recorded data so far, a crash loses at most FLUSH_FRAMES frames"""
+        if self.file:
+            self.file.write(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+            self.file.flush()
+
+    def close(self):
+        """Finish the recording"""
+        if self.file:
+            self.file.write(self.compressor.flush())
+            self.file.close()
+            self.file = None
+
+    def tick(self, clock, framerate=0):
+        """End a frame on a pygame clock, see Clock.tick()"""
+        if self.capture:
+            self.capture(self.presented)
+        self.presented = False
+        for hook in self.hooks:
+            hook()
+        if self.replaying:
+            dt = self.ticks_left.popleft() if self.ticks_left else 0
+            if not self.fast:
+                # Sleep for what is left of the recorded frame time
+                elapsed = clock.tick()
+                if elapsed < dt:
+                    pygame.time.wait(dt - elapsed)
+                    clock.tick()
+        elif self.source:
+            # Whole milliseconds adding up to the exact frame rate
+            dt = round((self.frame + 1) * self.step) - round(self.frame * self.step)
+        else:
+            dt = min(clock.tick(framerate), 0xFFFF)
+            if self.file:
+                self.write(TICK.pack(b"T", dt))
+                if self.frame % FLUSH_FRAMES == 0:
+                    self.flush()
+        self.frame += 1
+        self.time += dt
+        self.read = 0
+        return dt
+
+    def replayed(self):
+        """Take the recorded events of the current read, QUIT past the end"""
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:  # The window was closed
+                return [event]
+        if self.frame > self.last:
+            return self.finish()
+        return self.events.pop((self.frame, self.read), [])
+
+    def finish(self):
+        """Send QUIT once at the end of a replay, then stop the game"""
+        if self.ended:
+            raise SystemExit(f"Replay finished after {self.frame} frames")
+        self.ended = True
+        return [pygame.event.Event(pygame.QUIT)]
+
+    def get(self):
+        """
+        Get pending events, replaces pygame.event.get()
+
+        Returns:
+            list: Events posted by the game, then input events
+        """
+        events = list(self.posted)
+        self.posted.clear()
+        if self.replaying:
+            events += self.replayed()
+        elif self.source:
+            events += self.source()
+        else:
+            live = pygame.event.get()
+            if self.file:
+                for event in live:
+                    self.save(event)
+            events += live
+        self.read += 1
+        return events
+
+    def wait(self, timeout=None):
+        """
+        Wait for an event, replaces pygame.event.wait()
+
+        Args:
+            timeout: Milliseconds to wait at most, None waits for good
+
+        Returns:
+            pygame.event.Event: Next event, NOEVENT if the timeout passed
+        """
+        if self.posted:
+            self.read += 1
+            return self.posted.popleft()
+        if self.replaying:
+            events = self.replayed()
+            if not events and self.frame >= self.last:
+                events = self.finish()  # Recording cut short
+            if not events and timeout is not None:
+                events = [pygame.event.Event(pygame.NOEVENT)]  # Timed out when recorded
+            if not events:
+                raise RuntimeError(f"Replay went out of step at frame {self.frame}")
+            self.posted.extend(events[1:])
+            self.read += 1
+            return events[0]
+        if self.source:
+            # Scripted input never blocks, an empty read lets a frame pass
+            events = self.source() or [pygame.event.Event(pygame.NOEVENT)]
+            self.posted.extend(events[1:])
+            self.read += 1
+            return events[0]
+        event = pygame.event.wait() if timeout is None else pygame.event.wait(timeout)
+        if self.file and event.type != pygame.NOEVENT:
+            self.save(event)
+        self.read += 1
+        return event
+
+    def post(self, event):
+        """
+        Queue an event for the next read, replaces pygame.event.post()
+
+        Args:
+            event: Event to deliver
+        """
+        self.posted.append(event)
+
+    def save(self, event):
+        attributes = {key: value for key, value in event.dict.items()
+                      if isinstance(value, (int, float, str, tuple, list, bool))}
+        data = json.dumps(attributes, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.write(EVENT.pack(b"E", self.frame, self.read, event.type, len(data)) + data)
+
+    def mouse_pos(self):
+        """
+        Get mouse position, replaces pygame.mouse.get_pos()
+
+        Returns:
+            tuple: Position, off screen when replaying or scripted
+        """
+        return (-1, -1) if self.replaying or self.source else pygame.mouse.get_pos()
+
+    def flip(self):
+        """Present the whole frame, replaces pygame.display.flip()"""
+        self.presented = True
+        if not self.fast:
+            pygame.display.flip()
+
+    def update(self, rects):
+        """
+        Present parts of the frame, replaces pygame.display.update()
+
+        Args:
+            rects: Changed screen areas
+        """
+        if rects:
+            self.presented = True
+        if not self.fast:
+            pygame.display.update(rects)
+
+inputs = Input()
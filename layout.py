@@ -0,0 +1,143 @@
+"""
+Text Layout Module for Visual Novel Engine
+
+Wraps text to a pixel width using the glyph advances of the font and
+splits the wrapped lines into pages. Lines break between words, a word
+wider than the whole width is cut between characters. A newline in the
+text always starts a new line.
+
+Layouts are memoized per (text, font, width, lines per page), so a
+message shown again, or a menu label rebuilt on every visit, is wrapped
+a single time.
+
+Classes:
+    Layout: Text wrapped to a width and split into pages
+
+Functions:
+    wrap: Wrap text to a pixel width
+    layout: Get memoized layout of a text
+"""
+
+import re
+import pygame
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+
+LAYOUTS = 512  # Layouts kept in the memo cache
+WORD = re.compile(r"\S+")
+
+def wrap(font, text, width):
+    """
+    Wrap text to a pixel width
+
+    Args:
+        font: Pygame font used for rendering
+        text: Text, newlines start new lines
+        width: Maximum line width in pixels
+
+    Returns:
+        list: Wrapped lines
+    """
+    lines = []
+    for paragraph in text.split("\n"):
+        # edges[i] is the width of paragraph[:i], read from one metrics call
+        edges = list(accumulate(
+            (m[4] if m else 0 for m in font.metrics(paragraph)), initial=0))
+        start = end = None  # Current line start and end of its last word
+        for match in WORD.finditer(paragraph):
+            word_start, word_end = match.span()
+            if start is None:
+                start = word_start
+            elif edges[word_end] - edges[start] > width:
+                lines.append(paragraph[start:end])
+                start = word_start
+            while edges[word_end] - edges[start] > width and word_end - start > 1:
+                cut = bisect_right(edges, edges[start] + width, start + 1, word_end) - 1
+                cut = max(cut, start + 1)
+                lines.append(paragraph[start:cut])
+                start = cut
+            end = word_end
+        lines.append(paragraph[start:end] if start is not None else "")
+    return lines
+
+class Layout:
+    """
+    Text wrapped to a width and split into pages
+
+    Attributes:
+        font: Pygame font the text is measured with
+        width: Maximum line width in pixels
+        lines: Tuple of wrapped lines
+        pages: Tuple of (first line, end line) index pairs
+    """
+
+    def __init__(self, font, text, width, lines_per_page=None):
+        """
+        Wrap and paginate text
+
+        Args:
+            font: Pygame font used for rendering
+            text: Text, newlines start new lines
+            width: Maximum line width in pixels
+            lines_per_page: Lines on a page, one page for all lines if None
+        """
+        self.font = font
+        self.width = width
+        self.lines = tuple(wrap(font, text, width))
+        per_page = lines_per_page or len(self.lines)
+        self.pages = tuple((first, min(first + per_page, len(self.lines)))
+                           for first in range(0, len(self.lines), per_page))
+
+    def __len__(self):
+        return len(self.lines)
+
+    def page(self, index):
+        """
+        Get lines of a page
+
+        Args:
+            index: Page number
+
+        Returns:
+            tuple: Lines of the page
+        """
+        first, end = self.pages[index]
+        return self.lines[first:end]
+
+    def render(self, color, line_height=None, antialias=True):
+        """
+        Render all lines into one transparent surface
+
+        Args:
+            color: Text color
+            line_height: Distance between line tops, font line size if None
+            antialias: Render smooth glyph edges
+
+        Returns:
+            pygame.Surface: Rendered text block
+        """
+        line_height = line_height or self.font.get_linesize()
+        rendered = [self.font.render(line, antialias, color) for line in self.lines]
+        width = max(surface.get_width() for surface in rendered)
+        height = line_height * (len(rendered) - 1) + rendered[-1].get_height()
+        block = pygame.Surface((width, height), pygame.SRCALPHA)
+        for row, surface in enumerate(rendered):
+            block.blit(surface, (0, row * line_height))
+        return block
+
+@lru_cache(maxsize=LAYOUTS)
+def layout(text, font, width, lines_per_page=None):
+    """
+    Get memoized layout of a text
+
+    Args:
+        text: Text, newlines start new lines
+        font: Pygame font used for rendering
+        width: Maximum line width in pixels
+        lines_per_page: Lines on a page, one page for all lines if None
+
+    Returns:
+        Layout: Shared layout, must not be modified
+    """
+    return Layout(font, text, width, lines_per_page)
@@ -1,97 +1,189 @@
 """
 Menu system for visual novel game
 Handles menu creation, rendering and user interaction
+
+The menu loop blocks on inputs.wait() and repaints only when the
+hover state or the profiler overlay changes, so an idle menu does not
+use the CPU.
+
+Item positions, font sizes and wrap widths are logical units converted
+by the viewport.
 """
 
 import pygame
+import logging
 import os
-pygame.init()
+from assets import cache
+from profiler import profiler
+from layout import layout
+from history import is_backlog_event
+from viewport import viewport
+from inputs import inputs, Clock
 defF = os.path.join("font", "DejaVuSans.ttf")
 
-class Menu:
+class Menu(pygame.sprite.DirtySprite):
     """
     Individual menu item that can be selected/hovered
     """
     hovered = False
     
-    def __init__(self, text, pos, font_size=30):
-        """Initialize menu item with text and position"""
+    def __init__(self, text, pos, font_size=30, width=None):
+        """Initialize menu item with text, logical position and optional wrap width"""
+        pygame.sprite.DirtySprite.__init__(self)
         self.text = text  # Text to display
-        self.pos = pos    # (x,y) position  
-        self.font = pygame.font.Font(defF, font_size)
+        self.pos = pos    # Logical (x,y) position  
+        self.width = width  # Logical wrap width, single line if None
+        self.font = cache.font(defF, viewport.length(font_size))
+        self.render()
         self.set_rect()
-        self.set_rend()
     
     def draw(self, surface):
         """Draw menu item to surface"""
         surface.blit(self.rend, self.rect)
 
+    def render(self):
+        """Pre-render text surfaces for both hover states"""
+        if self.width:
+            text = layout(self.text, self.font, viewport.length(self.width))
+            self.surfaces = {hovered: text.render(self.get_color(hovered))
+                             for hovered in (False, True)}
+        else:
+            self.surfaces = {hovered: self.font.render(self.text, True, self.get_color(hovered))
+                             for hovered in (False, True)}
+
     def set_rend(self):
-        """Update rendered text surface"""
-        self.rend = self.font.render(self.text, True, self.get_color())
+        """Select rendered text surface for the hover state"""
+        self.rend = self.surfaces[self.hovered]
+        self.image = self.rend
+        self.dirty = 1
         
-    def get_color(self):
+    def get_color(self, hovered=None):
         """Get color based on hover state"""
-        return (255, 255, 255) if self.hovered else (65, 105, 255)
+        if hovered is None:
+            hovered = self.hovered
+        return (255, 255, 255) if hovered else (65, 105, 255)
             
     def set_rect(self):
         """Update text rectangle position"""
         self.set_rend()
         self.rect = self.rend.get_rect()
-        self.rect.topleft = self.pos
+        self.rect.topleft = viewport.point(self.pos)
+
+    def set_hovered(self, hovered):
+        """
+        Update hover state
+
+        Returns:
+            bool: True if the state changed and the item needs a repaint
+        """
+        if hovered == self.hovered:
+            return False
+        self.hovered = hovered
+        self.set_rend()
+        return True
+
+def create_menus(menu_items):
+    """
+    Create menu items laid out in a column
+
+    Long items are wrapped to the right edge of the screen.
+
+    Args:
+        menu_items: List of menu item texts
+
+    Returns:
+        list: Menu items with increasing Y positions
+    """
+    menus = []
+    y_pos = 205  # Starting Y position
+    width = viewport.logical[0] - 340 - 20
+    for item in menu_items:
+        menu = Menu(item, (340, y_pos), width=width)
+        menus.append(menu)
+        y_pos += max(50, round(menu.rect.height / viewport.scale) + 20)
+    return menus
 
-def generate_menu(screen, menu_items, background_image=None):
+def generate_menu(screen, menu_items, background_image=None, dirty_rects=True, clock=None, fps=30,
+                  on_backlog=None):
     """
     Generate and handle menu system
     Args:
         screen: Pygame surface to draw on
         menu_items: List of menu item texts
         background_image: Optional background image
+        dirty_rects: Update only items whose hover state changed instead
+            of flipping the whole screen every frame
+        clock: Shared pygame clock, a new one is created if None
+        fps: Redraw rate cap
+        on_backlog: Called when the player opens the backlog, the menu
+            is repainted after it returns
     Returns:
         Selected menu item text or None
     """
     try:
-        # Create menu items
-        menus = []
-        y_pos = 205  # Starting Y position
-        
-        # Create menu items with increasing Y positions
-        for item in menu_items:
-            menus.append(Menu(item, (340, y_pos)))
-            y_pos += 50
+        clock = clock or Clock()
+        menus = create_menus(menu_items)
             
-        running = True
-        
-        # Main menu loop
-        while running:
-            # Draw background if provided
-            if background_image:
-                screen.blit(background_image, (0, 0))
-                
-            pygame.event.pump()
+        # Draw background if provided, the screen under the items is kept
+        # to repaint them when their hover state changes
+        if background_image:
+            screen.blit(background_image, viewport.offset)
+        background = screen.copy()
+        group = pygame.sprite.LayeredDirty(menus)
+        group.clear(screen, background)
+        pos = inputs.mouse_pos()
+        for menu in menus:
+            menu.set_hovered(menu.rect.collidepoint(pos))
+        group.draw(screen)
+        inputs.flip()
             
-            # Update and draw menu items
-            for menu in menus:
-                # Check for mouse hover
-                if menu.rect.collidepoint(pygame.mouse.get_pos()):
-                    menu.hovered = True
-                else:
-                    menu.hovered = False
-                menu.draw(screen)
-                
-            pygame.display.flip()
+        profiler.begin_frame()
+        
+        # Main menu loop, sleeps until there is input
+        while True:
+            events = [inputs.wait()] + inputs.get()
+            profiler.mark("wait")
+            changed = profiler.visible
             
             # Handle events
-            for event in pygame.event.get():
+            for event in events:
+                if profiler.handle_event(event):
+                    group.repaint_rect(profiler.rect)
+                    changed = True
+                if on_backlog and is_backlog_event(event):
+                    on_backlog()
+                    screen.blit(background, (0, 0))
+                    group.repaint_rect(screen.get_rect())
+                    changed = True
                 if event.type == pygame.QUIT:
                     return None
-                if event.type == pygame.MOUSEBUTTONDOWN:
+                if event.type == pygame.MOUSEMOTION:
+                    # Only items whose hover state changed are marked dirty
+                    for menu in menus:
+                        changed |= menu.set_hovered(menu.rect.collidepoint(event.pos))
+                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     # Check for clicked menu item
                     for menu in menus:
-                        if menu.hovered:
+                        if menu.rect.collidepoint(event.pos):
                             return menu.text
-                            
-            pygame.time.Clock().tick(30)  # Cap framerate
+            profiler.mark("events")
+                
+            if dirty_rects:
+                rects = group.draw(screen) + profiler.draw(screen)
+                profiler.mark("render")
+                inputs.update(rects)
+            elif changed:
+                screen.blit(background, (0, 0))
+                for menu in menus:
+                    menu.draw(screen)
+                profiler.draw(screen)
+                profiler.mark("render")
+                inputs.flip()
+            profiler.mark("display")
+            
+            clock.tick(fps)  # Cap redraw rate during bursts of mouse motion
+            profiler.mark("wait")
+            profiler.end_frame()
             
     except Exception as e:
         logging.error(f"Menu generation error: {str(e)}")
@@ -0,0 +1,201 @@
+"""
+Frame Profiler Module for Visual Novel Engine
+
+Times the phases of each frame (event handling, text rendering, drawing,
+display update, waiting for the clock) into a ring buffer, keeps
+per-scene frame time histograms and draws an on-screen overlay.
+
+Frame loops call begin_frame() once before the loop, mark(phase) after
+each phase and end_frame() at the end of every iteration. Time since the
+previous mark is added to the named phase. When the profiler is
+disabled every call returns right after checking a flag.
+
+Keys:
+    F3: Toggle overlay, enables the profiler on first use
+    F4: Dump per-scene histograms to PROFILE_FILE
+
+Classes:
+    Profiler: Frame phase timer with overlay and histogram dump
+
+Attributes:
+    profiler: Shared profiler instance used by the engine
+"""
+
+import os
+import json
+import time
+import logging
+import pygame
+from collections import deque
+from assets import cache
+
+FRAMES = 240                   # Frames kept in the ring buffer
+PROFILE_FILE = "profile.json"  # Default dump file
+BUCKETS = (1, 2, 4, 8, 16, 33, 66)  # Histogram bucket upper bounds in ms
+
+class Profiler:
+    """
+    Frame phase timer
+
+    Attributes:
+        enabled: Whether frames are timed
+        visible: Whether the overlay is drawn
+        scene: Scene ID frames are attributed to
+        frames: Ring buffer of (scene, total ms, {phase: ms}) records
+        histograms: Scene ID -> frame counts per bucket
+        totals: Scene ID -> {phase: total ms}
+        rect: Screen area covered by the overlay
+    """
+
+    def __init__(self, size=FRAMES):
+        """
+        Initialize disabled profiler
+
+        Args:
+            size: Number of frames kept in the ring buffer
+        """
+        self.enabled = False
+        self.visible = False
+        self.scene = None
+        self.frames = deque(maxlen=size)
+        self.histograms = {}
+        self.totals = {}
+        self.rect = pygame.Rect(8, 8, size, 96)
+        self.start = None
+        self.last = None
+        self.phases = {}
+
+    def begin_frame(self):
+        """Start timing a frame, called once before a frame loop"""
+        if not self.enabled:
+            return
+        self.start = self.last = time.perf_counter()
+        self.phases = {}
+
+    def mark(self, phase):
+        """
+        Add time since the previous mark to a phase
+
+        Args:
+            phase: Phase name
+        """
+        if not self.enabled or self.start is None:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self):
+        """Record the current frame and start timing the next one"""
+        if not self.enabled or self.start is None:
+            return
+        now = time.perf_counter()
+        total = (now - self.start) * 1000
+        self.frames.append((self.scene, total, self.phases))
+
+        histogram = self.histograms.setdefault(self.scene, [0] * (len(BUCKETS) + 1))
+        bucket = 0
+        while bucket < len(BUCKETS) and total >= BUCKETS[bucket]:
+            bucket += 1
+        histogram[bucket] += 1
+        totals = self.totals.setdefault(self.scene, {})
+        for phase, ms in self.phases.items():
+            totals[phase] = totals.get(phase, 0.0) + ms
+
+        self.start = self.last = now
+        self.phases = {}
+
+    def top_costs(self, count=3):
+        """
+        Get phases with the highest average cost over the ring buffer
+
+        Args:
+            count: Number of phases
+
+        Returns:
+            list: (phase, average ms) tuples, most expensive first
+        """
+        sums = {}
+        for scene, total, phases in self.frames:
+            for phase, ms in phases.items():
+                sums[phase] = sums.get(phase, 0.0) + ms
+        frames = len(self.frames) or 1
+        costs = sorted(((phase, ms / frames) for phase, ms in sums.items()),
+                       key=lambda cost: cost[1], reverse=True)
+        return costs[:count]
+
+    def handle_event(self, event):
+        """
+        Process profiler keys
+
+        Args:
+            event: Pygame event
+
+        Returns:
+            bool: True if the overlay was toggled, the caller should
+                repaint the overlay area
+        """
+        if event.type != pygame.KEYDOWN:
+            return False
+        if event.key == pygame.K_F3:
+            self.visible = not self.visible
+            if self.visible and not self.enabled:
+                self.enabled = True
+                self.begin_frame()
+            return True
+        if event.key == pygame.K_F4:
+            self.dump()
+        return False
+
+    def draw(self, surface):
+        """
+        Draw frame time graph and top costs
+
+        Args:
+            surface: Target surface
+
+        Returns:
+            list: Changed rectangles, empty if the overlay is hidden
+        """
+        if not self.visible:
+            return []
+        rect = self.rect
+        surface.fill((0, 0, 0), rect)
+        # 33 ms fills the graph height, the line marks 60 FPS
+        scale = (rect.height - 20) / 33.0
+        bottom = rect.bottom - 1
+        for x, (scene, total, phases) in enumerate(self.frames):
+            height = min(int(total * scale), rect.height - 20)
+            color = (81, 220, 55) if total < 16.7 else (255, 0, 0)
+            pygame.draw.line(surface, color, (rect.left + x, bottom), (rect.left + x, bottom - height))
+        target = bottom - int(16.7 * scale)
+        pygame.draw.line(surface, (255, 255, 0), (rect.left, target), (rect.right - 1, target))
+
+        font = cache.font(os.path.join("font", "DejaVuSans.ttf"), 10)
+        last = self.frames[-1][1] if self.frames else 0.0
+        text = f"{last:.1f} ms  " + "  ".join(f"{phase} {ms:.2f}" for phase, ms in self.top_costs())
+        surface.blit(font.render(text, True, (255, 255, 255)), (rect.left + 2, rect.top + 2))
+        return [rect]
+
+    def dump(self, path=PROFILE_FILE):
+        """
+        Write per-scene frame time histograms and phase averages
+
+        Args:
+            path: Output JSON file
+        """
+        labels = [f"<{bound}" for bound in BUCKETS] + [f">={BUCKETS[-1]}"]
+        data = {}
+        for scene, histogram in self.histograms.items():
+            frames = sum(histogram)
+            data[str(scene)] = {
+                "frames": frames,
+                "histogram_ms": dict(zip(labels, histogram)),
+                "phase_avg_ms": {phase: round(ms / frames, 4)
+                                 for phase, ms in self.totals.get(scene, {}).items()},
+            }
+        with open(path, "w") as file:
+            json.dump(data, file, indent=2)
+        logging.info(f"Profile written to {path}")
+
+profiler = Profiler()
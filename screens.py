@@ -0,0 +1,90 @@
+"""
+Static Screen Module for Visual Novel Engine
+
+End, help and interstitial screens are a single image shown until the
+player goes on. A static screen renders its text and images into one
+surface the first time it is shown and keeps it. Showing it presents
+that surface once, then sleeps on the input layer's wait until there
+is input. It wakes every IDLE_MS to end a frame, so frame hooks and
+the session clock keep running, but nothing is drawn or presented
+while nobody touches the game: a screen left open overnight costs next
+to no CPU.
+
+Classes:
+    StaticScreen: Cached full-screen image waiting for input
+"""
+
+import sys
+import pygame
+from audio import audio
+from inputs import inputs
+
+IDLE_MS = 1000  # Longest sleep between frames while waiting for input
+CONTINUE = (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN)  # Event types that go on
+
+class StaticScreen:
+    """
+    Cached full-screen image waiting for input
+
+    Attributes:
+        render: Function returning the screen image, a surface covering
+            the viewport's logical area
+        target: Scene ID returned when the player goes on, such as the
+            main menu or the next scene
+        events: Event types that go on
+        sound: Sound file played when the player goes on, or None
+        kind: Transition kind into the screen, None cuts
+    """
+
+    def __init__(self, render, target="mmenu", events=CONTINUE, sound=None, kind="fade"):
+        """
+        Initialize screen, nothing is rendered before it is shown
+
+        Args:
+            render: Function returning the screen image
+            target: Scene ID to go on to
+            events: Event types that go on
+            sound: Sound file played when going on
+            kind: Transition kind into the screen, None cuts
+        """
+        self.render = render
+        self.target = target
+        self.events = tuple(events)
+        self.sound = sound
+        self.kind = kind
+        self._image = None
+
+    @property
+    def image(self):
+        """Screen image, rendered on first access"""
+        if self._image is None:
+            self._image = self.render()
+        return self._image
+
+    def unload(self):
+        """Drop the rendered image, it is rendered again on next use"""
+        self._image = None
+
+    def show(self, manager):
+        """
+        Show the screen until the player goes on
+
+        Args:
+            manager: Game manager showing the image
+
+        Returns:
+            str: target
+
+        Raises:
+            SystemExit: When the window is closed
+        """
+        manager.show_image(self.image, self.kind)
+        while True:
+            for event in [inputs.wait(IDLE_MS)] + inputs.get():
+                if event.type == pygame.QUIT:
+                    sys.exit()
+                if event.type in self.events:
+                    if self.sound:
+                        audio.play(self.sound)
+                    return self.target
+            manager.clock.tick()
@@ -0,0 +1,212 @@
+"""
+Seen Lines Module for Visual Novel Engine
+
+Remembers which script lines the player has already read, for the skip
+mode of the dialog. Lines are identified by their number in the story
+script (Scene.line is the number of the first line of a scene).
+
+One bit per line is kept in a bytearray that is mirrored in SEEN_FILE.
+Lookups are a single bit test and save() writes back only the bytes
+changed since the previous save, so the file is never rewritten whole
+unless the lines are renumbered with remap().
+
+Line numbers follow script order, lines inserted into the script shift
+the numbers of the lines after them. The file therefore records the
+digest of the script version its bits belong to. When the game opens
+another version, follow() moves the bits to the new line numbers using
+the cached bundle of the recorded version, or starts over if that
+bundle is gone.
+
+File layout: magic b"SKSL", script digest as 16 ASCII hex digits, then
+the bitset. Files without the header are bitsets of an unknown
+version, taken to belong to the script the game opens.
+
+Classes:
+    SeenLines: Persistent bitset of read script lines
+
+Attributes:
+    seen: Shared seen lines index used by the engine
+"""
+
+import os
+import atexit
+import struct
+import logging
+from story import renumber
+
+SEEN_FILE = "seen.bin"  # Default bitset file
+MAGIC = b"SKSL"
+HEADER = struct.Struct("<4s16s")  # Magic, script digest
+
+class SeenLines:
+    """
+    Bitset of read script lines, loaded on first use
+
+    Attributes:
+        path: Bitset file, nothing is saved if None
+        bits: One bit per line, bit line % 8 of byte line // 8
+        changed: Byte indices not yet written to the file
+        digest: Digest of the script version the bits belong to, None
+            if not known
+    """
+
+    def __init__(self, path=SEEN_FILE):
+        """
+        Initialize index, the file is read on first lookup
+
+        Args:
+            path: Bitset file, nothing is saved if None
+        """
+        self.path = path
+        self.bits = None
+        self.changed = set()
+        self.digest = None
+        self.header = False  # Header to be written on the next save
+
+    def load(self):
+        """Read bitset file, a missing file means no line was seen"""
+        self.bits = bytearray()
+        self.changed.clear()
+        self.digest = None
+        self.header = False
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "rb") as file:
+                    data = file.read()
+            except OSError as e:
+                logging.error(f"Could not read seen lines: {str(e)}")
+                data = b""
+            if data[:len(MAGIC)] == MAGIC and len(data) >= HEADER.size:
+                magic, digest = HEADER.unpack_from(data, 0)
+                self.digest = digest.decode("ascii", "replace")
+                self.bits = bytearray(data[HEADER.size:])
+            else:  # Bitset of an unknown version, rewritten with a header
+                self.bits = bytearray(data)
+                self.changed = set(range(max(len(self.bits), 1)))
+                self.header = True
+        atexit.register(self.save)
+
+    def __contains__(self, line):
+        if self.bits is None:
+            self.load()
+        byte = line >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (line & 7)))
+
+    def add(self, line):
+        """
+        Mark line as seen
+
+        Args:
+            line: Script line number
+        """
+        if self.bits is None:
+            self.load()
+        byte = line >> 3
+        if byte >= len(self.bits):
+            self.changed.update(range(len(self.bits), byte + 1))
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        mask = 1 << (line & 7)
+        if not self.bits[byte] & mask:
+            self.bits[byte] |= mask
+            self.changed.add(byte)
+
+    def save(self):
+        """Write bytes changed since the previous save"""
+        if not (self.changed or self.header) or not self.path:
+            return
+        try:
+            exists = os.path.exists(self.path)
+            with open(self.path, "r+b" if exists else "w+b") as file:
+                if self.header or not exists:
+                    file.write(HEADER.pack(MAGIC, (self.digest or "").encode("ascii")))
+                for byte in sorted(self.changed):
+                    file.seek(HEADER.size + byte)
+                    file.write(self.bits[byte:byte + 1])
+                file.truncate(HEADER.size + len(self.bits))  # Shorter after remap()
+            self.changed.clear()
+            self.header = False
+        except OSError as e:
+            logging.error(f"Could not save seen lines: {str(e)}")
+
+    def remap(self, lines):
+        """
+        Move seen bits to new line numbers after the script changed
+
+        The next save() rewrites the file with the new bitset.
+
+        Args:
+            lines: Old line number -> new line number, lines missing
+                from it are no longer seen
+        """
+        if self.bits is None:
+            self.load()
+        old, self.bits = self.bits, bytearray()
+        for before, after in lines.items():
+            byte = before >> 3
+            if byte < len(old) and old[byte] & (1 << (before & 7)):
+                self.add(after)
+        self.changed = set(range(max(len(self.bits), 1)))  # Also truncates an empty bitset
+
+    def follow(self, bundle, old=None):
+        """
+        Keep the bits on the lines of the story version the game opened
+
+        Bits of another version are moved to the new line numbers, see
+        story.renumber(). Without the old version's bundle they are
+        dropped, so skipping never passes unread text.
+
+        Args:
+            bundle: Opened story bundle
+            old: Bundle of the version the bits belong to, looked up in
+                the bundle cache if None
+        """
+        if self.bits is None:
+            self.load()
+        if bundle.digest is None or self.digest == bundle.digest:
+            return
+        if self.digest is not None:
+            same = old is not None and old.digest == self.digest
+            previous = old if same else bundle.version(self.digest)
+            if previous is None:
+                logging.info("Seen lines belong to a script version that is no longer cached, "
+                             "starting over")
+                self.remap({})
+            else:
+                self.remap(renumber(previous, bundle))
+                if previous is not old:
+                    previous.close()
+        self.digest = bundle.digest
+        self.header = True
+
+    def snapshot(self):
+        """
+        Get copy of the bitset
+
+        Returns:
+            bytes: Bitset, one bit per line
+        """
+        if self.bits is None:
+            self.load()
+        return bytes(self.bits)
+
+    def restore(self, bits):
+        """
+        Replace the bitset, for replays: nothing is saved afterwards
+
+        Args:
+            bits: Bitset from snapshot()
+        """
+        self.path = None
+        self.bits = bytearray(bits)
+        self.changed.clear()
+        self.digest = None  # Recordings replay the script they were made with
+
+    def clear(self):
+        """Forget all seen lines, in memory and in the file"""
+        self.bits = bytearray()
+        self.changed.clear()
+        self.header = True
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+seen = SeenLines()
@@ -17,28 +17,37 @@ Dependencies:
     dialog: Custom dialog system
     menu: Custom menu system
     game_manager: Game state coordination
+    engine: Startup of the subsystems
+
+Importing this module only defines the game. setup() starts the engine
+and registers the scenes, main() runs the game.
 """
 
 import os
+import sys
 import pygame
 from pygame.locals import *
-from dialog import Dialog
-from menu import generate_menu
 from datetime import datetime
 import logging
-from game_manager import GameManager
+from functools import lru_cache
+from engine import engine, LOG_FILE
+from assets import cache
+from archive import archive
+from hotreload import Reloader
+from screens import StaticScreen
+from story import load as load_story
+from seen import seen
+from profiler import profiler
+from audio import audio
+from viewport import viewport, LOGICAL_SIZE
+from dialog import SKIP_NAMES
+from layout import layout
+from eventlog import eventlog
 
 # === System Configuration ===
-logging.basicConfig(
-    filename='log.txt',
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-
-# === Pygame Initialization ===
-pygame.mixer.pre_init(44100, -16, 2, 2048)  # Audio setup for better sound quality
-pygame.init()
+# Frame profiler: F3 toggles the overlay, F4 dumps histograms,
+# SKUF_PROFILE=1 starts timing frames right away
+profiler.enabled = bool(os.environ.get("SKUF_PROFILE"))
 
 # === Game Constants ===
 COLORS = {
@@ -51,16 +60,22 @@ COLORS = {
 }
 
 # === Display Setup ===
-SCREEN_SIZE = (800, 600)  # Standard visual novel resolution
-screen = pygame.display.set_mode(SCREEN_SIZE)
-pygame.display.set_caption('Скуф Приближается')
-clock = pygame.time.Clock()
+# Scenes are laid out in SCREEN_SIZE logical units, the viewport scales
+# them to the window: SKUF_RESOLUTION=1920x1080 sets the window size,
+# SKUF_FULLSCREEN=1 uses the whole desktop
+SCREEN_SIZE = LOGICAL_SIZE  # Standard visual novel resolution
+CAPTION = 'Скуф Приближается'
 
-# === Asset Loading ===
-# Load and prepare game assets (images, sounds, etc.)
-end = pygame.image.load(os.path.join("image/end/end1.jpg"))
-pygame.mixer.music.load(os.path.join('audio', 'theme.ogg'))
-click = pygame.mixer.Sound(os.path.join('audio','click.wav'))
+# === Assets ===
+# Files are loaded on first use, the end image is also the first frame
+END = os.path.join("image", "end", "end1.jpg")
+MUSIC = os.path.join('audio', 'theme.ogg')   # Menu music, scenes may switch tracks
+CLICK = os.path.join('audio', 'click.wav')   # Choice sound effect
+STORY = os.path.join("story", "main.story")
+
+def end_image() -> pygame.Surface:
+    """End screen image, also the main menu background"""
+    return viewport.screen_image(END)
 
 # === Helper Functions ===
 def show_dialogs(dialog_list: list, background=None) -> None:
@@ -71,45 +86,103 @@ def show_dialogs(dialog_list: list, background=None) -> None:
         dialog_list: List of strings containing dialog messages
         background: Optional background scene to display
     """
-    if background:
-        background.back()
-    dialog = Dialog(screen)
-    for message in dialog_list:
-        dialog.message = (message,)
-        dialog.show = True
-        dialog.sndNext()
+    engine.manager.show_dialogs(dialog_list, background)
 
 # === Scene Management ===
 class Fon:
     """
     Background scene manager
     
-    Handles loading and displaying background images for different scenes
+    Lazy handle to a background image. The image is decoded into the
+    display format and scaled to the viewport on first use, prefetch()
+    decodes it ahead of time on the asset cache worker thread.
+    
+    x and y are logical units.
     """
     def __init__(self, xpos, ypos, filename):
         self.x = xpos
         self.y = ypos
-        try:
-            self.bitmap = pygame.image.load(os.path.join("image", "backgrounds", filename))
-        except pygame.error:
-            logging.error(f"Could not load background: {filename}")
-            self.bitmap = pygame.Surface(SCREEN_SIZE)
-            self.bitmap.fill(COLORS['black'])
+        self.filename = filename
+        self.path = os.path.join("image", "backgrounds", filename)
+        self._bitmap = None
+
+    @property
+    def bitmap(self):
+        """Background surface, loaded on first access"""
+        if self._bitmap is None:
+            try:
+                self._bitmap = viewport.screen_image(self.path)
+            except pygame.error:
+                logging.error(f"Could not load background: {self.filename}")
+                self._bitmap = viewport.surface()
+                self._bitmap.fill(COLORS['black'])
+        return self._bitmap
+
+    def unload(self):
+        """Drop the decoded image, it is loaded again on next use"""
+        self._bitmap = None
+
+    def prefetch(self):
+        """Start decoding the background before it is needed"""
+        if self._bitmap is None:
+            cache.prefetch(self.path, size=viewport.size if viewport.scaled else None)
+
+    @property
+    def pos(self):
+        """Output position of the background"""
+        return viewport.point((self.x, self.y))
 
     def back(self):    
-        screen.blit(self.bitmap, (self.x, self.y))
+        engine.screen.blit(self.bitmap, self.pos)
+
+# Background instances, keyed by file name
+backgrounds = {}
+
+def background(filename: str) -> Fon:
+    """
+    Get shared background handle
+    
+    Args:
+        filename: Image file name in image/backgrounds
+    """
+    if filename not in backgrounds:
+        backgrounds[filename] = Fon(0, 0, filename)
+    return backgrounds[filename]
+
+@lru_cache(maxsize=None)
+def story():
+    """Compiled story script, opened on first use, seen lines follow its version"""
+    bundle = load_story(STORY)
+    seen.follow(bundle)
+    return bundle
 
-# Background instances
-bg1 = Fon(0, 0, "bg1.jpg")
-bg2 = Fon(0, 0, "bg2.jpg")
-bg3 = Fon(0, 0, "bg3.jpg")
-bg4 = Fon(0, 0, "bg4.jpg")
+# Scenes reached from scenes implemented in Python
+NEXT_SCENES = {
+    "mmenu": ("novel",),
+    "evening": ("outside",),
+}
 
-# Initialize game manager
-game_manager = GameManager(screen)
+def prefetch(scene: str) -> None:
+    """
+    Decode backgrounds of the scenes reachable from a scene
+    
+    Args:
+        scene: Current scene ID
+    """
+    targets = list(NEXT_SCENES.get(scene, ()))
+    if scene in story():
+        record = story().scene(scene)
+        targets += [target for text, target in record.choices]
+        if record.jump:
+            targets.append(record.jump)
+    for target in targets:
+        if target in story():
+            filename = story().scene(target).background
+            if filename:
+                background(filename).prefetch()
 
 # === Game Scenes ===
-def mmenu() -> None:
+def mmenu():
     """
     Main menu scene
     
@@ -119,19 +192,23 @@ def mmenu() -> None:
     - Exit option
     
     Transitions to:
-    - novel() for new game
-    - helps() for help screen
+    - novel for new game
+    - helps for help screen
     - exit() to quit
     """
+    prefetch("mmenu")
+    audio.music(MUSIC)
     try:
         menu_items = ["НОВАЯ ИГРА", "ПОМОЩЬ", "ВЫХОД"]
-        selected = generate_menu(screen, menu_items, end)
+        selected = engine.manager.show_menu(menu_items, end_image())
+        if selected:
+            eventlog.event("choice", scene="mmenu", text=selected)
         if selected == "НОВАЯ ИГРА":
-            click.play()
-            novel()
+            audio.play(CLICK)
+            return "novel"
         elif selected == "ПОМОЩЬ":
-            click.play()
-            helps()
+            audio.play(CLICK)
+            return "helps"
         elif selected == "ВЫХОД":
             logging.info("Game exited from menu")
             exit()
@@ -139,198 +216,151 @@ def mmenu() -> None:
         logging.error(f"Error in menu: {str(e)}")
         exit()
 
-def helps():
-    screen.blit(end, (0, 0))
+def render_help() -> pygame.Surface:
+    """Help screen: controls over the end image"""
+    image = end_image().copy()
     help_texts = [
         ("Управление Игрой", 300, 10),
         ("Для продвижения вперед, нажмите пробел или клавишу \"Enter\".", 140, 30),
         ("Для выбора, воспользуйтесь мышью.", 140, 60)
     ]
+    font = cache.sysfont("DejaVuSans.ttf", viewport.length(30))
+    for text, x, y in help_texts:
+        label = font.render(text, 0, COLORS['green'])
+        image.blit(label, (viewport.length(x), viewport.length(y)))
+    return image
+
+def helps():
+    return help_screen.show(engine.manager)
+
+def play(name: str):
+    """
+    Play scene from the story script
     
-    while True:
-        for text, x, y in help_texts:
-            font = pygame.font.SysFont("DejaVuSans.ttf", 30)
-            label = font.render(text, 0, COLORS['green'])
-            screen.blit(label, (x, y))
-        
-        pygame.display.flip()
+    Shows the scene dialogs over its background and the choice menu
+    if it has one.
+    
+    Args:
+        name: Scene ID
         
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                exit()
-            if event.type in (pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN):
-                click.play()
-                return mmenu()
-
-def novel():
-    logging.info("Starting novel sequence")
-    dialogs = [
-        "?:Египетская сила!",
-        "?:Что стоишь иди помоги мне с моей ласточкой.",
-        "Скуф:Я Петрович, для тебя могу быть скуфом, называй как хочешь.",
-        "Cкуф:Подай ключ на (что-то невнятное)."
+    Returns:
+        str: Next scene ID, or None if the scene doesn't lead anywhere
+    """
+    logging.info(f"Starting {name} sequence")
+    prefetch(name)
+    scene = story().scene(name)
+    if scene.music:
+        audio.music(os.path.join("audio", scene.music))
+    bg = background(scene.background) if scene.background else None
+    engine.manager.show_dialogs(scene.lines, bg, scene.line, scene.stage)
+    if scene.choices:
+        selected = engine.manager.show_menu([text for text, target in scene.choices])
+        for text, target in scene.choices:
+            if text == selected:
+                logging.info(f"Player chose: {text}")
+                eventlog.event("choice", scene=name, text=text, target=target)
+                audio.play(CLICK)
+                return target
+        return None
+    return scene.jump
+
+def render_whot() -> pygame.Surface:
+    """Ending screen of the wrong wrench"""
+    image = viewport.surface()
+    image.fill(COLORS['black'])
+    font = cache.sysfont("DejaVuSans.ttf", viewport.length(35))
+    text = layout("Вы погубили своего героя, попробуйте пройти снова, возможно вам понравиться.\n"
+                  "Вы были залиты пивом", font, viewport.length(SCREEN_SIZE[0] - 200))
+    image.blit(text.render(COLORS['red'], viewport.length(30), antialias=False),
+               (viewport.length(100), viewport.length(280)))
+    return image
+
+def render_evening() -> pygame.Surface:
+    """Interstitial screen after the evening"""
+    image = viewport.surface()
+    image.fill(COLORS['black'])
+    font = cache.sysfont("DejaVuSans.ttf", viewport.length(33))
+    texts = [
+        ("Обезьянья возня", 80, 280),
+        ("Пердеж и отрыжка", 80, 310)
     ]
-    game_manager.show_dialogs(dialogs, bg1)
-    
-    menu_items = ["Подать ключ на 10.", "Подать ключ на 15."]
-    selected = game_manager.show_menu(menu_items)
-    
-    if selected == "Подать ключ на 10.":
-        logging.info("Player chose: Подать ключ на 10")
-        click.play()
-        whot()
-    elif selected == "Подать ключ на 15.":
-        logging.info("Player chose: Подать ключ на 15")
-        click.play()
-        fix()
+    for text, x, y in texts:
+        label = font.render(text, 0, COLORS['red'])
+        image.blit(label, (viewport.length(x), viewport.length(y)))
+    return image
+
+# Static screens, rendered once on first show, see screens.StaticScreen
+help_screen = StaticScreen(render_help, "mmenu", sound=CLICK, kind=None)
+whot_screen = StaticScreen(render_whot, "mmenu", sound=CLICK)
+evening_screen = StaticScreen(render_evening, "outside", events=(pygame.KEYDOWN,))
+outside_screen = StaticScreen(end_image, "mmenu")
 
 def whot():
-    screen.fill((0, 0, 0))
-    while True:
-        font = pygame.font.SysFont("DejaVuSans.ttf", 35)
-        texts = [
-            ("Вы погубили своего героя, попробуйте пройти снова,", 100, 280),
-            ("возможно вам понравиться.", 100, 310),
-            ("Вы были залиты пивом", 100, 340)
-        ]
-        for text, x, y in texts:
-            label = font.render(text, 0, COLORS['red'])
-            screen.blit(label, (x, y))
-        pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                exit()
-            if event.type in (pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN):
-                click.play()
-                mmenu()
-
-def fix():
-    logging.info("Starting fix sequence")
-    dialogs = [
-        "А ты молодец, красавчик я бы сказал *злобно рыгнул*.",
-        "С-с-с-спасибо.",
-        "Сейчас дочиню и поедем ко мне, бахнем по пивку.",
-        "На протяжении всего времени было много ругательств, таких как.",
-        "жеваный рот.",
-        "Египетская сила.",
-        "Поехали?"
-    ]
-    show_dialogs(dialogs, bg1)
-    
-    menu_items = ["Поехали.", "Не я обойдусь."]
-    selected = generate_menu(screen, menu_items)
-    
-    if selected == "Поехали.":
-        logging.info("Player chose: Поехали")
-        click.play()
-        ments()
-    elif selected == "Не я обойдусь.":
-        logging.info("Player chose: Не я обойдусь")
-        click.play()
-        whot()
-
-def ments():
-    logging.info("Starting ments sequence")
-    dialogs = [
-        "Бл*ть гайцы.",
-        "музыка на фоне *Эй мусорок не шей мне срок*.",
-        "Щас порешаем.",
-        "Добрый день, показываем документики, огнетушитель, аптечку.",
-        "Может договоримся?.",
-        "*Показал на кулькуляторе 1000Р*.",
-        "У тебя есть косарик?."
-    ]
-    show_dialogs(dialogs, bg3)
-    
-    menu_items = ["НЕ ТЫ ЖИРНЫЙ", "Да держи"]
-    selected = generate_menu(screen, menu_items)
-    
-    if selected == "НЕ ТЫ ЖИРНЫЙ":
-        click.play()
-        whot()
-    elif selected == "Да держи":
-        click.play()
-        evening()
+    eventlog.event("ending", ending="whot")
+    return whot_screen.show(engine.manager)
 
 def evening():
-    logging.info("Starting evening sequence")
-    dialogs = [
-        "O  у меня ведь в холодильнике холодный пивас.",
-        "Чиназес.",
-        "Что? *громко рыгнул после пива*.",
-        "Спасибо, наверное.",
-        "Включили телевизор а там футбол.",
-        "Гоооооооооол.",
-        "Гоооооооооол.",
-        "Гоооооооооол.",
-        "Гоооооооооол, рыгнул.",
-        "Гоооооооооол.",
-        "Гоооооооооол."
-    ]
-    show_dialogs(dialogs, bg2)
-    
-    screen.fill((0, 0, 0))
-    while True:
-        font = pygame.font.SysFont("DejaVuSans.ttf", 33)
-        texts = [
-            ("Обезьянья возня", 80, 280),
-            ("Пердеж и отрыжка", 80, 310)
-        ]
-        for text, x, y in texts:
-            label = font.render(text, 0, COLORS['red'])
-            screen.blit(label, (x, y))
-        pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                exit()
-            if event.type == pygame.KEYDOWN:
-                outside()
+    play("evening")
+    return evening_screen.show(engine.manager)
 
 def outside():
-    logging.info("Starting outside sequence")
-    dialogs = [
-        "Всего всегда по немногу скуф попал в реанимацию  с инсультом.",
-        "Гайца посадили.",
-        "А наш главный герой остался жив.",
-        "Может когда-то они соберутся вновь."
-    ]
-    show_dialogs(dialogs, bg4)
-    
-    screen.blit(end, (0, 0))
-    while True:
-        pygame.display.flip()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                exit()
-            if event.type in (pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN):
-                mmenu()
+    play("outside")
+    eventlog.event("ending", ending="outside")
+    return outside_screen.show(engine.manager)
+
+# Scenes implemented in Python, they take precedence over the script
+SCENES = (("mmenu", mmenu), ("helps", helps), ("whot", whot),
+          ("evening", evening), ("outside", outside))
 
 # === Game Flow Functions ===
+def setup(log_file: str = LOG_FILE):
+    """
+    Start the engine and register the game's scenes, only once
+    
+    Args:
+        log_file: Log file path, None leaves logging as it is
+    
+    Returns:
+        GameManager: Game manager ready to run
+    """
+    if engine.manager is not None:
+        return engine.manager
+    # Development mode: SKUF_DEV=1 reloads the story, this module and
+    # loose asset files while the game runs
+    dev = bool(os.environ.get("SKUF_DEV"))
+    if dev:
+        archive.path = None
+    game_manager = engine.start(CAPTION, splash=END, log_file=log_file)
+    for name, scene in SCENES:
+        game_manager.add_scene(name, scene)
+    # Dialog skip mode: Tab cycles it, SKUF_SKIP=seen or SKUF_SKIP=all starts with it
+    if os.environ.get("SKUF_SKIP") in SKIP_NAMES:
+        game_manager.dialog.skip = SKIP_NAMES.index(os.environ["SKUF_SKIP"])
+    audio.prefetch(CLICK)
+    if dev:
+        reloader = Reloader(game_manager)
+        reloader.watch_story(STORY, story)
+        reloader.watch_module(sys.modules[__name__])
+        reloader.watch_handles(backgrounds)
+        reloader.watch_rendered((help_screen, whot_screen, evening_screen, outside_screen))
+        reloader.start()
+    return game_manager
+
 def main() -> None:
     """
     Main game loop
     
     Handles:
-    - Music playback (continuous loop)
     - Event processing
-    - Frame rate control (30 FPS)
-    - Scene management
-    - Display updates
+    - Scene scheduling from the main menu
     
     Exit Conditions:
     - User closes window
     - System error occurs
     """
+    game_manager = setup()
     logging.info("Game started")
-    while True:
-        pygame.mixer.music.play(-1)  # -1 for infinite loop
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                logging.info("Game closed by user")
-                exit()
-        mmenu()
-        clock.tick(30)  # Maintain 30 FPS
-        pygame.display.flip()  # Update display
+    game_manager.run("mmenu", play)
 
 # === Entry Point ===
 if __name__ == "__main__":
@@ -0,0 +1,297 @@
+"""
+Stage Module for Visual Novel Engine
+
+Composites the scene into one cached surface, bottom to top:
+
+    background  Background handle, stretched over the logical area
+    characters  Character sprites in the order they were first shown
+    box         Dialog box frame, while a dialog is open
+
+Changing a layer only marks the area it covers as dirty. The next
+access to the composite repaints the dirty areas from the layers under
+and over them and leaves the rest of the composite as it was, so a
+frame with an unchanged stage costs a single opaque blit, or a clipped
+one for the dialog box area.
+
+Character sprites are image/characters/<name>/<expression>.png, scaled
+by the viewport and kept in the display format with per-pixel alpha. A
+character stands on the bottom edge of the logical area, centered on a
+slot or a logical x position.
+
+Layers are blended with plain SDL alpha blits. pygame's premultiplied
+blend (BLEND_PREMULTIPLIED) gives the same result over an opaque
+composite but is a generic loop, about 40% slower than SDL's SIMD
+alpha blitters for sprites and the dialog box.
+
+The stage is also a background handle with bitmap, pos and back(), so
+transitions and dialogs take it wherever they take a background.
+
+Classes:
+    Character: Character layer
+    Stage: Cached layered composite
+
+Functions:
+    sprite_path: File path of a character expression
+    parse_position: Logical x of a slot name or number
+"""
+
+import os
+import logging
+import pygame
+from viewport import viewport
+from archive import normalize
+
+CHARACTERS_DIR = os.path.join("image", "characters")
+EXPRESSION = "normal"   # Expression of characters shown without one
+SLOTS = {"left": 200, "center": 400, "right": 600}  # Logical x of named positions
+POSITION = "center"     # Position of characters shown without one
+
+def sprite_path(name, expression=EXPRESSION, root=CHARACTERS_DIR):
+    """
+    Get file path of a character expression
+
+    Args:
+        name: Character name
+        expression: Expression name
+        root: Directory of the character sprite directories
+
+    Returns:
+        str: Sprite image path
+    """
+    return os.path.join(root, name, f"{expression}.png")
+
+def parse_position(position):
+    """
+    Get logical x of a stage position
+
+    Args:
+        position: Slot name or logical x as a string or number
+
+    Returns:
+        int: Logical x the character is centered on
+
+    Raises:
+        ValueError: If the position is neither a slot nor a number
+    """
+    if position in SLOTS:
+        return SLOTS[position]
+    return int(position)
+
+class Character:
+    """
+    Character layer
+
+    Attributes:
+        name: Character name
+        expression: Shown expression
+        x: Logical x the character is centered on
+        image: Sprite, None if it could not be loaded
+        rect: Output area of the sprite
+    """
+
+    def __init__(self, name, expression, x, image):
+        self.name = name
+        self.expression = expression
+        self.x = x
+        self.image = image
+        if image is None:
+            self.rect = pygame.Rect(0, 0, 0, 0)
+        else:
+            self.rect = image.get_rect(midbottom=viewport.point((x, viewport.logical[1])))
+
+class Stage:
+    """
+    Cached layered composite of a background, characters and the dialog box
+
+    Attributes:
+        screen: Surface the composite is shown on
+        background: Background handle with bitmap and pos, or None
+        characters: Character layers keyed by name, bottom first
+        box: Dialog box frame with per-pixel alpha, or None while hidden
+        box_rect: Output area of the dialog box frame
+        root: Directory of the character sprite directories
+        pos: Output position of the composite, always the screen corner
+    """
+
+    pos = (0, 0)
+
+    def __init__(self, screen, root=CHARACTERS_DIR):
+        """
+        Initialize empty stage
+
+        Args:
+            screen: Surface the composite is shown on
+            root: Directory of the character sprite directories
+        """
+        self.screen = screen
+        self.root = root
+        self.background = None
+        self.characters = {}
+        self.box = None
+        self.box_rect = pygame.Rect(0, 0, 0, 0)
+        self.image = None
+        self.dirty = []
+        self.sprites = {}  # Sprites keyed by path, None if missing
+
+    def invalidate(self, rect=None):
+        """
+        Mark area of the composite for repainting
+
+        Args:
+            rect: Output area, the whole composite if None
+        """
+        if rect is None:
+            self.dirty = [self.screen.get_rect()]
+        elif rect.width and rect.height:
+            self.dirty.append(pygame.Rect(rect))
+
+    def set_background(self, background):
+        """
+        Set bottom layer
+
+        Args:
+            background: Background handle with bitmap and pos, or None
+        """
+        if background is not self.background:
+            self.background = background
+            self.invalidate()
+
+    def sprite(self, name, expression):
+        """Load sprite, None if it is missing"""
+        path = sprite_path(name, expression, self.root)
+        if path not in self.sprites:
+            try:
+                self.sprites[path] = viewport.image(path, alpha=True)
+            except (pygame.error, OSError) as e:
+                logging.error(f"Could not load character sprite {path}: {str(e)}")
+                self.sprites[path] = None
+        return self.sprites[path]
+
+    def unload(self, path):
+        """
+        Drop a sprite whose file changed, characters showing it load it again
+
+        Args:
+            path: Sprite file path
+        """
+        path = normalize(path)
+        for key in [key for key in self.sprites if normalize(key) == path]:
+            del self.sprites[key]
+        for name, old in list(self.characters.items()):
+            if normalize(sprite_path(name, old.expression, self.root)) == path:
+                character = Character(name, old.expression, old.x, self.sprite(name, old.expression))
+                self.characters[name] = character
+                self.invalidate(old.rect)
+                self.invalidate(character.rect)
+
+    def show(self, name, expression=None, position=None):
+        """
+        Show a character or change its expression or position
+
+        A character already on stage keeps its expression and position
+        unless new ones are given, and its place among the layers.
+
+        Args:
+            name: Character name
+            expression: Expression name, see sprite_path()
+            position: Slot name or logical x, see SLOTS
+        """
+        old = self.characters.get(name)
+        expression = expression or (old.expression if old else EXPRESSION)
+        x = parse_position(position) if position is not None else (old.x if old else SLOTS[POSITION])
+        if old and old.expression == expression and old.x == x:
+            return
+        character = Character(name, expression, x, self.sprite(name, expression))
+        self.characters[name] = character
+        if old:
+            self.invalidate(old.rect)
+        self.invalidate(character.rect)
+
+    def hide(self, name):
+        """
+        Take a character off stage
+
+        Args:
+            name: Character name, nothing happens if it is not shown
+        """
+        character = self.characters.pop(name, None)
+        if character:
+            self.invalidate(character.rect)
+
+    def clear(self):
+        """Take all characters off stage"""
+        for name in list(self.characters):
+            self.hide(name)
+
+    def direct(self, command, name, expression=None, position=None):
+        """
+        Carry out a stage direction of the story script
+
+        Args:
+            command: "show" or "hide"
+            name: Character name
+            expression: Expression name or None
+            position: Slot name, logical x or None
+        """
+        if command == "show":
+            self.show(name, expression, position)
+        elif command == "hide":
+            self.hide(name)
+        else:
+            raise ValueError(f"Unknown stage direction: {command}")
+
+    def set_box(self, box, rect=None):
+        """
+        Show or hide the dialog box layer
+
+        Args:
+            box: Box frame with per-pixel alpha, None hides it
+            rect: Output area of the box frame
+        """
+        if box is self.box and (rect is None or rect == self.box_rect):
+            return
+        if self.box is not None:
+            self.invalidate(self.box_rect)
+        self.box = box
+        if rect is not None:
+            self.box_rect = pygame.Rect(rect)
+        if box is not None:
+            self.invalidate(self.box_rect)
+
+    def update(self):
+        """Repaint dirty areas of the composite from the layers"""
+        size = self.screen.get_size()
+        if self.image is None or self.image.get_size() != size:
+            self.image = pygame.Surface(size).convert(self.screen)
+            self.dirty = [self.image.get_rect()]
+        if not self.dirty:
+            return
+        rects = []
+        for rect in self.dirty:  # Overlapping areas are repainted once
+            for other in rects:
+                if other.colliderect(rect):
+                    other.union_ip(rect)
+                    break
+            else:
+                rects.append(rect)
+        for rect in rects:
+            self.image.set_clip(rect)
+            self.image.fill((0, 0, 0))
+            if self.background is not None:
+                self.image.blit(self.background.bitmap, self.background.pos)
+            for character in self.characters.values():
+                if character.image is not None and character.rect.colliderect(rect):
+                    self.image.blit(character.image, character.rect)
+            if self.box is not None and self.box_rect.colliderect(rect):
+                self.image.blit(self.box, self.box_rect)
+        self.image.set_clip(None)
+        self.dirty = []
+
+    @property
+    def bitmap(self):
+        """Composite surface, repainted where it is out of date"""
+        self.update()
+        return self.image
+
+    def back(self):
+        self.screen.blit(self.bitmap, self.pos)
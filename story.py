@@ -0,0 +1,387 @@
+"""
+Story Script Module for Visual Novel Engine
+
+Compiles story scripts into a binary bundle and reads scenes from it.
+
+Script format, one command per line, '#' starts a comment:
+
+    scene novel
+    background bg1.jpg
+    music theme.ogg
+    show skuf angry at left
+    say ?:Египетская сила!
+    hide skuf
+    choice Подать ключ на 10. -> whot
+    jump fix
+
+A scene ends at the next 'scene' line. Choices show a menu, 'jump'
+moves to the next scene without asking. 'music' switches the music
+track, scenes without it keep the track that is playing.
+
+'show <name> [<expression>] [at <position>]' puts a character on the
+stage, or changes its expression or position, before the next line.
+Positions are left, center, right or a logical x. 'hide <name>' takes
+it off. Every scene starts with an empty stage.
+
+Bundle layout (little endian):
+
+    header  magic b"SKUF", version u16, scene count u32
+    index   per scene: name str, offset u32, length u32, first line u32
+    scenes  per scene: background str, music str, line count u16, lines str,
+            choice count u16, (text str, target str) pairs, jump str,
+            direction count u16, (line u16, command str, name str,
+            expression str, position str) tuples
+
+Strings are stored as u16 byte length followed by UTF-8 bytes. Only the
+header and index are parsed on open, scene records are decoded from the
+memory map when requested. Lines are numbered in script order across
+all scenes, the number is the line ID used by the seen lines index.
+Bundles are named by the digest of their script source, renumber()
+maps line IDs from one version of a script to another.
+
+Classes:
+    ScriptError: Syntax error in a story script
+    Scene: Decoded scene record
+    Bundle: Memory mapped compiled story
+
+Functions:
+    load: Open compiled bundle of a script
+    renumber: Old to new line IDs of a changed script
+"""
+
+import os
+import mmap
+import struct
+import hashlib
+import logging
+from collections import namedtuple
+
+MAGIC = b"SKUF"
+VERSION = 4
+CACHE_DIR = "cache"
+
+HEADER = struct.Struct("<4sHI")
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+
+Scene = namedtuple("Scene", "name background music lines choices jump line stage")
+Scene.__doc__ = """
+Decoded scene record
+
+Attributes:
+    name: Scene ID
+    background: Background file name or None
+    music: Music file name or None
+    lines: Tuple of dialog lines
+    choices: Tuple of (menu text, target scene ID) pairs
+    jump: Scene ID played after the lines or None
+    line: ID of the first line, numbered in script order
+    stage: Tuple of (index, command, name, expression, position) stage
+        directions, carried out before the line at index of the scene,
+        expression and position are None when not given
+"""
+
+class ScriptError(ValueError):
+    """Syntax error in a story script"""
+
+def parse_direction(command, arg, index, where):
+    """
+    Parse show or hide stage direction
+
+    Args:
+        command: "show" or "hide"
+        arg: Rest of the line
+        index: Index of the scene line the direction comes before
+        where: File and line number for error messages
+
+    Returns:
+        tuple: (index, command, name, expression, position)
+
+    Raises:
+        ScriptError: On malformed directions
+    """
+    words, position = arg.split(), None
+    if len(words) >= 2 and words[-2] == "at":
+        position = words[-1]
+        words = words[:-2]
+        if position not in ("left", "center", "right") and not position.lstrip("-").isdigit():
+            raise ScriptError(f"{where}: position must be left, center, right or a number")
+    if command == "hide" and (len(words) != 1 or position):
+        raise ScriptError(f"{where}: expected 'hide <name>'")
+    if command == "show" and len(words) not in (1, 2):
+        raise ScriptError(f"{where}: expected 'show <name> [<expression>] [at <position>]'")
+    expression = words[1] if len(words) == 2 else None
+    return (index, command, words[0], expression, position)
+
+def parse(text, filename="<script>"):
+    """
+    Parse story script
+
+    Args:
+        text: Script source
+        filename: Name used in error messages
+
+    Returns:
+        list: Scene records in script order
+
+    Raises:
+        ScriptError: On unknown commands or malformed lines
+    """
+    scenes = []
+    current = None
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        command, _, arg = line.partition(" ")
+        arg = arg.strip()
+        where = f"{filename}:{number}"
+        if command == "scene":
+            if not arg:
+                raise ScriptError(f"{where}: scene needs a name")
+            if any(scene["name"] == arg for scene in scenes):
+                raise ScriptError(f"{where}: duplicate scene {arg!r}")
+            current = {"name": arg, "background": None, "music": None, "lines": [],
+                       "choices": [], "jump": None, "stage": []}
+            scenes.append(current)
+            continue
+        if current is None:
+            raise ScriptError(f"{where}: {command} outside of a scene")
+        if command == "background":
+            current["background"] = arg
+        elif command == "music":
+            current["music"] = arg
+        elif command == "say":
+            current["lines"].append(arg)
+        elif command == "choice":
+            text, arrow, target = arg.rpartition("->")
+            if not arrow or not text.strip() or not target.strip():
+                raise ScriptError(f"{where}: expected 'choice <text> -> <scene>'")
+            current["choices"].append((text.strip(), target.strip()))
+        elif command in ("show", "hide"):
+            current["stage"].append(parse_direction(command, arg, len(current["lines"]), where))
+        elif command == "jump":
+            if not arg:
+                raise ScriptError(f"{where}: jump needs a scene")
+            current["jump"] = arg
+        else:
+            raise ScriptError(f"{where}: unknown command {command!r}")
+    records, line = [], 0
+    for s in scenes:
+        records.append(Scene(s["name"], s["background"], s["music"], tuple(s["lines"]),
+                             tuple(s["choices"]), s["jump"], line, tuple(s["stage"])))
+        line += len(s["lines"])
+    return records
+
+def _pack_str(text):
+    data = (text or "").encode("utf-8")
+    return U16.pack(len(data)) + data
+
+def _unpack_str(buffer, offset):
+    length, = U16.unpack_from(buffer, offset)
+    offset += U16.size
+    return bytes(buffer[offset:offset + length]).decode("utf-8"), offset + length
+
+def compile_scenes(scenes):
+    """
+    Encode scenes into bundle bytes
+
+    Args:
+        scenes: Scene records
+
+    Returns:
+        bytes: Bundle contents
+    """
+    records = []
+    for scene in scenes:
+        record = [_pack_str(scene.background), _pack_str(scene.music), U16.pack(len(scene.lines))]
+        record += [_pack_str(line) for line in scene.lines]
+        record.append(U16.pack(len(scene.choices)))
+        for text, target in scene.choices:
+            record += [_pack_str(text), _pack_str(target)]
+        record.append(_pack_str(scene.jump))
+        record.append(U16.pack(len(scene.stage)))
+        for index, command, name, expression, position in scene.stage:
+            record += [U16.pack(index), _pack_str(command), _pack_str(name), _pack_str(expression),
+                       _pack_str(position)]
+        records.append(b"".join(record))
+
+    index_size = sum(len(_pack_str(scene.name)) + 3 * U32.size for scene in scenes)
+    offset = HEADER.size + index_size
+    index = []
+    for scene, record in zip(scenes, records):
+        index += [_pack_str(scene.name), U32.pack(offset), U32.pack(len(record)), U32.pack(scene.line)]
+        offset += len(record)
+    return HEADER.pack(MAGIC, VERSION, len(scenes)) + b"".join(index) + b"".join(records)
+
+class Bundle:
+    """
+    Compiled story opened through a memory map
+
+    Attributes:
+        path: Bundle file path
+        digest: Digest of the script source, None if not known
+        index: Scene ID -> (offset, length, first line) of its record
+    """
+
+    def __init__(self, path, digest=None):
+        """
+        Open bundle and read its scene index
+
+        Args:
+            path: Bundle file path
+            digest: Digest of the script source
+
+        Raises:
+            ValueError: If the file is not a bundle of this version
+        """
+        self.path = path
+        self.digest = digest
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError(f"Not a story bundle: {path}")
+        self.index = {}
+        offset = HEADER.size
+        for _ in range(count):
+            name, offset = _unpack_str(self.data, offset)
+            self.index[name] = struct.unpack_from("<III", self.data, offset)
+            offset += 3 * U32.size
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def scene(self, name):
+        """
+        Decode single scene
+
+        Args:
+            name: Scene ID
+
+        Returns:
+            Scene: Decoded scene record
+
+        Raises:
+            KeyError: If the bundle has no such scene
+        """
+        offset, length, first = self.index[name]
+        background, offset = _unpack_str(self.data, offset)
+        music, offset = _unpack_str(self.data, offset)
+        count, = U16.unpack_from(self.data, offset)
+        offset += U16.size
+        lines = []
+        for _ in range(count):
+            line, offset = _unpack_str(self.data, offset)
+            lines.append(line)
+        count, = U16.unpack_from(self.data, offset)
+        offset += U16.size
+        choices = []
+        for _ in range(count):
+            text, offset = _unpack_str(self.data, offset)
+            target, offset = _unpack_str(self.data, offset)
+            choices.append((text, target))
+        jump, offset = _unpack_str(self.data, offset)
+        count, = U16.unpack_from(self.data, offset)
+        offset += U16.size
+        stage = []
+        for _ in range(count):
+            index, = U16.unpack_from(self.data, offset)
+            command, offset = _unpack_str(self.data, offset + U16.size)
+            character, offset = _unpack_str(self.data, offset)
+            expression, offset = _unpack_str(self.data, offset)
+            position, offset = _unpack_str(self.data, offset)
+            stage.append((index, command, character, expression or None, position or None))
+        return Scene(name, background or None, music or None, tuple(lines), tuple(choices),
+                     jump or None, first, tuple(stage))
+
+    def version(self, digest):
+        """
+        Open the cached bundle of another version of the same script
+
+        Args:
+            digest: Digest of the other version's source
+
+        Returns:
+            Bundle: Opened bundle, None if it is not in the cache
+        """
+        if self.digest is None:
+            return None
+        suffix = f"-{self.digest}-v{VERSION}.bundle"
+        name = os.path.basename(self.path)
+        if not name.endswith(suffix):
+            return None
+        path = os.path.join(os.path.dirname(self.path), f"{name[:-len(suffix)]}-{digest}-v{VERSION}.bundle")
+        try:
+            return Bundle(path, digest)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def close(self):
+        """Release the memory map"""
+        self.data.close()
+
+def renumber(old, new):
+    """
+    Map line IDs of a story bundle to the IDs of its new version
+
+    Lines of a scene are matched by text, in order, so inserted,
+    removed and moved lines keep their identity and edited lines get
+    none.
+
+    Args:
+        old: Story bundle before the change
+        new: Story bundle after the change
+
+    Returns:
+        dict: Old line ID -> new line ID of the lines found in both
+    """
+    lines = {}
+    for name in old.index.keys() & new.index.keys():
+        before, after = old.scene(name), new.scene(name)
+        unmatched = {}
+        for index, text in enumerate(before.lines):
+            unmatched.setdefault(text, []).append(before.line + index)
+        for index, text in enumerate(after.lines):
+            if unmatched.get(text):
+                lines[unmatched[text].pop(0)] = after.line + index
+    return lines
+
+def load(source, cache_dir=CACHE_DIR):
+    """
+    Open compiled bundle of a script, compiling it if needed
+
+    Compiled bundles are cached under cache_dir keyed by the hash of the
+    script source, so an unchanged script is never parsed again.
+
+    Args:
+        source: Story script path
+        cache_dir: Directory for compiled bundles
+
+    Returns:
+        Bundle: Opened bundle
+    """
+    with open(source, "rb") as file:
+        text = file.read()
+    digest = hashlib.sha256(text).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(source))[0]
+    path = os.path.join(cache_dir, f"{stem}-{digest}-v{VERSION}.bundle")
+    if not os.path.exists(path):
+        logging.info(f"Compiling story script: {source}")
+        data = compile_scenes(parse(text.decode("utf-8"), source))
+        os.makedirs(cache_dir, exist_ok=True)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as file:
+            file.write(data)
+        os.replace(temp, path)
+    return Bundle(path, digest)
+
+if __name__ == "__main__":
+    import sys
+    for source in sys.argv[1:]:
+        bundle = load(source)
+        print(f"{source} -> {bundle.path} ({len(bundle)} scenes)")
@@ -0,0 +1,213 @@
+"""
+Transition Module for Visual Novel Engine
+
+Blends the screen into a new full-screen image over a number of frames:
+
+    fade: Screen fades to black, then the new image fades in
+    dissolve: Screen blends into the new image
+    wipe: New image is uncovered along a mask, pixels with lower mask
+        values first, with a soft edge
+
+Every buffer is allocated once per screen size and reused by all frames
+of all transitions: a copy of the starting screen, an overlay holding
+the new image with a per-pixel alpha channel and the NumPy arrays the
+wipe alpha is computed in.
+
+Uniform blends (fade and dissolve) are single SDL alpha blits, which
+are SIMD code and several times faster than the same arithmetic on
+NumPy arrays. The wipe computes its per-pixel alpha from the mask with
+NumPy, writes it straight into the overlay's pixel buffer and lets SDL
+blend the overlay. Without NumPy the wipe uncovers the image from left
+to right and ignores the mask.
+
+Classes:
+    Transition: Blender with buffers preallocated for one screen size
+
+Functions:
+    play: Run a transition on the screen
+"""
+
+import sys
+import pygame
+from profiler import profiler
+from inputs import inputs, Clock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+KINDS = ("fade", "dissolve", "wipe")
+DURATION = 500   # Default transition time in milliseconds
+SOFT = 32        # Width of the wipe edge in mask values
+
+def blend(target, image, alpha, pos=(0, 0)):
+    """Blit image with uniform alpha, keeping the image's own alpha setting"""
+    previous = image.get_alpha()
+    image.set_alpha(alpha)
+    target.blit(image, pos)
+    image.set_alpha(previous)
+
+class Transition:
+    """
+    Blender with buffers preallocated for one screen size
+
+    Attributes:
+        size: Screen size the buffers are allocated for
+        old: Copy of the screen at the start of the transition
+        new: Image shown at the end
+        pos: Position of the new image on the screen
+        overlay: Screen at the end, with the wipe alpha in its alpha channel
+        mask: Wipe mask, (height, width) int16 array of 0-255 values,
+            None without NumPy
+    """
+
+    def __init__(self, size, mask=None):
+        """
+        Allocate blending buffers
+
+        Args:
+            size: Screen (width, height)
+            mask: Wipe mask surface, left to right gradient if None
+        """
+        self.size = size
+        width, height = size
+        self.old = pygame.Surface(size)
+        self.new = None
+        self.pos = (0, 0)
+        self.overlay = pygame.Surface(size, pygame.SRCALPHA)
+        if numpy is None:
+            self.mask = None
+            return
+        # Index of the alpha byte within a pixel of the overlay
+        shift = self.overlay.get_shifts()[3] // 8
+        self.alphaByte = shift if sys.byteorder == "little" else 3 - shift
+        self.mask = numpy.empty((height, width), numpy.int16)
+        self.alpha = numpy.empty((height, width), numpy.int16)
+        self.set_mask(mask)
+
+    def set_mask(self, mask=None):
+        """
+        Set wipe mask
+
+        Args:
+            mask: Surface of the screen size, its red channel is the
+                mask, left to right gradient if None
+        """
+        if numpy is None:
+            return
+        if mask is None:
+            self.mask[...] = numpy.linspace(0, 255, self.size[0]).astype(numpy.int16)
+        else:
+            red = pygame.surfarray.pixels_red(mask)
+            self.mask[...] = red.T
+            del red  # Unlock the surface
+
+    def begin(self, old, new, pos=(0, 0)):
+        """
+        Take the images to blend
+
+        Args:
+            old: Surface shown at the start, may be the screen itself
+            new: Surface shown at the end, black around it
+            pos: Position of the new surface
+        """
+        self.old.blit(old, (0, 0))
+        self.new, self.pos = new, pos
+        self.overlay.fill((0, 0, 0))
+        self.overlay.blit(new, pos)
+
+    def frame(self, target, kind, progress):
+        """
+        Draw one transition frame
+
+        Args:
+            target: Surface of the screen size to draw on
+            kind: Transition kind, one of KINDS
+            progress: Position in the transition, 0.0 to 1.0
+
+        Raises:
+            ValueError: On unknown transition kinds
+        """
+        if kind == "dissolve":
+            target.blit(self.old, (0, 0))
+            blend(target, self.new, int(progress * 255), self.pos)
+        elif kind == "fade":
+            target.fill((0, 0, 0))
+            if progress < 0.5:
+                blend(target, self.old, int((1 - progress * 2) * 255))
+            else:
+                blend(target, self.new, int((progress * 2 - 1) * 255), self.pos)
+        elif kind == "wipe" and numpy is not None:
+            alpha = self.alpha
+            numpy.subtract(int(progress * (255 + SOFT)), self.mask, out=alpha)
+            numpy.multiply(alpha, 256 // SOFT, out=alpha)
+            numpy.clip(alpha, 0, 255, out=alpha)
+            width, height = self.size
+            pitch = self.overlay.get_pitch() // 4
+            pixels = numpy.frombuffer(self.overlay.get_buffer(), numpy.uint8).reshape(height, pitch, 4)
+            numpy.copyto(pixels[:, :width, self.alphaByte], alpha, casting="unsafe")
+            del pixels  # Unlock the overlay
+            target.blit(self.old, (0, 0))
+            target.blit(self.overlay, (0, 0))
+        elif kind == "wipe":
+            width, height = self.size
+            edge = int(progress * width)
+            target.blit(self.old, (edge, 0), pygame.Rect(edge, 0, width - edge, height))
+            target.blit(self.overlay, (0, 0), pygame.Rect(0, 0, edge, height))
+        else:
+            raise ValueError(f"Unknown transition: {kind}")
+
+_shared = None  # Transition of the current screen size, reused by play()
+
+def play(screen, image, kind="dissolve", duration=DURATION, clock=None, fps=60, mask=None,
+         pos=(0, 0)):
+    """
+    Blend the screen contents into an image
+
+    A key press or mouse click finishes the transition at once. The
+    screen shows the whole image when this returns.
+
+    Args:
+        screen: Display surface
+        image: Surface shown at the end
+        kind: Transition kind, one of KINDS
+        duration: Transition time in milliseconds
+        clock: Shared pygame clock, a new one is created if None
+        fps: Frame rate cap
+        mask: Wipe mask surface, left to right gradient if None
+        pos: Position of the image, the screen around it turns black
+    """
+    global _shared
+    if _shared is None or _shared.size != screen.get_size():
+        _shared = Transition(screen.get_size())
+    transition = _shared
+    if kind == "wipe":
+        transition.set_mask(mask)
+    clock = clock or Clock()
+    transition.begin(screen, image, pos)
+    clock.tick()  # Don't count time spent before the transition
+    elapsed = 0
+    profiler.begin_frame()
+    while True:
+        progress = elapsed / duration if duration else 1.0
+        finished = progress >= 1.0
+        for event in inputs.get():
+            if event.type == pygame.QUIT:
+                inputs.post(event)  # Leave quitting to the caller
+                finished = True
+            elif event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
+                finished = True
+        if finished:
+            break
+        profiler.mark("events")
+        transition.frame(screen, kind, progress)
+        profiler.mark("render")
+        inputs.flip()
+        profiler.mark("display")
+        elapsed += clock.tick(fps)
+        profiler.mark("wait")
+        profiler.end_frame()
+    screen.fill((0, 0, 0))
+    screen.blit(image, pos)
+    inputs.flip()
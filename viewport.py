@@ -0,0 +1,157 @@
+"""
+Viewport Module for Visual Novel Engine
+
+Maps the logical resolution the game is laid out in (800x600) to the
+resolution of the output window. The logical area is scaled uniformly
+to fit the window and centered, the bars left over on the sides stay
+black.
+
+Positions, sizes and font sizes are written in logical units and
+converted once when objects are created. Images are scaled when they
+are loaded, through the asset cache and its on-disk tier of pre-scaled
+images, so frames only blit surfaces that already have their final
+size.
+
+Classes:
+    Viewport: Logical to output coordinate mapping
+
+Attributes:
+    viewport: Shared viewport used by the engine
+"""
+
+import pygame
+from assets import cache
+
+LOGICAL_SIZE = (800, 600)  # Resolution the game is laid out in
+
+def parse_size(text):
+    """
+    Parse resolution string
+
+    Args:
+        text: Resolution such as "1920x1080"
+
+    Returns:
+        tuple: (width, height)
+
+    Raises:
+        ValueError: If the string is not WIDTHxHEIGHT
+    """
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+class Viewport:
+    """
+    Logical to output coordinate mapping
+
+    Attributes:
+        logical: Logical (width, height)
+        output: Output window (width, height)
+        scale: Output pixels per logical unit
+        size: Output size of the logical area
+        offset: Output position of the logical area's top-left corner
+    """
+
+    def __init__(self, logical=LOGICAL_SIZE, output=None):
+        """
+        Initialize viewport
+
+        Args:
+            logical: Logical (width, height)
+            output: Output (width, height), same as logical if None
+        """
+        self.logical = logical
+        self.set_output(output or logical)
+
+    def set_output(self, output):
+        """
+        Change output resolution, only objects created later follow it
+
+        Args:
+            output: Output (width, height)
+        """
+        self.output = tuple(output)
+        self.scale = min(output[0] / self.logical[0], output[1] / self.logical[1])
+        self.size = (round(self.logical[0] * self.scale), round(self.logical[1] * self.scale))
+        self.offset = ((output[0] - self.size[0]) // 2, (output[1] - self.size[1]) // 2)
+
+    @property
+    def scaled(self):
+        """Whether logical and output units differ"""
+        return self.scale != 1
+
+    def length(self, value):
+        """
+        Convert logical length to output pixels
+
+        Args:
+            value: Logical length
+
+        Returns:
+            int: Output pixels, at least 1 for positive lengths
+        """
+        pixels = round(value * self.scale)
+        return max(pixels, 1) if value > 0 else pixels
+
+    def point(self, pos):
+        """
+        Convert logical position to output pixels
+
+        Args:
+            pos: Logical (x, y)
+
+        Returns:
+            tuple: Output (x, y)
+        """
+        return (self.offset[0] + round(pos[0] * self.scale),
+                self.offset[1] + round(pos[1] * self.scale))
+
+    def rect(self, rect):
+        """
+        Convert logical rectangle to output pixels
+
+        Args:
+            rect: Logical rectangle or (x, y, width, height)
+
+        Returns:
+            pygame.Rect: Output rectangle
+        """
+        rect = pygame.Rect(rect)
+        return pygame.Rect(self.point(rect.topleft), (self.length(rect.width), self.length(rect.height)))
+
+    def image(self, path, alpha=False):
+        """
+        Get image scaled from logical to output pixels
+
+        Args:
+            path: Image file path
+            alpha: Keep per-pixel alpha
+
+        Returns:
+            pygame.Surface: Cached surface
+        """
+        return cache.image(path, alpha, scale=self.scale if self.scaled else None)
+
+    def screen_image(self, path, alpha=False):
+        """
+        Get image stretched over the whole logical area, such as a background
+
+        Args:
+            path: Image file path
+            alpha: Keep per-pixel alpha
+
+        Returns:
+            pygame.Surface: Cached surface of the logical area's output size
+        """
+        return cache.image(path, alpha, size=self.size if self.scaled else None)
+
+    def surface(self):
+        """
+        Create blank surface covering the logical area
+
+        Returns:
+            pygame.Surface: Surface of the logical area's output size
+        """
+        return pygame.Surface(self.size)
+
+viewport = Viewport()